@@ -19,6 +19,14 @@ from dataclasses import dataclass
 from typing import Optional
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean flag such as 'true', '1' or 'no' from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 @dataclass
 class AppConfig:
     """
@@ -37,10 +45,50 @@ class AppConfig:
         groq_api_key (str): API key for Groq AI services (required)
         model_name (str): Name of the AI model to use for analysis
         model_temperature (float): Temperature parameter for model response generation
-        max_completion_tokens (int): Maximum tokens allowed in model responses
+        prompt_variant (str): Registered analysis prompt to send (see prompts.py)
+        max_completion_tokens (Optional[int]): Maximum tokens allowed in model
+            responses; None uses the budget of the prompt variant
+        groq_base_url (Optional[str]): Override for the Groq API base URL
+        http_max_connections (int): Size of the shared HTTP connection pool
+        http_max_keepalive_connections (int): Idle keep-alive connections to retain
+        http_keepalive_expiry (float): Seconds an idle connection stays in the pool
+        cache_enabled (bool): Whether analysis results are cached by image hash
+        cache_max_entries (int): Maximum number of results kept in memory
+        cache_ttl_seconds (float): Lifetime of a cached result in seconds
+        cache_persistent (bool): Also persist cached results in the history database
+        near_duplicate_enabled (bool): Reuse prior diagnoses for perceptually similar uploads
+        near_duplicate_max_distance (int): Maximum Hamming distance between 64-bit
+            perceptual hashes for an upload to count as a near duplicate
+        prefilter_enabled (bool): Reject obvious non-plant images locally,
+            without a model call
+        prefilter_min_vegetation_fraction (float): Share of vegetation-coloured
+            pixels below which the pre-filter rejects an image (0-1)
         log_level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file (str): Path to the log file for application logging
         supported_formats (tuple): Tuple of supported image file extensions
+        image_max_side (int): Longest side in pixels of images sent to the model
+        image_output_format (str): Re-encoding format for uploads ('JPEG' or 'WEBP')
+        image_quality (int): Encoder quality used when re-encoding uploads
+        batch_concurrency (int): Images of one batch analyzed in parallel
+        batch_item_timeout (float): Seconds allowed per image in a batch
+        batch_max_files (int): Maximum images accepted in one batch (zip members included)
+        batch_max_image_bytes (int): Largest image accepted in a batch, after unzipping
+        batch_max_total_bytes (int): Largest batch, in bytes of uploaded and unzipped data
+        rate_limit_enabled (bool): Schedule async model calls through the rate limiter
+        rate_limit_requests_per_minute (float): Request budget of the Groq account
+        rate_limit_tokens_per_minute (float): Token budget of the Groq account
+        rate_limit_max_concurrency (int): Upper bound of the adaptive concurrency limit
+        rate_limit_min_concurrency (int): Lower bound the limit backs off to on HTTP 429
+        rate_limit_max_queued (int): Calls allowed to wait for admission; further
+            uploads are answered 503 with Retry-After
+        request_timeout (float): Timeout of a single model call in seconds
+        retry_max_attempts (int): Attempts per model call on transient errors
+        retry_base_delay (float): Backoff ceiling of the first retry in seconds
+        retry_max_delay (float): Upper bound of any retry backoff in seconds
+        breaker_failure_threshold (int): Consecutive failures that open the circuit
+        breaker_reset_timeout (float): Seconds the circuit stays open
+        hedge_enabled (bool): Send a duplicate request when a call runs long
+        hedge_percentile (float): Latency percentile that triggers the hedge
 
     Example:
         >>> # Create config from environment variables
@@ -59,7 +107,28 @@ class AppConfig:
     model_name: str = "meta-llama/llama-4-scout-17b-16e-instruct"  # AI model identifier
     # Controls randomness in model responses (0.0-2.0)
     model_temperature: float = 0.3
-    max_completion_tokens: int = 1024  # Maximum tokens in model responses
+    prompt_variant: str = "full"  # "full" or "compact" (JSON mode, opt-in)
+    max_completion_tokens: Optional[int] = None  # None: the prompt variant's budget
+    groq_base_url: Optional[str] = None  # Custom API endpoint (e.g. a local stub)
+
+    # HTTP Connection Pool Configuration
+    http_max_connections: int = 20  # Concurrent connections to the Groq API
+    http_max_keepalive_connections: int = 10  # Idle connections kept warm
+    http_keepalive_expiry: float = 30.0  # Idle connection lifetime in seconds
+
+    # Result Cache Configuration
+    cache_enabled: bool = True  # Reuse results for identical uploads
+    cache_max_entries: int = 1024  # In-memory LRU capacity
+    cache_ttl_seconds: float = 86400.0  # Cached result lifetime (24 hours)
+    cache_persistent: bool = False  # Persist cache entries in disease_history.db
+
+    # Near-Duplicate Detection Configuration
+    near_duplicate_enabled: bool = True  # Skip the model for resized/re-encoded copies
+    near_duplicate_max_distance: int = 4  # Hamming distance threshold (0-64)
+
+    # Local Pre-Filter Configuration
+    prefilter_enabled: bool = True  # Answer images without plant colours locally
+    prefilter_min_vegetation_fraction: float = 0.10  # Rejection threshold (0-1)
 
     # Logging Configuration
     log_level: str = "INFO"  # Logging verbosity level
@@ -69,8 +138,44 @@ class AppConfig:
     # Supported image formats
     supported_formats: tuple = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
 
+    # Image Preprocessing Configuration
+    image_max_side: int = 1280  # Downscale uploads so the longest side fits
+    image_output_format: str = "JPEG"  # JPEG or WEBP
+    image_quality: int = 85  # Encoder quality (1-100)
+
+    # Batch Analysis Configuration
+    batch_concurrency: int = 4  # Parallel model calls per batch request
+    batch_item_timeout: float = 60.0  # Per-image timeout in seconds
+    batch_max_files: int = 100  # Upper bound on images per batch
+    batch_max_image_bytes: int = 10 * 1024 * 1024  # Per image, zip members included
+    batch_max_total_bytes: int = 200 * 1024 * 1024  # Per batch request
+
+    # PDF Report Configuration
+    report_workers: int = 2  # Report jobs built at the same time
+    report_image_workers: int = 4  # Threads loading thumbnails per report
+    report_max_records: int = 500  # Upper bound on records per report
+    report_dir: str = "reports"  # Where finished PDFs are written
+
+    # Rate Limiting Configuration (defaults match the Groq free tier)
+    rate_limit_enabled: bool = True
+    rate_limit_requests_per_minute: float = 30
+    rate_limit_tokens_per_minute: float = 30000
+    rate_limit_max_concurrency: int = 8
+    rate_limit_min_concurrency: int = 1
+    rate_limit_max_queued: int = 200
+
+    # Resilience Configuration
+    request_timeout: float = 60.0
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+    hedge_enabled: bool = False  # Hedged requests cost extra tokens
+    hedge_percentile: float = 95.0
+
     @classmethod
-    def from_env(cls) -> 'AppConfig':
+    def from_env(cls, require_api_key: bool = True) -> 'AppConfig':
         """
         Create configuration instance from environment variables.
 
@@ -82,15 +187,58 @@ class AppConfig:
             GROQ_API_KEY (required): API key for Groq AI services
             MODEL_NAME (optional): Override default AI model name
             MODEL_TEMPERATURE (optional): Override default model temperature
-            MAX_COMPLETION_TOKENS (optional): Override default max tokens
+            PROMPT_VARIANT (optional): Override the analysis prompt variant
+            MAX_COMPLETION_TOKENS (optional): Override the prompt variant's max tokens
             LOG_LEVEL (optional): Override default logging level
             LOG_FILE (optional): Override default log file path
+            GROQ_BASE_URL (optional): Override the Groq API base URL
+            HTTP_MAX_CONNECTIONS (optional): Override connection pool size
+            HTTP_MAX_KEEPALIVE_CONNECTIONS (optional): Override idle connection count
+            HTTP_KEEPALIVE_EXPIRY (optional): Override idle connection lifetime
+            CACHE_ENABLED (optional): Enable/disable the result cache (true/false)
+            CACHE_MAX_ENTRIES (optional): Override in-memory cache capacity
+            CACHE_TTL_SECONDS (optional): Override cached result lifetime
+            CACHE_PERSISTENT (optional): Persist cached results (true/false)
+            NEAR_DUPLICATE_ENABLED (optional): Enable near-duplicate reuse (true/false)
+            NEAR_DUPLICATE_MAX_DISTANCE (optional): Override Hamming distance threshold
+            PREFILTER_ENABLED (optional): Enable/disable the local pre-filter (true/false)
+            PREFILTER_MIN_VEGETATION_FRACTION (optional): Override the rejection threshold
+            IMAGE_MAX_SIDE (optional): Override maximum image side in pixels
+            IMAGE_OUTPUT_FORMAT (optional): Override re-encoding format
+            IMAGE_QUALITY (optional): Override re-encoding quality
+            BATCH_CONCURRENCY (optional): Override parallel analyses per batch
+            BATCH_ITEM_TIMEOUT (optional): Override per-image batch timeout
+            BATCH_MAX_FILES (optional): Override maximum images per batch
+            BATCH_MAX_IMAGE_BYTES (optional): Override maximum bytes per batch image
+            BATCH_MAX_TOTAL_BYTES (optional): Override maximum bytes per batch
+            REPORT_WORKERS (optional): Override concurrent report jobs
+            REPORT_IMAGE_WORKERS (optional): Override thumbnail threads per report
+            REPORT_MAX_RECORDS (optional): Override maximum records per report
+            REPORT_DIR (optional): Override the report output directory
+            RATE_LIMIT_ENABLED (optional): Enable/disable the rate limiter (true/false)
+            RATE_LIMIT_REQUESTS_PER_MINUTE (optional): Override request budget
+            RATE_LIMIT_TOKENS_PER_MINUTE (optional): Override token budget
+            RATE_LIMIT_MAX_CONCURRENCY (optional): Override concurrency ceiling
+            RATE_LIMIT_MIN_CONCURRENCY (optional): Override concurrency floor
+            RATE_LIMIT_MAX_QUEUED (optional): Override calls allowed to wait for admission
+            REQUEST_TIMEOUT (optional): Override model call timeout
+            RETRY_MAX_ATTEMPTS (optional): Override attempts per model call
+            RETRY_BASE_DELAY (optional): Override first retry backoff ceiling
+            RETRY_MAX_DELAY (optional): Override maximum retry backoff
+            BREAKER_FAILURE_THRESHOLD (optional): Override failures that open the circuit
+            BREAKER_RESET_TIMEOUT (optional): Override open circuit duration
+            HEDGE_ENABLED (optional): Enable/disable hedged requests (true/false)
+            HEDGE_PERCENTILE (optional): Override hedging latency percentile
+
+        Args:
+            require_api_key (bool): Raise if GROQ_API_KEY is missing. Pass False
+                to load the remaining settings without credentials.
 
         Returns:
             AppConfig: Configured instance with values from environment variables
 
         Raises:
-            ValueError: If GROQ_API_KEY environment variable is not set
+            ValueError: If GROQ_API_KEY is not set and require_api_key is True
 
         Example:
             >>> import os
@@ -99,8 +247,8 @@ class AppConfig:
             >>> config = AppConfig.from_env()
             >>> print(config.log_level)  # Output: DEBUG
         """
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
+        groq_api_key = os.getenv("GROQ_API_KEY", "")
+        if not groq_api_key and require_api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
 
         return cls(
@@ -108,8 +256,75 @@ class AppConfig:
             model_name=os.getenv("MODEL_NAME", cls.model_name),
             model_temperature=float(
                 os.getenv("MODEL_TEMPERATURE", cls.model_temperature)),
-            max_completion_tokens=int(
-                os.getenv("MAX_COMPLETION_TOKENS", cls.max_completion_tokens)),
+            prompt_variant=os.getenv("PROMPT_VARIANT", cls.prompt_variant),
+            max_completion_tokens=(int(os.environ["MAX_COMPLETION_TOKENS"])
+                                   if os.getenv("MAX_COMPLETION_TOKENS") else None),
             log_level=os.getenv("LOG_LEVEL", cls.log_level),
-            log_file=os.getenv("LOG_FILE", cls.log_file)
+            log_file=os.getenv("LOG_FILE", cls.log_file),
+            groq_base_url=os.getenv("GROQ_BASE_URL", cls.groq_base_url),
+            http_max_connections=int(
+                os.getenv("HTTP_MAX_CONNECTIONS", cls.http_max_connections)),
+            http_max_keepalive_connections=int(
+                os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS",
+                          cls.http_max_keepalive_connections)),
+            http_keepalive_expiry=float(
+                os.getenv("HTTP_KEEPALIVE_EXPIRY", cls.http_keepalive_expiry)),
+            cache_enabled=_env_bool("CACHE_ENABLED", cls.cache_enabled),
+            cache_max_entries=int(
+                os.getenv("CACHE_MAX_ENTRIES", cls.cache_max_entries)),
+            cache_ttl_seconds=float(
+                os.getenv("CACHE_TTL_SECONDS", cls.cache_ttl_seconds)),
+            cache_persistent=_env_bool("CACHE_PERSISTENT", cls.cache_persistent),
+            near_duplicate_enabled=_env_bool(
+                "NEAR_DUPLICATE_ENABLED", cls.near_duplicate_enabled),
+            near_duplicate_max_distance=int(
+                os.getenv("NEAR_DUPLICATE_MAX_DISTANCE",
+                          cls.near_duplicate_max_distance)),
+            prefilter_enabled=_env_bool("PREFILTER_ENABLED", cls.prefilter_enabled),
+            prefilter_min_vegetation_fraction=float(
+                os.getenv("PREFILTER_MIN_VEGETATION_FRACTION",
+                          cls.prefilter_min_vegetation_fraction)),
+            image_max_side=int(os.getenv("IMAGE_MAX_SIDE", cls.image_max_side)),
+            image_output_format=os.getenv(
+                "IMAGE_OUTPUT_FORMAT", cls.image_output_format).upper(),
+            image_quality=int(os.getenv("IMAGE_QUALITY", cls.image_quality)),
+            batch_concurrency=int(
+                os.getenv("BATCH_CONCURRENCY", cls.batch_concurrency)),
+            batch_item_timeout=float(
+                os.getenv("BATCH_ITEM_TIMEOUT", cls.batch_item_timeout)),
+            batch_max_files=int(os.getenv("BATCH_MAX_FILES", cls.batch_max_files)),
+            batch_max_image_bytes=int(
+                os.getenv("BATCH_MAX_IMAGE_BYTES", cls.batch_max_image_bytes)),
+            batch_max_total_bytes=int(
+                os.getenv("BATCH_MAX_TOTAL_BYTES", cls.batch_max_total_bytes)),
+            report_workers=int(os.getenv("REPORT_WORKERS", cls.report_workers)),
+            report_image_workers=int(
+                os.getenv("REPORT_IMAGE_WORKERS", cls.report_image_workers)),
+            report_max_records=int(
+                os.getenv("REPORT_MAX_RECORDS", cls.report_max_records)),
+            report_dir=os.getenv("REPORT_DIR", cls.report_dir),
+            rate_limit_enabled=_env_bool("RATE_LIMIT_ENABLED", cls.rate_limit_enabled),
+            rate_limit_requests_per_minute=float(
+                os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE",
+                          cls.rate_limit_requests_per_minute)),
+            rate_limit_tokens_per_minute=float(
+                os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE",
+                          cls.rate_limit_tokens_per_minute)),
+            rate_limit_max_concurrency=int(
+                os.getenv("RATE_LIMIT_MAX_CONCURRENCY", cls.rate_limit_max_concurrency)),
+            rate_limit_min_concurrency=int(
+                os.getenv("RATE_LIMIT_MIN_CONCURRENCY", cls.rate_limit_min_concurrency)),
+            rate_limit_max_queued=int(
+                os.getenv("RATE_LIMIT_MAX_QUEUED", cls.rate_limit_max_queued)),
+            request_timeout=float(os.getenv("REQUEST_TIMEOUT", cls.request_timeout)),
+            retry_max_attempts=int(
+                os.getenv("RETRY_MAX_ATTEMPTS", cls.retry_max_attempts)),
+            retry_base_delay=float(os.getenv("RETRY_BASE_DELAY", cls.retry_base_delay)),
+            retry_max_delay=float(os.getenv("RETRY_MAX_DELAY", cls.retry_max_delay)),
+            breaker_failure_threshold=int(
+                os.getenv("BREAKER_FAILURE_THRESHOLD", cls.breaker_failure_threshold)),
+            breaker_reset_timeout=float(
+                os.getenv("BREAKER_RESET_TIMEOUT", cls.breaker_reset_timeout)),
+            hedge_enabled=_env_bool("HEDGE_ENABLED", cls.hedge_enabled),
+            hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", cls.hedge_percentile))
         )
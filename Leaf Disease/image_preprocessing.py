@@ -0,0 +1,175 @@
+"""
+Image preprocessing module for Leaf Disease Detection System.
+
+This module normalizes uploads before they are base64 encoded and sent to the
+vision model. Phone photos are often 8-12 MB JPEGs far larger than the model
+needs; downscaling and re-encoding them shrinks the request payload, the image
+token cost and the upstream latency.
+
+Functions:
+    normalize_image: Decode, orient, downscale and re-encode an image
+    make_thumbnail: Build a small JPEG preview for history views and reports
+    sniff_mime_type: Detect the MIME type of encoded image bytes
+
+Usage:
+    >>> data, mime_type = normalize_image(raw_bytes, max_side=1280)
+    >>> mime_type
+    'image/jpeg'
+"""
+
+import io
+import logging
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+}
+
+EXIF_ORIENTATION = 0x0112
+
+# Longest side in pixels of the thumbnails served to history views and reports
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_QUALITY = 80
+
+# Leading magic bytes of the formats listed in AppConfig.supported_formats
+_MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'GIF8', 'image/gif'),
+)
+
+
+def sniff_mime_type(image_bytes: bytes, default: str = 'image/jpeg') -> str:
+    """
+    Detect the MIME type of encoded image bytes from their magic number.
+
+    Args:
+        image_bytes (bytes): Encoded image data
+        default (str): MIME type to return when the format is not recognised
+
+    Returns:
+        str: MIME type such as 'image/png'
+    """
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if image_bytes.startswith(magic):
+            return mime_type
+    return default
+
+
+def normalize_image(image_bytes: bytes, max_side: int = 1280,
+                    output_format: str = 'JPEG',
+                    quality: int = 85) -> Tuple[bytes, str]:
+    """
+    Prepare an uploaded image for the vision model.
+
+    Steps:
+        1. Decode with Pillow, using JPEG draft mode so oversized photos are
+           downscaled by the decoder itself.
+        2. Apply the EXIF orientation tag.
+        3. Cap the longest side at max_side pixels.
+        4. Re-encode as a quality-tuned JPEG or WebP.
+
+    If the image cannot be decoded, the original bytes are returned with their
+    sniffed MIME type so the model can still attempt the analysis. If the
+    image needed no resizing or rotation and re-encoding would not make it
+    smaller, the original bytes are kept.
+
+    Args:
+        image_bytes (bytes): Raw uploaded image data
+        max_side (int): Maximum width/height of the output image
+        output_format (str): 'JPEG' or 'WEBP'
+        quality (int): Encoder quality (1-100)
+
+    Returns:
+        Tuple[bytes, str]: Encoded image data and its MIME type
+
+    Raises:
+        ValueError: If output_format is not supported
+    """
+    output_format = output_format.upper()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    try:
+        return _reencode(image_bytes, max_side, output_format, quality)
+    except Exception as e:
+        logger.warning(f"Image normalization skipped, sending original bytes: {str(e)}")
+        return image_bytes, sniff_mime_type(image_bytes)
+
+
+def _reencode(image_bytes: bytes, max_side: int, output_format: str,
+              quality: int) -> Tuple[bytes, str]:
+    """Decode, orient, downscale and re-encode; raises if Pillow cannot decode the image."""
+    original_mime = sniff_mime_type(image_bytes)
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        original_size = img.size
+        rotated = img.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if img.format == 'JPEG':
+            # Decode at the smallest 1/2, 1/4 or 1/8 scale still >= max_side
+            img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS,
+                      reducing_gap=3.0)
+        unchanged = img.size == original_size and not rotated
+
+        buffer = io.BytesIO()
+        if output_format == 'WEBP':
+            img.save(buffer, format='WEBP', quality=quality, method=4)
+        else:
+            img.save(buffer, format='JPEG', quality=quality,
+                     optimize=True, progressive=True)
+
+    normalized = buffer.getvalue()
+    if (unchanged and len(normalized) >= len(image_bytes)
+            and original_mime in OUTPUT_FORMATS.values()):
+        return image_bytes, original_mime
+
+    logger.info(f"Normalized image {original_size} -> {img.size}, "
+                f"{len(image_bytes)} -> {len(normalized)} bytes")
+    return normalized, OUTPUT_FORMATS[output_format]
+
+
+def make_thumbnail(image_bytes: bytes, size: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Build a thumbnail whose longest side is at most `size` pixels.
+
+    Unlike normalize_image, an image that cannot be decoded yields no
+    thumbnail rather than the full-size original.
+
+    Args:
+        image_bytes (bytes): Original encoded image
+        size (int): One of THUMBNAIL_SIZES
+
+    Returns:
+        Optional[Tuple[bytes, str]]: Encoded thumbnail and its MIME type, or
+                                     None if the image cannot be decoded
+
+    Raises:
+        ValueError: If size is not one of THUMBNAIL_SIZES
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise ValueError(f"Unsupported thumbnail size: {size}")
+    try:
+        return _reencode(image_bytes, size, 'JPEG', THUMBNAIL_QUALITY)
+    except Exception as e:
+        logger.warning(f"Thumbnail not generated, image cannot be decoded: {str(e)}")
+        return None
@@ -1,14 +1,26 @@
 import os
-import json
+import base64
+import binascii
+import asyncio
 import logging
 import sys
+import time
 from typing import Dict, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
-from groq import Groq
+import httpx
+from groq import (Groq, AsyncGroq, DefaultHttpxClient, DefaultAsyncHttpxClient,
+                  RateLimitError)
 from dotenv import load_dotenv
 
+from prefilter import LeafPrefilter
+from prompts import REPAIR_PROMPT, TokenUsageTracker, get_prompt
+from result_cache import ResultCache
+from rate_limiter import GroqScheduler, PRIORITY_INTERACTIVE, retry_after_seconds
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, RetryPolicy
+from response_parser import MAX_RESPONSE_CHARS, ParseStats, ResponseParseError, parse_analysis
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -29,6 +41,9 @@ class DiseaseAnalysisResult:
         disease_detected (bool): Whether a disease was detected in the leaf image
         disease_name (Optional[str]): Name of the identified disease, None if healthy
         disease_type (str): Category of disease (fungal, bacterial, viral, pest, etc.)
+        cached (bool): Whether the result was served from the result cache
+        prefiltered (bool): Whether the image was rejected by the local
+            pre-filter without calling the model
     """
     disease_detected: bool
     disease_name: Optional[str]
@@ -38,7 +53,10 @@ class DiseaseAnalysisResult:
     symptoms: List[str]
     possible_causes: List[str]
     treatment: List[str]
-    analysis_timestamp: str = datetime.now().astimezone().isoformat()
+    analysis_timestamp: str = field(
+        default_factory=lambda: datetime.now().astimezone().isoformat())
+    cached: bool = False
+    prefiltered: bool = False
 
 
 class LeafDiseaseDetector:
@@ -62,15 +80,37 @@ class LeafDiseaseDetector:
         - Confidence scoring (0-100%)
         - Symptom identification
         - Treatment recommendations
-        - Robust error handling and response parsing
+        - Validated response parsing with a model repair call for malformed answers
         - Invalid image type detection and rejection
+        - Optional local pre-filter that rejects obvious non-plant images
+          without a model call
 
     Attributes:
         MODEL_NAME (str): The AI model used for analysis
         DEFAULT_TEMPERATURE (float): Default temperature for response generation
-        DEFAULT_MAX_TOKENS (int): Default maximum tokens for responses
+        HTTP_MAX_CONNECTIONS (int): Default size of the HTTP connection pool
+        HTTP_MAX_KEEPALIVE_CONNECTIONS (int): Default number of idle keep-alive connections
+        HTTP_KEEPALIVE_EXPIRY (float): Seconds an idle pooled connection is kept open
+        RATE_LIMIT_RETRIES (int): Retries of a scheduled call answered with HTTP 429
+        IMAGE_TOKEN_ESTIMATE (int): Prompt tokens reserved for the image per request
+        REQUEST_TIMEOUT (float): Default timeout of a single model call in seconds
         api_key (str): Groq API key for authentication
-        client (Groq): Groq API client instance
+        prompt (PromptVariant): Registered analysis prompt in use (see prompts.py)
+        max_tokens (int): Completion token budget, by default the prompt's own
+        client (Groq): Groq API client instance (reused across analyses)
+        async_client (AsyncGroq): Asynchronous Groq client for the async path
+        cache (Optional[ResultCache]): Result cache consulted before model calls
+        prefilter (Optional[LeafPrefilter]): Local check that answers obvious
+            non-plant images before the model is called
+        scheduler (Optional[GroqScheduler]): Rate limiter for async model calls;
+            synchronous calls are not throttled
+        retry_policy (RetryPolicy): Retry policy for transient upstream errors
+        circuit_breaker (CircuitBreaker): Breaker shared by the sync and async paths
+        latency_tracker (LatencyTracker): Recent model call latencies
+        token_usage (TokenUsageTracker): Tokens reported with each completion
+        parse_stats (ParseStats): Outcomes of parsing model answers
+        hedge_percentile (Optional[float]): Latency percentile after which an
+            async call is hedged with a duplicate request (None disables hedging)
 
     Example:
         >>> detector = LeafDiseaseDetector()
@@ -85,9 +125,28 @@ class LeafDiseaseDetector:
 
     MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
     DEFAULT_TEMPERATURE = 0.3
-    DEFAULT_MAX_TOKENS = 1024
-
-    def __init__(self, api_key: Optional[str] = None):
+    HTTP_MAX_CONNECTIONS = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+    HTTP_KEEPALIVE_EXPIRY = 30.0
+    RATE_LIMIT_RETRIES = 3
+    IMAGE_TOKEN_ESTIMATE = 1600
+    REQUEST_TIMEOUT = 60.0
+
+    def __init__(self, api_key: Optional[str] = None,
+                 http_client: Optional[httpx.Client] = None,
+                 base_url: Optional[str] = None,
+                 max_connections: Optional[int] = None,
+                 max_keepalive_connections: Optional[int] = None,
+                 keepalive_expiry: Optional[float] = None,
+                 cache: Optional[ResultCache] = None,
+                 scheduler: Optional[GroqScheduler] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge_percentile: Optional[float] = None,
+                 timeout: Optional[float] = None,
+                 prompt_variant: Optional[str] = None,
+                 max_tokens: Optional[int] = None,
+                 prefilter: Optional[LeafPrefilter] = None):
         """
         Initialize the Leaf Disease Detector with API credentials.
 
@@ -95,12 +154,41 @@ class LeafDiseaseDetector:
         the parameter or environment variables. Initializes logging for
         tracking analysis operations.
 
+        The detector owns a pooled keep-alive HTTP client, so a single
+        instance should be created once and reused for every analysis
+        (see utils.get_detector) rather than rebuilt per request.
+
         Args:
             api_key (Optional[str]): Groq API key. If None, will attempt to
                                    load from GROQ_API_KEY environment variable.
+            http_client (Optional[httpx.Client]): Pre-built HTTP client to use
+                                   instead of the detector's own pool.
+            base_url (Optional[str]): Override the Groq API base URL.
+            max_connections (Optional[int]): Connection pool size.
+            max_keepalive_connections (Optional[int]): Idle keep-alive connections.
+            keepalive_expiry (Optional[float]): Idle connection lifetime in seconds.
+            cache (Optional[ResultCache]): Cache of previous results keyed by
+                                   image content and model parameters.
+            scheduler (Optional[GroqScheduler]): Shared rate limiter for the
+                                   async path; 429 responses are fed back to it.
+            retry_policy (Optional[RetryPolicy]): Retries of transient errors.
+                                   The Groq SDK's own retries are disabled.
+            circuit_breaker (Optional[CircuitBreaker]): Fails fast while the
+                                   upstream API keeps failing.
+            hedge_percentile (Optional[float]): Hedge async calls that are still
+                                   running at this latency percentile.
+            timeout (Optional[float]): Timeout of a single model call in seconds.
+            prompt_variant (Optional[str]): Name of the registered prompt to
+                                   send (default prompts.DEFAULT_PROMPT_VARIANT).
+            max_tokens (Optional[int]): Completion token budget. Defaults to
+                                   the budget of the prompt variant.
+            prefilter (Optional[LeafPrefilter]): Reject obvious non-plant
+                                   images locally. None sends every image
+                                   to the model.
 
         Raises:
-            ValueError: If no valid API key is found in parameters or environment.
+            ValueError: If no valid API key is found in parameters or environment,
+                        or the prompt variant is unknown.
 
         Note:
             Ensure your .env file contains GROQ_API_KEY or pass it directly.
@@ -109,77 +197,299 @@ class LeafDiseaseDetector:
         self.api_key = api_key or os.environ.get("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
-        self.client = Groq(api_key=self.api_key)
+        self.prompt = get_prompt(prompt_variant)
+        self.max_tokens = max_tokens or self.prompt.max_completion_tokens
+
+        limits = httpx.Limits(
+            max_connections=max_connections or self.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=(max_keepalive_connections
+                                       or self.HTTP_MAX_KEEPALIVE_CONNECTIONS),
+            keepalive_expiry=keepalive_expiry or self.HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            http_client = DefaultHttpxClient(limits=limits)
+        self.http_client = http_client
+        # Retries are handled by retry_policy and the scheduler; SDK retries
+        # would bypass the circuit breaker and the rate limit budgets
+        timeout = timeout or self.REQUEST_TIMEOUT
+        self.client = Groq(api_key=self.api_key, base_url=base_url,
+                           http_client=self.http_client, max_retries=0,
+                           timeout=timeout)
+        self.async_http_client = DefaultAsyncHttpxClient(limits=limits)
+        self.async_client = AsyncGroq(api_key=self.api_key, base_url=base_url,
+                                      http_client=self.async_http_client,
+                                      max_retries=0, timeout=timeout)
+        self.cache = cache
+        self.prefilter = prefilter
+        self.scheduler = scheduler
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.latency_tracker = LatencyTracker()
+        self.token_usage = TokenUsageTracker()
+        self.parse_stats = ParseStats()
+        self.hedge_percentile = hedge_percentile
+        self.retries = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
         logger.info("Leaf Disease Detector initialized")
 
+    @classmethod
+    def from_config(cls, config,
+                    cache: Optional[ResultCache] = None) -> 'LeafDiseaseDetector':
+        """
+        Create a detector from an AppConfig instance.
+
+        A GroqScheduler is attached when config.rate_limit_enabled is set, and
+        the retry, circuit breaker, hedging, prompt and pre-filter settings
+        are taken from config.
+
+        Args:
+            config (AppConfig): Application configuration
+            cache (Optional[ResultCache]): Result cache to attach
+
+        Returns:
+            LeafDiseaseDetector: Detector using the configured credentials
+                                 and connection pool settings.
+        """
+        scheduler = None
+        if config.rate_limit_enabled:
+            scheduler = GroqScheduler(
+                requests_per_minute=config.rate_limit_requests_per_minute,
+                tokens_per_minute=config.rate_limit_tokens_per_minute,
+                max_concurrency=config.rate_limit_max_concurrency,
+                min_concurrency=config.rate_limit_min_concurrency,
+                max_queued=config.rate_limit_max_queued,
+            )
+        return cls(
+            api_key=config.groq_api_key,
+            base_url=config.groq_base_url,
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections,
+            keepalive_expiry=config.http_keepalive_expiry,
+            cache=cache,
+            scheduler=scheduler,
+            retry_policy=RetryPolicy(
+                max_attempts=config.retry_max_attempts,
+                base_delay=config.retry_base_delay,
+                max_delay=config.retry_max_delay),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=config.breaker_failure_threshold,
+                reset_timeout=config.breaker_reset_timeout),
+            hedge_percentile=config.hedge_percentile if config.hedge_enabled else None,
+            timeout=config.request_timeout,
+            prompt_variant=config.prompt_variant,
+            max_tokens=config.max_completion_tokens,
+            prefilter=(LeafPrefilter(config.prefilter_min_vegetation_fraction)
+                       if config.prefilter_enabled else None),
+        )
+
+    def close(self) -> None:
+        """
+        Release pooled HTTP connections held by the detector.
+
+        Only closes the HTTP client if the detector created it; clients
+        passed in by the caller are left for the caller to manage.
+        """
+        if self._owns_http_client:
+            self.http_client.close()
+        logger.info("Leaf Disease Detector closed")
+
+    async def aclose(self) -> None:
+        """
+        Release pooled connections of both the sync and async clients.
+
+        Must be awaited on the event loop that served the async analyses.
+        """
+        await self.async_http_client.aclose()
+        self.close()
+
     def create_analysis_prompt(self) -> str:
         """
-        Create the standardized analysis prompt for the AI model.
+        Return the analysis prompt for the AI model.
 
-        Generates a comprehensive prompt that instructs the AI model to analyze
-        leaf images for diseases and return structured JSON results. The prompt
-        specifies the required output format and analysis criteria.
+        The text comes precomputed from the prompt registry (prompts.py); it
+        instructs the model to analyze the leaf image and return structured
+        JSON results.
 
         Returns:
-            str: Formatted prompt string with instructions for disease analysis
-                 and JSON schema specification.
+            str: Prompt string of the detector's prompt variant
+        """
+        return self.prompt.text
 
-        Note:
-            The prompt ensures consistent output formatting across all analyses
-            and includes all necessary fields for comprehensive disease assessment.
-        """
-        return """IMPORTANT: First determine if this image contains a plant leaf or vegetation. If the image shows humans, animals, objects, buildings, or anything other than plant leaves/vegetation, return the "invalid_image" response format below.
-
-        If this is a valid leaf/plant image, analyze it for diseases and return the results in JSON format.
-        
-        Please identify:
-        1. Whether this is actually a leaf/plant image
-        2. Disease name (if any)
-        3. Disease type/category or invalid_image
-        4. Severity level (mild, moderate, severe)
-        5. Confidence score (0-100%)
-        6. Symptoms observed
-        7. Possible causes
-        8. Treatment recommendations
-
-        For NON-LEAF images (humans, animals, objects, or not detected as leaves, etc.), return this format:
-        {
-            "disease_detected": false,
-            "disease_name": null,
-            "disease_type": "invalid_image",
-            "severity": "none",
-            "confidence": 95,
-            "symptoms": ["This image does not contain a plant leaf"],
-            "possible_causes": ["Invalid image type uploaded"],
-            "treatment": ["Please upload an image of a plant leaf for disease analysis"]
-        }
-        
-        For VALID LEAF images, return this format:
-        {
-            "disease_detected": true/false,
-            "disease_name": "name of disease or null",
-            "disease_type": "fungal/bacterial/viral/pest/nutrient deficiency/healthy",
-            "severity": "mild/moderate/severe/none",
-            "confidence": 85,
-            "symptoms": ["list", "of", "symptoms"],
-            "possible_causes": ["list", "of", "causes"],
-            "treatment": ["list", "of", "treatments"]
-        }"""
+    def _build_completion_request(self, base64_image: str,
+                                  temperature: float = None,
+                                  max_tokens: int = None,
+                                  mime_type: str = "image/jpeg") -> Dict:
+        """
+        Validate the image payload and build the chat completion arguments.
+
+        Shared by the synchronous and asynchronous analysis paths so both
+        send identical requests to the model.
+
+        Args:
+            base64_image (str): Base64 encoded image data (data URL prefix allowed)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            mime_type (str): MIME type of the encoded image. A data URL prefix
+                             on base64_image takes precedence.
+
+        Returns:
+            Dict: Keyword arguments for client.chat.completions.create,
+                  including the prompt variant's response_format if it has one
+
+        Raises:
+            ValueError: If the image payload is not a non-empty string
+        """
+        # Validate base64 input
+        if not isinstance(base64_image, str):
+            raise ValueError("base64_image must be a string")
+
+        if not base64_image:
+            raise ValueError("base64_image cannot be empty")
+
+        # Clean base64 string (remove data URL prefix if present)
+        if base64_image.startswith('data:'):
+            header, base64_image = base64_image.split(',', 1)
+            mime_type = header[len('data:'):].split(';', 1)[0] or mime_type
+
+        # Prepare request parameters
+        temperature = temperature or self.DEFAULT_TEMPERATURE
+        max_tokens = max_tokens or self.max_tokens
+
+        request = dict(
+            model=self.MODEL_NAME,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": self.create_analysis_prompt()
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            temperature=temperature,
+            max_completion_tokens=max_tokens,
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+        if self.prompt.response_format is not None:
+            request['response_format'] = self.prompt.response_format
+        return request
+
+    def _build_repair_request(self, response_content: str) -> Dict:
+        """
+        Build a text-only request asking the model to rewrite an unparseable
+        answer as the analysis JSON object (no image is sent again), and
+        count the repair call.
+
+        Args:
+            response_content (str): The answer that could not be parsed
+
+        Returns:
+            Dict: Keyword arguments for client.chat.completions.create
+        """
+        self.parse_stats.record('repair_calls')
+        return dict(
+            model=self.MODEL_NAME,
+            messages=[{"role": "user",
+                       "content": REPAIR_PROMPT + (response_content or "")[:MAX_RESPONSE_CHARS]}],
+            temperature=self.DEFAULT_TEMPERATURE,
+            max_completion_tokens=self.max_tokens,
+            response_format={"type": "json_object"},
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+
+    def _result_cache_key(self, base64_image: str, temperature: float = None,
+                          max_tokens: int = None) -> Optional[str]:
+        """
+        Compute the result cache key for a request, or None if caching is off.
+
+        Args:
+            base64_image (str): Base64 encoded image data (data URL prefix allowed)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+
+        Returns:
+            Optional[str]: Content hash of the decoded image, model parameters
+                           and prompt version; None if the image data is not
+                           valid base64 (the request is then not cached)
+        """
+        if self.cache is None or not isinstance(base64_image, str) or not base64_image:
+            return None
+        if base64_image.startswith('data:'):
+            base64_image = base64_image.split(',', 1)[1]
+        try:
+            image_bytes = base64.b64decode(base64_image)
+        except (binascii.Error, ValueError):
+            return None
+        return ResultCache.make_key(
+            image_bytes,
+            self.MODEL_NAME,
+            self.prompt.version,
+            temperature or self.DEFAULT_TEMPERATURE,
+            max_tokens or self.max_tokens)
+
+    def _prefilter_result(self, base64_image: str) -> Optional[Dict]:
+        """
+        Run the local pre-filter on an image.
+
+        Args:
+            base64_image (str): Base64 encoded image data (data URL prefix allowed)
+
+        Returns:
+            Optional[Dict]: An 'invalid_image' result if the pre-filter rejects
+                            the image, None if it should go to the model
+        """
+        if self.prefilter is None or not isinstance(base64_image, str) or not base64_image:
+            return None
+        if base64_image.startswith('data:'):
+            base64_image = base64_image.split(',', 1)[1]
+        try:
+            image_bytes = base64.b64decode(base64_image)
+        except (binascii.Error, ValueError):
+            return None
+        verdict = self.prefilter.check(image_bytes)
+        if verdict.forward:
+            return None
+        logger.info(f"Pre-filter rejected image in {verdict.seconds * 1000:.1f} ms "
+                    f"({verdict.vegetation_fraction:.1%} vegetation-coloured pixels)")
+        # Not cached, so a changed threshold applies to the next upload
+        return DiseaseAnalysisResult(**self.prefilter.invalid_image_result(),
+                                     prefiltered=True).__dict__
 
     def analyze_leaf_image_base64(self, base64_image: str,
                                   temperature: float = None,
-                                  max_tokens: int = None) -> Dict:
+                                  max_tokens: int = None,
+                                  mime_type: str = "image/jpeg") -> Dict:
         """
         Analyze base64 encoded image data for leaf diseases and return JSON result.
 
         First validates that the image contains a plant leaf. If the image shows
         humans, animals, objects, or other non-plant content, returns an 
         'invalid_image' response. For valid leaf images, performs disease analysis.
+        With a pre-filter attached, images without any plant colours are
+        answered as 'invalid_image' locally (prefiltered=True).
+
+        This synchronous variant bypasses the rate limit scheduler (see
+        _call_model); servers should use analyze_leaf_image_base64_async.
 
         Args:
             base64_image (str): Base64 encoded image data (without data:image prefix)
             temperature (float, optional): Model temperature for response generation
             max_tokens (int, optional): Maximum tokens for response
+            mime_type (str): MIME type of the encoded image (default image/jpeg)
 
         Returns:
             Dict: Analysis results as dictionary (JSON serializable)
@@ -187,64 +497,383 @@ class LeafDiseaseDetector:
                  - For valid leaves: standard disease analysis results
 
         Raises:
+            ResponseParseError: If neither the answer nor its repair could be parsed
             Exception: If analysis fails
         """
         try:
             logger.info("Starting analysis for base64 image data")
-
-            # Validate base64 input
-            if not isinstance(base64_image, str):
-                raise ValueError("base64_image must be a string")
-
-            if not base64_image:
-                raise ValueError("base64_image cannot be empty")
-
-            # Clean base64 string (remove data URL prefix if present)
-            if base64_image.startswith('data:'):
-                base64_image = base64_image.split(',', 1)[1]
-
-            # Prepare request parameters
-            temperature = temperature or self.DEFAULT_TEMPERATURE
-            max_tokens = max_tokens or self.DEFAULT_MAX_TOKENS
+            request = self._build_completion_request(
+                base64_image, temperature, max_tokens, mime_type)
+
+            # Serve repeated uploads of the same image from the cache
+            cache_key = self._result_cache_key(base64_image, temperature, max_tokens)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Returning cached analysis result")
+                    return cached
+
+            # Answer obvious non-plant images without a model call
+            rejected = self._prefilter_result(base64_image)
+            if rejected is not None:
+                return rejected
 
             # Make API request
-            completion = self.client.chat.completions.create(
-                model=self.MODEL_NAME,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.create_analysis_prompt()
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                temperature=temperature,
-                max_completion_tokens=max_tokens,
-                top_p=1,
-                stream=False,
-                stop=None,
-            )
+            try:
+                completion = self._call_model(request)
+            except CircuitOpenError:
+                stale = self.cache.get_stale(cache_key) if cache_key is not None else None
+                if stale is None:
+                    raise
+                logger.warning("Vision model unavailable, returning stale cached result")
+                return stale
 
             logger.info("API request completed successfully")
-            result = self._parse_response(
-                completion.choices[0].message.content)
+            content = completion.choices[0].message.content
+            try:
+                result = self._parse_response(content)
+            except ResponseParseError as e:
+                logger.warning(f"Unparseable model answer ({str(e)}), asking the model to repair it")
+                repaired = self._call_model(self._build_repair_request(content))
+                result = self._parse_repaired_response(repaired.choices[0].message.content)
 
             # Return as dictionary for JSON serialization
-            return result.__dict__
+            result = result.__dict__
+            if cache_key is not None:
+                self.cache.set(cache_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"Analysis failed for base64 image data: {str(e)}")
             raise
 
+    async def analyze_leaf_image_base64_async(self, base64_image: str,
+                                              temperature: float = None,
+                                              max_tokens: int = None,
+                                              mime_type: str = "image/jpeg",
+                                              priority: int = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        Asynchronous variant of analyze_leaf_image_base64.
+
+        Awaits the completion on the pooled AsyncGroq client so concurrent
+        analyses overlap their network wait instead of blocking the event loop.
+
+        Args:
+            base64_image (str): Base64 encoded image data (without data:image prefix)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            mime_type (str): MIME type of the encoded image (default image/jpeg)
+            priority (int): Scheduler priority (PRIORITY_INTERACTIVE or PRIORITY_BATCH)
+
+        Returns:
+            Dict: Analysis results as dictionary (JSON serializable)
+
+        Raises:
+            ResponseParseError: If neither the answer nor its repair could be parsed
+            Exception: If analysis fails
+        """
+        try:
+            logger.info("Starting async analysis for base64 image data")
+            request = self._build_completion_request(
+                base64_image, temperature, max_tokens, mime_type)
+
+            cache_key = self._result_cache_key(base64_image, temperature, max_tokens)
+            if cache_key is not None:
+                # A memory miss falls through to the persistent tier's SQLite
+                # query, keep it off the event loop
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+                if cached is not None:
+                    logger.info("Returning cached analysis result")
+                    return cached
+
+            # Decoding a thumbnail takes milliseconds, keep it off the event loop
+            if self.prefilter is not None:
+                rejected = await asyncio.to_thread(self._prefilter_result, base64_image)
+                if rejected is not None:
+                    return rejected
+
+            try:
+                completion = await self._call_model_async(request, priority)
+            except CircuitOpenError:
+                stale = None
+                if cache_key is not None:
+                    stale = await asyncio.to_thread(self.cache.get_stale, cache_key)
+                if stale is None:
+                    raise
+                logger.warning("Vision model unavailable, returning stale cached result")
+                return stale
+
+            logger.info("Async API request completed successfully")
+            content = completion.choices[0].message.content
+            try:
+                result = self._parse_response(content).__dict__
+            except ResponseParseError as e:
+                logger.warning(f"Unparseable model answer ({str(e)}), asking the model to repair it")
+                repaired = await self._call_model_async(self._build_repair_request(content), priority)
+                result = self._parse_repaired_response(repaired.choices[0].message.content).__dict__
+            if cache_key is not None:
+                # The persistent tier writes to SQLite, keep it off the event loop
+                await asyncio.to_thread(self.cache.set, cache_key, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Async analysis failed for base64 image data: {str(e)}")
+            raise
+
+    def resilience_stats(self) -> Dict:
+        """
+        Return retry, hedging and circuit breaker counters for monitoring.
+
+        Returns:
+            Dict: Breaker state, retry and hedge counts and latency percentiles
+        """
+        p50 = self.latency_tracker.percentile(50)
+        p95 = self.latency_tracker.percentile(95)
+        return {
+            'circuit_breaker': self.circuit_breaker.stats(),
+            'retries': self.retries,
+            'hedging_enabled': self.hedge_percentile is not None,
+            'hedges_sent': self.hedges_sent,
+            'hedges_won': self.hedges_won,
+            'latency_p50_seconds': round(p50, 3) if p50 is not None else None,
+            'latency_p95_seconds': round(p95, 3) if p95 is not None else None
+        }
+
+    def token_stats(self) -> Dict:
+        """
+        Return the token usage reported by the API, per prompt variant.
+
+        Returns:
+            Dict: Active prompt variant and completion budget, and request
+                  counts with total and average prompt/completion tokens
+        """
+        return {
+            'prompt_variant': self.prompt.name,
+            'prompt_version': self.prompt.version,
+            'max_completion_tokens': self.max_tokens,
+            'usage': self.token_usage.stats()
+        }
+
+    def prefilter_stats(self) -> Dict:
+        """
+        Return the local pre-filter counters.
+
+        Returns:
+            Dict: Images checked, rejected and forwarded, the threshold and
+                  the mean check time, or {'enabled': False}
+        """
+        if self.prefilter is None:
+            return {'enabled': False}
+        return self.prefilter.stats()
+
+    def parse_metrics(self) -> Dict:
+        """
+        Return counters of how model answers were parsed.
+
+        Returns:
+            Dict: Answers parsed directly, extracted or repaired, unparseable
+                  answers, corrected fields, repair calls and the JSON backend
+        """
+        return self.parse_stats.stats()
+
+    def _record_usage(self, completion) -> None:
+        """Account the tokens a completion reports for the active prompt variant."""
+        usage = completion.usage
+        self.token_usage.record(self.prompt.name, usage)
+        if usage is not None:
+            logger.info(f"Model call used {usage.prompt_tokens} prompt and "
+                        f"{usage.completion_tokens} completion tokens "
+                        f"(prompt {self.prompt.name})")
+
+    def _call_model(self, request: Dict):
+        """
+        Call the completions API with retries behind the circuit breaker.
+
+        The scheduler is asyncio-based, so this synchronous path is not rate
+        limited: calls here do not count against the shared request, token
+        or concurrency budgets. The API server only uses the async path; keep
+        sync callers to the CLI and scripts.
+
+        Args:
+            request (Dict): Arguments built by _build_completion_request
+
+        Returns:
+            ChatCompletion: Completion returned by the API
+
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the call
+        """
+        self.circuit_breaker.before_call()
+        for attempt in range(self.retry_policy.max_attempts):
+            try:
+                started = time.monotonic()
+                completion = self.client.chat.completions.create(**request)
+                self.latency_tracker.record(time.monotonic() - started)
+                self._record_usage(completion)
+            except Exception as e:
+                if not self.retry_policy.is_retryable(e):
+                    self.circuit_breaker.release()
+                    raise
+                self.circuit_breaker.record_failure()
+                if attempt + 1 == self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                logger.warning(f"Transient model error ({str(e)}), retrying in {delay:.2f}s")
+                self.retries += 1
+                time.sleep(delay)
+                # Stop retrying once the failures have opened the circuit
+                self.circuit_breaker.before_call()
+                continue
+            self.circuit_breaker.record_success()
+            return completion
+
+    async def _call_model_async(self, request: Dict, priority: int):
+        """
+        Asynchronous variant of _call_model with optional request hedging.
+
+        Args:
+            request (Dict): Arguments built by _build_completion_request
+            priority (int): Scheduler priority of the call
+
+        Returns:
+            ChatCompletion: Completion returned by the API
+
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the call
+        """
+        self.circuit_breaker.before_call()
+        for attempt in range(self.retry_policy.max_attempts):
+            try:
+                completion = await self._hedged_completion_async(request, priority)
+            except Exception as e:
+                if not self.retry_policy.is_retryable(e):
+                    self.circuit_breaker.release()
+                    raise
+                self.circuit_breaker.record_failure()
+                if attempt + 1 == self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                logger.warning(f"Transient model error ({str(e)}), retrying in {delay:.2f}s")
+                self.retries += 1
+                await asyncio.sleep(delay)
+                self.circuit_breaker.before_call()
+                continue
+            except BaseException:
+                # Cancelled (e.g. batch item timeout): free a half-open trial slot
+                self.circuit_breaker.release()
+                raise
+            self.circuit_breaker.record_success()
+            return completion
+
+    async def _hedged_completion_async(self, request: Dict, priority: int):
+        """
+        Send a request and hedge it if it runs past the latency percentile.
+
+        When hedging is enabled and enough latencies have been recorded, a
+        duplicate request is sent once the first has been running for the
+        hedge_percentile latency. The first successful answer wins and the
+        other request is cancelled.
+        """
+        deadline = None
+        if self.hedge_percentile is not None:
+            deadline = self.latency_tracker.percentile(self.hedge_percentile)
+        if deadline is None:
+            return await self._create_completion_async(request, priority)
+
+        primary = asyncio.ensure_future(self._create_completion_async(request, priority))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=deadline)
+            if done:
+                return primary.result()
+
+            logger.info(f"No answer after {deadline:.2f}s, sending hedged request")
+            self.hedges_sent += 1
+            hedge = asyncio.ensure_future(self._create_completion_async(request, priority))
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # A cancelled request has no exception to inspect
+                    # (task.exception() would raise CancelledError)
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            if error is None:
+                raise asyncio.CancelledError()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _create_completion_async(self, request: Dict, priority: int):
+        """
+        Send a completion request through the rate limit scheduler.
+
+        Without a scheduler the request is sent directly. With one, the call
+        waits for admission, reports the actual token usage back to the
+        scheduler and retries 429 responses after the advertised Retry-After.
+
+        Args:
+            request (Dict): Arguments built by _build_completion_request
+            priority (int): Scheduler priority of the call
+
+        Returns:
+            ChatCompletion: Completion returned by the API
+
+        Raises:
+            RateLimitError: If the call is still rate limited after
+                            RATE_LIMIT_RETRIES retries
+            SchedulerQueueFullError: If the scheduler queue is full
+        """
+        if self.scheduler is None:
+            return await self._timed_completion_async(request)
+
+        estimated_tokens = self._estimate_request_tokens(request)
+        for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+            async with self.scheduler.slot(priority, estimated_tokens) as permit:
+                try:
+                    completion = await self._timed_completion_async(request)
+                except RateLimitError as e:
+                    self.scheduler.record_rate_limit(retry_after_seconds(e))
+                    if attempt == self.RATE_LIMIT_RETRIES:
+                        raise
+                    logger.warning(f"Rate limited, retrying ({attempt + 1}/"
+                                   f"{self.RATE_LIMIT_RETRIES})")
+                    continue
+                if completion.usage is not None:
+                    permit.actual_tokens = completion.usage.total_tokens
+                self.scheduler.record_success()
+                return completion
+
+    async def _timed_completion_async(self, request: Dict):
+        """Send one completion request and record its latency and token usage."""
+        started = time.monotonic()
+        completion = await self.async_client.chat.completions.create(**request)
+        self.latency_tracker.record(time.monotonic() - started)
+        self._record_usage(completion)
+        return completion
+
+    def _estimate_request_tokens(self, request: Dict) -> int:
+        """
+        Estimate the tokens a request will count against the per-minute limit.
+
+        Uses ~4 characters per text token plus IMAGE_TOKEN_ESTIMATE for the
+        image and the full completion budget; the scheduler corrects the
+        reservation with the actual usage once the call returns.
+        """
+        text_chars = sum(len(part['text'])
+                         for message in request['messages']
+                         for part in message['content'] if part['type'] == 'text')
+        return (text_chars // 4 + self.IMAGE_TOKEN_ESTIMATE
+                + request['max_completion_tokens'])
+
     def _parse_response(self, response_content: str) -> DiseaseAnalysisResult:
         """
         Parse and validate API response
@@ -254,66 +883,20 @@ class LeafDiseaseDetector:
 
         Returns:
             DiseaseAnalysisResult: Parsed and validated results
-        """
-        try:
-            # Clean up response - remove markdown code blocks if present
-            cleaned_response = response_content.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response.replace(
-                    '```json', '').replace('```', '').strip()
-            elif cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response.replace('```', '').strip()
-
-            # Parse JSON
-            disease_data = json.loads(cleaned_response)
-            logger.info("Response parsed successfully as JSON")
-
-            # Validate required fields and create result object
-            return DiseaseAnalysisResult(
-                disease_detected=bool(
-                    disease_data.get('disease_detected', False)),
-                disease_name=disease_data.get('disease_name'),
-                disease_type=disease_data.get('disease_type', 'unknown'),
-                severity=disease_data.get('severity', 'unknown'),
-                confidence=float(disease_data.get('confidence', 0)),
-                symptoms=disease_data.get('symptoms', []),
-                possible_causes=disease_data.get('possible_causes', []),
-                treatment=disease_data.get('treatment', [])
-            )
 
-        except json.JSONDecodeError:
-            logger.warning(
-                "Failed to parse as JSON, attempting to extract JSON from response")
+        Raises:
+            ResponseParseError: If no analysis can be recovered from the response
+        """
+        return DiseaseAnalysisResult(**parse_analysis(response_content, self.parse_stats))
 
-            # Try to find JSON in the response using regex
-            import re
-            json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-            if json_match:
-                try:
-                    disease_data = json.loads(json_match.group())
-                    logger.info("JSON extracted and parsed successfully")
-
-                    return DiseaseAnalysisResult(
-                        disease_detected=bool(
-                            disease_data.get('disease_detected', False)),
-                        disease_name=disease_data.get('disease_name'),
-                        disease_type=disease_data.get(
-                            'disease_type', 'unknown'),
-                        severity=disease_data.get('severity', 'unknown'),
-                        confidence=float(disease_data.get('confidence', 0)),
-                        symptoms=disease_data.get('symptoms', []),
-                        possible_causes=disease_data.get(
-                            'possible_causes', []),
-                        treatment=disease_data.get('treatment', [])
-                    )
-                except json.JSONDecodeError:
-                    pass
-
-            # If all parsing attempts fail, log the raw response and raise error
-            logger.error(
-                f"Could not parse response as JSON. Raw response: {response_content}")
-            raise ValueError(
-                f"Unable to parse API response as JSON: {response_content[:200]}...")
+    def _parse_repaired_response(self, response_content: str) -> DiseaseAnalysisResult:
+        """Parse the answer of a repair request, counting a failure as a failed repair."""
+        try:
+            return self._parse_response(response_content)
+        except ResponseParseError:
+            self.parse_stats.record('repair_failures')
+            logger.error(f"Could not parse repaired response. Raw response: {response_content}")
+            raise
 
 
 def main():
@@ -0,0 +1,230 @@
+"""
+Perceptual hashing module for Leaf Disease Detection System.
+
+This module detects near-duplicate uploads. A difference hash (dHash) of a
+downscaled grayscale image survives re-compression and resizing, so the same
+field photo re-encoded by a phone app or the Streamlit uploader still maps to
+(almost) the same 64-bit hash. Hashes are indexed in a BK-tree for fast
+Hamming-distance lookups.
+
+Classes:
+    BKTree: Metric tree over integer hashes using Hamming distance
+    NearDuplicateIndex: Thread-safe index mapping hashes to analysis ids
+
+Usage:
+    >>> index = NearDuplicateIndex()
+    >>> index.add(dhash(image_bytes), analysis_id=42)
+    >>> index.find(dhash(resized_bytes), max_distance=4)
+    (42, 1)
+"""
+
+import io
+import threading
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+
+
+def dhash(image_bytes: bytes, hash_size: int = HASH_SIZE) -> int:
+    """
+    Compute the difference hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit records whether a pixel is brighter than its right neighbour.
+
+    Args:
+        image_bytes (bytes): Encoded image data in any Pillow-readable format
+        hash_size (int): Number of rows/columns compared (hash has hash_size**2 bits)
+
+    Returns:
+        int: Perceptual hash as an unsigned integer
+
+    Raises:
+        PIL.UnidentifiedImageError: If the bytes are not a readable image
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # Let the JPEG decoder downscale during decoding when possible
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        small = img.convert('L').resize((hash_size + 1, hash_size),
+                                        Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+def hash_to_hex(value: int, hash_size: int = HASH_SIZE) -> str:
+    """Format a hash as a fixed-width hex string for storage."""
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hash_from_hex(value: str) -> int:
+    """Parse a hash stored by hash_to_hex()."""
+    return int(value, 16)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes.
+
+    Each child edge is labelled with its distance to the parent, so a search
+    with radius r only descends into children whose label lies within
+    [d - r, d + r] of the query's distance d to the current node.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, values, {distance: child}]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item) -> None:
+        """
+        Insert a hash with an associated item.
+
+        Args:
+            value (int): Perceptual hash
+            item: Payload returned by search() (e.g. an analysis id)
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def remove(self, value: int, item) -> bool:
+        """
+        Remove one item stored under a hash.
+
+        The node itself stays in the tree (it still routes its children); only
+        its payload shrinks.
+
+        Returns:
+            bool: True if the item was found and removed
+        """
+        node = self._root
+        while node is not None:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if item not in node[1]:
+                    return False
+                node[1].remove(item)
+                self._size -= 1
+                return True
+            node = node[2].get(distance)
+        return False
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """
+        Find all items whose hash lies within max_distance of value.
+
+        Args:
+            value (int): Query hash
+            max_distance (int): Maximum Hamming distance
+
+        Returns:
+            List[Tuple[int, object]]: (distance, item) pairs sorted by distance
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node[2].items()
+                         if low <= edge <= high)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class NearDuplicateIndex:
+    """
+    Thread-safe perceptual hash index of previously analyzed images.
+
+    Attributes:
+        lookups (int): Number of find() calls
+        matches (int): Number of find() calls that returned a near duplicate
+    """
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._hashes = {}  # analysis id -> hash, to remove entries by id
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.matches = 0
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def add(self, value: int, analysis_id: int) -> None:
+        """Index the hash of a stored analysis."""
+        with self._lock:
+            self._tree.add(value, analysis_id)
+            self._hashes[analysis_id] = value
+
+    def remove(self, analysis_id: int) -> bool:
+        """Drop the entry of an analysis, e.g. after its history row was deleted."""
+        with self._lock:
+            value = self._hashes.pop(analysis_id, None)
+            return value is not None and self._tree.remove(value, analysis_id)
+
+    def find(self, value: int, max_distance: int) -> Optional[Tuple[int, int]]:
+        """
+        Return the closest indexed analysis within max_distance.
+
+        Args:
+            value (int): Perceptual hash of the new upload
+            max_distance (int): Maximum Hamming distance to accept
+
+        Returns:
+            Optional[Tuple[int, int]]: (analysis_id, distance) of the nearest match,
+                                       preferring the most recent analysis on ties
+        """
+        with self._lock:
+            self.lookups += 1
+            matches = self._tree.search(value, max_distance)
+            if not matches:
+                return None
+            self.matches += 1
+        best_distance = matches[0][0]
+        analysis_id = max(item for distance, item in matches
+                          if distance == best_distance)
+        return analysis_id, best_distance
+
+    def stats(self) -> dict:
+        """Return index size and lookup counters for monitoring."""
+        with self._lock:
+            return {
+                'indexed_images': len(self._tree),
+                'lookups': self.lookups,
+                'near_duplicate_hits': self.matches
+            }
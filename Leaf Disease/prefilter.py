@@ -0,0 +1,181 @@
+"""
+Local pre-filter module for Leaf Disease Detection System.
+
+A cheap first stage in front of the vision model. Uploads that clearly show no
+vegetation (screenshots, documents, diagrams, grayscale photos) are answered
+locally with an 'invalid_image' result in a few milliseconds instead of a full
+model round trip; everything else, including every ambiguous image, is
+forwarded to the model, which still makes the final leaf/non-leaf call.
+
+The check decodes a small thumbnail (JPEG draft mode lets the decoder do most
+of the downscaling), converts it to HSV and measures the share of pixels with
+a vegetation colour: a hue between yellow-brown and cyan-green that is
+saturated and bright enough not to be paper, text or shadow. An image is
+rejected only when that share stays below min_vegetation_fraction. The
+threshold is deliberately low: rejecting a real leaf costs a wrong answer,
+forwarding a non-leaf only costs the model call it would have cost anyway
+(see evaluate_prefilter.py for measurements).
+
+Classes:
+    PrefilterResult: Verdict and colour statistics of one check
+    LeafPrefilter: The pre-filter with its thresholds and counters
+
+Usage:
+    >>> prefilter = LeafPrefilter()
+    >>> verdict = prefilter.check(image_bytes)
+    >>> if not verdict.forward:
+    ...     fields = prefilter.invalid_image_result()
+"""
+
+import io
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from PIL import Image, ImageChops
+
+# Longest side in pixels of the thumbnail the colours are measured on
+THUMBNAIL_SIDE = 64
+# Vegetation hues in degrees: yellow-brown (dry or diseased tissue) to cyan-green
+VEGETATION_HUE_RANGE = (20, 170)
+# Pixels less saturated or darker than this count as grey, white, black or shadow
+MIN_SATURATION = 0.15
+MIN_BRIGHTNESS = 0.12
+# Images with a smaller share of vegetation-coloured pixels are rejected
+DEFAULT_MIN_VEGETATION_FRACTION = 0.10
+
+# Canned answer for rejected uploads, in the shape the model returns for
+# non-leaf images; the cause names the pre-filter so these rows can be told
+# apart from the model's own verdicts in the history
+PREFILTER_CAUSE = "No plant colours found by the local pre-filter"
+REJECTION_CONFIDENCE = 95
+
+
+def _threshold_table(low: float, high: float = 255) -> list:
+    """Lookup table mapping 8-bit values within [low, high] to 255 and others to 0."""
+    return [255 if low <= value <= high else 0 for value in range(256)]
+
+
+# PIL's HSV mode stores hue, saturation and value as 0-255
+_HUE_TABLE = _threshold_table(VEGETATION_HUE_RANGE[0] * 255 / 360,
+                              VEGETATION_HUE_RANGE[1] * 255 / 360)
+_SATURATION_TABLE = _threshold_table(MIN_SATURATION * 255)
+_BRIGHTNESS_TABLE = _threshold_table(MIN_BRIGHTNESS * 255)
+
+
+@dataclass(frozen=True)
+class PrefilterResult:
+    """
+    Outcome of one pre-filter check.
+
+    Attributes:
+        forward (bool): Whether the image goes on to the vision model
+        reason (str): 'vegetation', 'no_vegetation' or 'undecodable'
+        vegetation_fraction (float): Share of pixels with a vegetation colour
+        colored_fraction (float): Share of saturated, non-dark pixels of any hue
+        seconds (float): Time the check took
+    """
+    forward: bool
+    reason: str
+    vegetation_fraction: float
+    colored_fraction: float
+    seconds: float
+
+
+class LeafPrefilter:
+    """
+    Colour-based pre-filter that rejects obvious non-plant images.
+
+    Thread-safe; one instance is shared by the sync and async analysis paths.
+
+    Attributes:
+        min_vegetation_fraction (float): Rejection threshold on the share of
+            vegetation-coloured pixels (0-1)
+    """
+
+    def __init__(self, min_vegetation_fraction: float = DEFAULT_MIN_VEGETATION_FRACTION):
+        self.min_vegetation_fraction = min_vegetation_fraction
+        self._counts = {'checked': 0, 'rejected': 0, 'forwarded': 0, 'undecodable': 0}
+        self._seconds = 0.0
+        self._lock = threading.Lock()
+
+    def check(self, image_bytes: bytes) -> PrefilterResult:
+        """
+        Decide whether an image should be sent to the vision model.
+
+        Images that cannot be decoded are forwarded so the model can still
+        attempt the analysis, as image preprocessing does.
+
+        Args:
+            image_bytes (bytes): Encoded image data in any Pillow-readable format
+
+        Returns:
+            PrefilterResult: The verdict and the measured colour shares
+        """
+        started = time.perf_counter()
+        try:
+            vegetation, colored = self._colour_fractions(image_bytes)
+        except Exception:
+            result = PrefilterResult(True, 'undecodable', 0.0, 0.0,
+                                     time.perf_counter() - started)
+        else:
+            forward = vegetation >= self.min_vegetation_fraction
+            result = PrefilterResult(forward, 'vegetation' if forward else 'no_vegetation',
+                                     vegetation, colored, time.perf_counter() - started)
+        self._record(result)
+        return result
+
+    @staticmethod
+    def _colour_fractions(image_bytes: bytes) -> Tuple[float, float]:
+        """Return the vegetation-coloured and coloured pixel shares of an image."""
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            if img.format == 'JPEG':
+                img.draft('RGB', (THUMBNAIL_SIDE * 2, THUMBNAIL_SIDE * 2))
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                # Transparent areas count as white background, as in preprocessing
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel('A'))
+            small = img.convert('RGB')
+            small.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE), Image.Resampling.BILINEAR)
+
+        hue, saturation, brightness = small.convert('HSV').split()
+        colored = ImageChops.multiply(saturation.point(_SATURATION_TABLE),
+                                      brightness.point(_BRIGHTNESS_TABLE))
+        vegetation = ImageChops.multiply(colored, hue.point(_HUE_TABLE))
+        pixels = small.width * small.height
+        return vegetation.histogram()[255] / pixels, colored.histogram()[255] / pixels
+
+    def _record(self, result: PrefilterResult) -> None:
+        with self._lock:
+            self._counts['checked'] += 1
+            self._counts['forwarded' if result.forward else 'rejected'] += 1
+            if result.reason == 'undecodable':
+                self._counts['undecodable'] += 1
+            self._seconds += result.seconds
+
+    @staticmethod
+    def invalid_image_result() -> Dict:
+        """Analysis fields answering a rejected upload (DiseaseAnalysisResult keywords)."""
+        return {
+            'disease_detected': False,
+            'disease_name': None,
+            'disease_type': 'invalid_image',
+            'severity': 'none',
+            'confidence': REJECTION_CONFIDENCE,
+            'symptoms': ["This image does not contain a plant leaf"],
+            'possible_causes': [PREFILTER_CAUSE],
+            'treatment': ["Please upload an image of a plant leaf for disease analysis"]
+        }
+
+    def stats(self) -> Dict:
+        """Counters of checked, rejected and forwarded images and the mean check time."""
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = self._seconds
+        counts['enabled'] = True
+        counts['min_vegetation_fraction'] = self.min_vegetation_fraction
+        counts['avg_check_ms'] = round(1000 * seconds / counts['checked'], 2) if counts['checked'] else None
+        return counts
+
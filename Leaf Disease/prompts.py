@@ -0,0 +1,171 @@
+"""
+Prompt registry for Leaf Disease Detection System.
+
+Analysis prompts are built once at import time and looked up by name, so a
+request only references a ready-made string. Every variant carries a version
+(part of result cache keys), its completion token budget and, optionally, the
+response_format that switches the model into JSON mode.
+
+The registry also holds REPAIR_PROMPT, sent with an answer that could not be
+parsed to have the model rewrite it as JSON.
+
+Classes:
+    PromptVariant: One registered analysis prompt
+    TokenUsageTracker: Prompt and completion tokens reported by the API
+
+Usage:
+    >>> prompt = get_prompt("compact")
+    >>> request = dict(messages=[...prompt.text...], response_format=prompt.response_format)
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Variant used when none is configured; "compact" stays opt-in until
+# bench_prompts.py recordings show it matches the full prompt's answers
+DEFAULT_PROMPT_VARIANT = "full"
+
+# The original prompt: free-form answer, with two full JSON examples to copy
+_FULL_PROMPT = """IMPORTANT: First determine if this image contains a plant leaf or vegetation. If the image shows humans, animals, objects, buildings, or anything other than plant leaves/vegetation, return the "invalid_image" response format below.
+
+        If this is a valid leaf/plant image, analyze it for diseases and return the results in JSON format.
+        
+        Please identify:
+        1. Whether this is actually a leaf/plant image
+        2. Disease name (if any)
+        3. Disease type/category or invalid_image
+        4. Severity level (mild, moderate, severe)
+        5. Confidence score (0-100%)
+        6. Symptoms observed
+        7. Possible causes
+        8. Treatment recommendations
+
+        For NON-LEAF images (humans, animals, objects, or not detected as leaves, etc.), return this format:
+        {
+            "disease_detected": false,
+            "disease_name": null,
+            "disease_type": "invalid_image",
+            "severity": "none",
+            "confidence": 95,
+            "symptoms": ["This image does not contain a plant leaf"],
+            "possible_causes": ["Invalid image type uploaded"],
+            "treatment": ["Please upload an image of a plant leaf for disease analysis"]
+        }
+        
+        For VALID LEAF images, return this format:
+        {
+            "disease_detected": true/false,
+            "disease_name": "name of disease or null",
+            "disease_type": "fungal/bacterial/viral/pest/nutrient deficiency/healthy",
+            "severity": "mild/moderate/severe/none",
+            "confidence": 85,
+            "symptoms": ["list", "of", "symptoms"],
+            "possible_causes": ["list", "of", "causes"],
+            "treatment": ["list", "of", "treatments"]
+        }"""
+
+# JSON mode guarantees a bare JSON object, so the schema is stated once, tersely
+_COMPACT_PROMPT = " ".join("""
+Diagnose the plant leaf in this image. Answer with one JSON object with keys:
+disease_detected (bool), disease_name (string or null),
+disease_type ("fungal"|"bacterial"|"viral"|"pest"|"nutrient deficiency"|"healthy"|"invalid_image"),
+severity ("mild"|"moderate"|"severe"|"none"), confidence (0-100),
+symptoms, possible_causes, treatment (arrays of at most 4 short phrases).
+If the image is not a plant leaf or vegetation, use disease_type "invalid_image",
+disease_detected false, severity "none" and say so in one item per array.
+""".split())
+
+
+# Text-only follow-up that turns an unparseable answer into the JSON object;
+# far cheaper than analyzing the image again
+REPAIR_PROMPT = ("Rewrite the following answer as one valid JSON object with the keys "
+                 "disease_detected, disease_name, disease_type, severity, confidence, "
+                 "symptoms, possible_causes and treatment. Answer:\n")
+
+
+@dataclass(frozen=True)
+class PromptVariant:
+    """
+    A registered analysis prompt.
+
+    Attributes:
+        name (str): Registry key
+        version (str): Changes whenever the text or output format changes;
+            part of result cache keys
+        text (str): Prompt sent with the image
+        max_completion_tokens (int): Completion budget that fits the answer
+        response_format (Optional[Dict]): response_format request parameter,
+            or None for a free-form answer
+    """
+    name: str
+    version: str
+    text: str
+    max_completion_tokens: int
+    response_format: Optional[Dict] = None
+
+
+PROMPTS: Dict[str, PromptVariant] = {
+    # "v1" keeps result cache entries written before the registry valid
+    "full": PromptVariant(name="full", version="v1", text=_FULL_PROMPT,
+                          max_completion_tokens=1024),
+    "compact": PromptVariant(name="compact", version="compact-v1", text=_COMPACT_PROMPT,
+                             max_completion_tokens=512,
+                             response_format={"type": "json_object"}),
+}
+
+
+def get_prompt(name: Optional[str] = None) -> PromptVariant:
+    """
+    Look up a prompt variant.
+
+    Args:
+        name (Optional[str]): Registry key; DEFAULT_PROMPT_VARIANT if None
+
+    Raises:
+        ValueError: If no variant of that name is registered
+    """
+    name = name or DEFAULT_PROMPT_VARIANT
+    try:
+        return PROMPTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown prompt variant '{name}' "
+                         f"(available: {', '.join(PROMPTS)})") from None
+
+
+class TokenUsageTracker:
+    """
+    Running totals of the token usage reported with each completion, per
+    prompt variant.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, variant: str, usage) -> None:
+        """
+        Add the usage of one completion.
+
+        Args:
+            variant (str): Name of the prompt variant the request used
+            usage: The completion's usage object (None if the API sent none)
+        """
+        if usage is None:
+            return
+        with self._lock:
+            totals = self._totals.setdefault(
+                variant, {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            totals['requests'] += 1
+            totals['prompt_tokens'] += usage.prompt_tokens or 0
+            totals['completion_tokens'] += usage.completion_tokens or 0
+
+    def stats(self) -> Dict:
+        """Totals and per-request averages for each variant."""
+        with self._lock:
+            totals = {variant: dict(values) for variant, values in self._totals.items()}
+        for values in totals.values():
+            values['total_tokens'] = values['prompt_tokens'] + values['completion_tokens']
+            for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                values[f'avg_{key}'] = round(values[key] / values['requests'], 1)
+        return totals
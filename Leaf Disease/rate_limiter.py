@@ -0,0 +1,278 @@
+"""
+Rate limiting module for Leaf Disease Detection System.
+
+This module schedules calls to the Groq completions API so that bursts of
+uploads stay within the account's request and token rate limits instead of
+failing with HTTP 429.
+
+Classes:
+    TokenBucket: Continuously refilling budget of requests or tokens
+    RequestPermit: Admission granted by the scheduler for one API call
+    GroqScheduler: Priority queue with token buckets and AIMD concurrency control
+    SchedulerQueueFullError: Raised instead of queueing when the queue is full
+
+Usage:
+    >>> scheduler = GroqScheduler(requests_per_minute=30, tokens_per_minute=30000)
+    >>> async with scheduler.slot(PRIORITY_INTERACTIVE, estimated_tokens=2500) as permit:
+    ...     completion = await client.chat.completions.create(**request)
+    ...     permit.actual_tokens = completion.usage.total_tokens
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from groq import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class SchedulerQueueFullError(Exception):
+    """Raised instead of queueing a call when max_queued callers are already waiting."""
+
+    def __init__(self, queued: int, retry_after: float):
+        super().__init__(f"Vision model request queue is full ({queued} waiting), "
+                         f"retry in {retry_after:.0f}s")
+        self.queued = queued
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    """Read the Retry-After header (in seconds) of a 429 response, if any."""
+    value = error.response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per-minute rate.
+
+    Attributes:
+        rate_per_second (float): Refill rate
+        capacity (float): Maximum burst size
+        available (float): Tokens currently available (may go negative when a
+                           call used more than it reserved)
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.available = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.available = min(self.capacity,
+                             self.available + elapsed * self.rate_per_second)
+
+    def time_until_available(self, amount: float, now: Optional[float] = None) -> float:
+        """Seconds until `amount` tokens can be consumed (0 if available now)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate_per_second
+
+    def consume(self, amount: float) -> None:
+        """Take `amount` tokens from the bucket."""
+        self._refill(time.monotonic())
+        self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Return (positive) or charge (negative) tokens after the fact."""
+        self._refill(time.monotonic())
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RequestPermit:
+    """
+    Admission for one API call.
+
+    Set `actual_tokens` from the completion usage before the slot is released
+    so the token bucket can be corrected for the reservation estimate.
+    """
+
+    def __init__(self, priority: int, reserved_tokens: int):
+        self.priority = priority
+        self.reserved_tokens = reserved_tokens
+        self.actual_tokens: Optional[int] = None
+
+
+class GroqScheduler:
+    """
+    Client-side scheduler in front of the completions API.
+
+    Callers are admitted in priority order (interactive uploads before batch
+    jobs, FIFO within a priority) once three conditions hold:
+
+        - fewer calls are in flight than the current concurrency limit,
+        - the requests-per-minute and tokens-per-minute buckets can cover the
+          call's reservation,
+        - no Retry-After back-off from a recent 429 is in effect.
+
+    The concurrency limit follows AIMD: it grows additively (about +1 per
+    window of successful calls) up to max_concurrency and halves on every
+    rate-limit response, down to min_concurrency.
+
+    With max_queued set, a caller arriving while that many calls are already
+    waiting is turned away with SchedulerQueueFullError instead of waiting
+    behind them.
+
+    Attributes:
+        concurrency_limit (float): Current adaptive concurrency limit
+        in_flight (int): Calls currently admitted and not yet released
+        max_queued (Optional[int]): Waiting callers allowed (None: unbounded)
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None,
+                 max_concurrency: int = 8, min_concurrency: int = 1,
+                 max_queued: Optional[int] = None):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_queued = max_queued
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+        self._blocked_until = 0.0
+        self.granted = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 0):
+        """
+        Hold a scheduler slot for the duration of one API call.
+
+        Args:
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            estimated_tokens (int): Tokens to reserve against the per-minute budget
+
+        Yields:
+            RequestPermit: Permit on which to record the actual token usage
+        """
+        permit = await self.acquire(priority, estimated_tokens)
+        try:
+            yield permit
+        finally:
+            await self.release(permit)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE,
+                      estimated_tokens: int = 0) -> RequestPermit:
+        """
+        Wait for admission and return a permit (see slot()).
+
+        Raises:
+            SchedulerQueueFullError: If max_queued callers are already waiting
+        """
+        entry = (priority, next(self._sequence))
+        async with self._condition:
+            if self.max_queued is not None and len(self._waiters) >= self.max_queued:
+                self.rejected += 1
+                raise SchedulerQueueFullError(len(self._waiters), self._queue_wait_estimate())
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    delay = self._admission_delay(entry, estimated_tokens)
+                    if delay == 0:
+                        break
+                    if delay is None:
+                        await self._condition.wait()
+                    else:
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+                raise
+
+            heapq.heappop(self._waiters)
+            self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(estimated_tokens)
+            self.in_flight += 1
+            self.granted += 1
+            # The next waiter may now be at the head of the queue
+            self._condition.notify_all()
+        return RequestPermit(priority, estimated_tokens)
+
+    async def release(self, permit: RequestPermit) -> None:
+        """Release a slot and correct the token bucket with the actual usage."""
+        async with self._condition:
+            self.in_flight -= 1
+            if self.token_bucket is not None and permit.actual_tokens is not None:
+                self.token_bucket.adjust(permit.reserved_tokens - permit.actual_tokens)
+            self._condition.notify_all()
+
+    def record_success(self) -> None:
+        """Additive increase of the concurrency limit after a successful call."""
+        self.concurrency_limit = min(float(self.max_concurrency),
+                                     self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+    def record_rate_limit(self, retry_after: Optional[float] = None) -> None:
+        """
+        Multiplicative decrease after a 429 and pause admissions.
+
+        Args:
+            retry_after (Optional[float]): Seconds from the Retry-After header
+        """
+        self.rate_limited += 1
+        self.concurrency_limit = max(float(self.min_concurrency),
+                                     self.concurrency_limit / 2.0)
+        if retry_after:
+            self._blocked_until = max(self._blocked_until,
+                                      time.monotonic() + retry_after)
+        logger.warning(f"Rate limited by upstream; concurrency limit now "
+                       f"{self.concurrency_limit:.1f}, retry after {retry_after}s")
+
+    def stats(self) -> Dict:
+        """Return scheduler state and counters for monitoring."""
+        return {
+            'concurrency_limit': round(self.concurrency_limit, 2),
+            'in_flight': self.in_flight,
+            'queued': len(self._waiters),
+            'granted': self.granted,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected,
+            'backoff_seconds': round(max(0.0, self._blocked_until - time.monotonic()), 2)
+        }
+
+    def _queue_wait_estimate(self) -> float:
+        """Seconds until the current queue has drained at the request rate."""
+        drain = len(self._waiters) / self.request_bucket.rate_per_second
+        return max(1.0, drain, self._blocked_until - time.monotonic())
+
+    def _admission_delay(self, entry: tuple, estimated_tokens: int) -> Optional[float]:
+        """
+        Return 0 if `entry` may be admitted now, the seconds to wait for a
+        budget to refill, or None to wait for another caller to notify.
+        """
+        if self._waiters[0] != entry:
+            return None
+        if self.in_flight >= max(1, int(self.concurrency_limit)):
+            return None
+        now = time.monotonic()
+        delay = max(self._blocked_until - now,
+                    self.request_bucket.time_until_available(1, now))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.time_until_available(estimated_tokens, now))
+        return delay if delay > 0 else 0
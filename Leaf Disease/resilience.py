@@ -0,0 +1,186 @@
+"""
+Resilience module for Leaf Disease Detection System.
+
+This module keeps slow or failing vision model calls from dominating request
+latency and from tying up workers while the upstream API is unhealthy.
+
+Classes:
+    RetryPolicy: Bounded retries with full-jitter exponential backoff
+    LatencyTracker: Sliding window of call latencies used for hedging deadlines
+    CircuitBreaker: Fails fast after repeated upstream failures
+    CircuitOpenError: Raised when the breaker rejects a call
+
+Usage:
+    >>> breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    >>> breaker.before_call()          # raises CircuitOpenError while open
+    >>> breaker.record_success()
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from groq import APIConnectionError, InternalServerError
+
+# Errors worth retrying: network failures, timeouts and 5xx responses.
+# 429s are handled by the rate limit scheduler instead.
+TRANSIENT_ERRORS = (APIConnectionError, InternalServerError)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Vision model temporarily unavailable, "
+                         f"retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """
+    Bounded retry policy with full-jitter exponential backoff.
+
+    The delay before retry n (0-based) is drawn uniformly from
+    [0, min(max_delay, base_delay * 2**n)], which spreads the retries of
+    concurrent callers instead of having them hit the API in lockstep.
+
+    Attributes:
+        max_attempts (int): Total attempts including the first call
+        base_delay (float): Backoff ceiling of the first retry in seconds
+        max_delay (float): Upper bound of any backoff in seconds
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Return True for transient upstream errors."""
+        return isinstance(error, TRANSIENT_ERRORS)
+
+    def backoff(self, retry: int) -> float:
+        """Return the jittered delay in seconds before the given retry."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+
+class LatencyTracker:
+    """
+    Sliding window of successful call latencies.
+
+    Attributes:
+        window (int): Number of recent samples kept
+        min_samples (int): Samples required before percentile() answers
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add the latency of a successful call."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Return the given latency percentile, or None until enough samples exist.
+
+        Args:
+            percent (float): Percentile between 0 and 100
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100.0))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    States:
+        closed: calls pass through; `failure_threshold` consecutive transient
+                failures open the circuit.
+        open: calls are rejected with CircuitOpenError for `reset_timeout`
+              seconds.
+        half_open: a single trial call is let through; success closes the
+                   circuit, failure opens it again.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds the circuit stays open before a trial call
+        state (str): 'closed', 'open' or 'half_open'
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self) -> None:
+        """
+        Admit or reject a call.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with the
+                              trial call already in flight
+        """
+        with self._lock:
+            if self.state == 'open':
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(remaining)
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.reset_timeout)
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self.state = 'closed'
+
+    def record_failure(self) -> None:
+        """Count a transient failure and open the circuit if needed."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed transiently."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        """Return breaker state and counters for monitoring."""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
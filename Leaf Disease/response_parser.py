@@ -0,0 +1,303 @@
+"""
+Response parsing module for Leaf Disease Detection System.
+
+Turns the vision model's answer into validated analysis fields. The fast
+path is one JSON parse of the whole answer, which is what JSON mode returns.
+Answers wrapped in prose or markdown fences fall back to a bounded extractor
+that decodes the first JSON object within MAX_RESPONSE_CHARS characters, and
+common defects (trailing commas, Python literals, output cut off at the token
+limit) are repaired locally. Every field is then validated and coerced to the
+schema of DiseaseAnalysisResult.
+
+orjson is used for the fast path when it is installed (`pip install orjson`);
+otherwise the standard library json module is used.
+
+Classes:
+    ResponseParseError: Raised when no analysis can be recovered from an answer
+    ParseStats: Counters of parse outcomes, reported in /metrics
+
+Usage:
+    >>> stats = ParseStats()
+    >>> fields = parse_analysis(completion.choices[0].message.content, stats)
+    >>> result = DiseaseAnalysisResult(**fields)
+"""
+
+import json
+import math
+import re
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+# Only this much of an answer is searched or repaired
+MAX_RESPONSE_CHARS = 20000
+# Opening braces tried by the extractor before giving up
+MAX_OBJECT_CANDIDATES = 8
+# Items kept per list field
+MAX_LIST_ITEMS = 10
+
+DISEASE_TYPES = ('fungal', 'bacterial', 'viral', 'pest', 'nutrient deficiency',
+                 'healthy', 'invalid_image')
+DISEASE_TYPE_ALIASES = {'fungus': 'fungal', 'fungal infection': 'fungal',
+                        'bacteria': 'bacterial', 'bacterial infection': 'bacterial',
+                        'virus': 'viral', 'viral infection': 'viral',
+                        'pests': 'pest', 'insect': 'pest', 'insects': 'pest',
+                        'nutrient_deficiency': 'nutrient deficiency',
+                        'nutritional deficiency': 'nutrient deficiency',
+                        'deficiency': 'nutrient deficiency',
+                        'invalid': 'invalid_image', 'invalid image': 'invalid_image'}
+SEVERITIES = ('mild', 'moderate', 'severe', 'none')
+SEVERITY_ALIASES = {'low': 'mild', 'minor': 'mild', 'medium': 'moderate',
+                    'high': 'severe', 'critical': 'severe', 'n/a': 'none', 'null': 'none'}
+LIST_FIELDS = ('symptoms', 'possible_causes', 'treatment')
+# At least one of these must be present for an object to count as an analysis
+ANALYSIS_KEYS = {'disease_detected', 'disease_name', 'disease_type'}
+# Objects found inside other text must have this key, so that a nested or
+# unrelated object is not mistaken for the analysis
+EXTRACT_REQUIRED_KEY = 'disease_detected'
+
+_FENCE = re.compile(r"```[a-zA-Z]*[ \t]*\n?|```")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = re.compile(r"\b(True|False|None)\b")
+_PYTHON_TO_JSON = {'True': 'true', 'False': 'false', 'None': 'null'}
+_decoder = json.JSONDecoder()
+
+
+class ResponseParseError(ValueError):
+    """Raised when no analysis object can be recovered from a model answer."""
+
+
+class ParseStats:
+    """
+    Thread-safe counters of parse outcomes.
+
+    Counters:
+        direct: answers that parsed as a whole (the JSON mode fast path)
+        extracted: answers whose JSON object was found inside other text
+        repaired: answers that parsed only after local repair
+        unparseable: answers from which no analysis could be recovered
+        corrected_fields: fields coerced to the schema (wrong type, out of
+            range or unknown enum value)
+        repair_calls: unparseable answers sent back to the model to be fixed
+        repair_failures: repair answers that were still unparseable
+    """
+
+    COUNTERS = ('direct', 'extracted', 'repaired', 'unparseable', 'corrected_fields',
+                'repair_calls', 'repair_failures')
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, counter: str, count: int = 1) -> None:
+        with self._lock:
+            self._counts[counter] += count
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        counts['json_backend'] = JSON_BACKEND
+        return counts
+
+
+def _as_object(text: str) -> Optional[Dict]:
+    try:
+        value = _loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _extract_object(text: str) -> Optional[Dict]:
+    """
+    Decode the first JSON analysis object in `text` (one with
+    EXTRACT_REQUIRED_KEY), trying at most MAX_OBJECT_CANDIDATES braces.
+    """
+    text = text[:MAX_RESPONSE_CHARS]
+    start = text.find('{')
+    for _ in range(MAX_OBJECT_CANDIDATES):
+        if start < 0:
+            return None
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            if isinstance(value, dict) and EXTRACT_REQUIRED_KEY in value:
+                return value
+        except ValueError:
+            pass
+        start = text.find('{', start + 1)
+    return None
+
+
+def _repair(text: str) -> Optional[str]:
+    """
+    Fix common defects in the analysis object of `text`: markdown fences,
+    trailing commas, Python literals and an answer cut off mid-object (open
+    strings, arrays and objects are closed). The object is the one opening
+    just before the first EXTRACT_REQUIRED_KEY, or the first one in `text`.
+    """
+    text = _FENCE.sub('', text[:MAX_RESPONSE_CHARS])
+    key = text.find(f'"{EXTRACT_REQUIRED_KEY}"')
+    start = text.rfind('{', 0, key) if key >= 0 else -1
+    if start < 0:
+        start = text.find('{')
+    if start < 0:
+        return None
+    text = _PYTHON_LITERALS.sub(lambda match: _PYTHON_TO_JSON[match.group()], text[start:])
+
+    closers = []
+    in_string = escaped = False
+    end = len(text)
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if closers:
+                closers.pop()
+            if not closers:
+                end = index + 1
+                break
+    text = text[:end]
+
+    if closers:
+        # Cut off at the token limit: finish the open string, drop a dangling
+        # separator and close what is still open
+        if in_string:
+            text += '"'
+        text = text.rstrip().rstrip(',')
+        if text.endswith(':'):
+            text += ' null'
+        text += ''.join(reversed(closers))
+    return _TRAILING_COMMA.sub(r'\1', text)
+
+
+def _as_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text if text and text.lower() not in ('null', 'none', 'n/a') else None
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 'yes', '1')
+    return bool(value)
+
+
+def _as_confidence(value) -> float:
+    """Confidence as a float clamped to 0-100 ('85%' and '85' are accepted)."""
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if math.isnan(confidence):
+        return 0.0
+    return min(100.0, max(0.0, confidence))
+
+
+def _as_list(value) -> List[str]:
+    """A list of non-empty strings; a single string becomes a one-item list."""
+    if value is None:
+        return []
+    if isinstance(value, (str, int, float)):
+        value = [value]
+    elif isinstance(value, dict):
+        value = list(value.values())
+    items = [str(item).strip() for item in value if item is not None]
+    return [item for item in items if item][:MAX_LIST_ITEMS]
+
+
+def validate_analysis(data: Dict, stats: Optional[ParseStats] = None) -> Dict:
+    """
+    Validate a decoded answer and coerce it to the DiseaseAnalysisResult fields.
+
+    disease_type and severity are lower-cased, common synonyms are mapped to
+    DISEASE_TYPES and SEVERITIES and anything else becomes 'unknown';
+    confidence is clamped to 0-100, list fields become lists of strings, and
+    healthy or invalid images are never reported as diseased.
+
+    Raises:
+        ResponseParseError: If `data` is not an analysis object
+    """
+    if not isinstance(data, dict) or not ANALYSIS_KEYS & data.keys():
+        raise ResponseParseError("Answer is not an analysis object")
+
+    disease_type = (_as_text(data.get('disease_type')) or 'unknown').lower()
+    disease_type = DISEASE_TYPE_ALIASES.get(disease_type, disease_type)
+    if disease_type not in DISEASE_TYPES:
+        disease_type = 'unknown'
+    disease_detected = (_as_bool(data.get('disease_detected'))
+                        and disease_type not in ('healthy', 'invalid_image'))
+    severity = (_as_text(data.get('severity')) or ('unknown' if disease_detected else 'none')).lower()
+    severity = SEVERITY_ALIASES.get(severity, severity)
+    fields = {
+        'disease_detected': disease_detected,
+        'disease_name': _as_text(data.get('disease_name')),
+        'disease_type': disease_type,
+        'severity': severity if severity in SEVERITIES else 'unknown',
+        'confidence': _as_confidence(data.get('confidence', 0)),
+        **{name: _as_list(data.get(name)) for name in LIST_FIELDS}
+    }
+    if stats is not None:
+        corrected = sum(1 for name, value in fields.items()
+                        if name in data and data[name] != value)
+        if corrected:
+            stats.record('corrected_fields', corrected)
+    return fields
+
+
+def parse_analysis(response_content: str, stats: Optional[ParseStats] = None) -> Dict:
+    """
+    Parse a model answer into validated DiseaseAnalysisResult fields.
+
+    Tries, in order: the whole answer as JSON, the first JSON object inside
+    it, and the first object after local repair.
+
+    Args:
+        response_content (str): Raw answer of the model
+        stats (Optional[ParseStats]): Counters to record the outcome in
+
+    Returns:
+        Dict: Validated analysis fields
+
+    Raises:
+        ResponseParseError: If no analysis object can be recovered
+    """
+    text = (response_content or '').strip()
+    outcome = 'direct'
+    data = _as_object(text)
+    if data is None:
+        outcome = 'extracted'
+        data = _extract_object(text)
+    if data is None:
+        outcome = 'repaired'
+        repaired = _repair(text)
+        data = _as_object(repaired) if repaired else None
+    try:
+        if data is None:
+            raise ResponseParseError(f"No JSON object in model answer: {text[:200]}")
+        fields = validate_analysis(data, stats)
+    except ResponseParseError:
+        if stats is not None:
+            stats.record('unparseable')
+        raise
+    if stats is not None:
+        stats.record(outcome)
+    return fields
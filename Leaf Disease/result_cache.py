@@ -0,0 +1,214 @@
+"""
+Result cache module for Leaf Disease Detection System.
+
+This module provides a content-addressed cache for disease analysis results.
+Re-uploads of the same leaf photo are answered from memory instead of paying
+for another vision model round trip.
+
+Classes:
+    ResultCache: In-memory LRU cache with TTL eviction and an optional
+                 persistent tier
+
+Usage:
+    >>> cache = ResultCache(max_entries=1024, ttl_seconds=3600)
+    >>> key = ResultCache.make_key(image_bytes, "model", "v1", 0.3, 1024)
+    >>> cache.get(key) is None
+    True
+"""
+
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Content-addressed LRU cache for analysis results.
+
+    Entries are keyed on a SHA-256 hash of the decoded image bytes together
+    with every parameter that influences the model output (model name, prompt
+    version, temperature and max tokens). The in-memory tier evicts the least
+    recently used entry once `max_entries` is reached and drops entries older
+    than `ttl_seconds` from lookups. Expired entries stay in memory until LRU
+    eviction so get_stale() can still serve them while the model is
+    unavailable. An optional persistent tier (any object exposing
+    get_cached_result/save_cached_result, e.g. DiseaseHistoryDB) survives
+    restarts and is consulted on memory misses.
+
+    Attributes:
+        max_entries (int): Maximum number of results kept in memory
+        ttl_seconds (float): Lifetime of a cached result in seconds
+        persistent_store: Optional second-tier store
+        hits (int): Number of lookups answered from cache
+        misses (int): Number of lookups that required a model call
+        evictions (int): Number of entries evicted by size
+        stale_hits (int): Number of expired results served by get_stale()
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400,
+                 persistent_store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_store = persistent_store
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model_name: str, prompt_version: str,
+                 temperature: float, max_tokens: int) -> str:
+        """
+        Build the cache key for an image and its analysis parameters.
+
+        Args:
+            image_bytes (bytes): Decoded image data
+            model_name (str): Vision model identifier
+            prompt_version (str): Version of the analysis prompt
+            temperature (float): Model temperature
+            max_tokens (int): Maximum completion tokens
+
+        Returns:
+            str: Hex digest identifying the analysis request
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(
+            f"|{model_name}|{prompt_version}|{temperature}|{max_tokens}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): Cache key from make_key()
+
+        Returns:
+            Optional[Dict]: Copy of the cached result with 'cached' set to True,
+                            or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._mark_cached(result)
+
+        if self.persistent_store is not None:
+            try:
+                result = self.persistent_store.get_cached_result(
+                    key, max_age_seconds=self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Persistent cache lookup failed: {str(e)}")
+                result = None
+            if result is not None:
+                self._store(key, result)
+                with self._lock:
+                    self.hits += 1
+                    self.persistent_hits += 1
+                return self._mark_cached(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result regardless of its age.
+
+        Used as a degraded answer when the vision model cannot be reached.
+
+        Args:
+            key (str): Cache key from make_key()
+
+        Returns:
+            Optional[Dict]: Copy of the result with 'cached' and 'stale' set to
+                            True, or None if the image was never analyzed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        result = entry[1] if entry is not None else None
+
+        if result is None and self.persistent_store is not None:
+            try:
+                result = self.persistent_store.get_cached_result(key)
+            except Exception as e:
+                logger.warning(f"Persistent cache lookup failed: {str(e)}")
+        if result is None:
+            return None
+
+        with self._lock:
+            self.stale_hits += 1
+        stale = self._mark_cached(result)
+        stale['stale'] = True
+        return stale
+
+    def set(self, key: str, result: Dict) -> None:
+        """
+        Store a fresh analysis result in every cache tier.
+
+        Args:
+            key (str): Cache key from make_key()
+            result (Dict): Analysis result as returned by the detector
+        """
+        result = {k: v for k, v in result.items() if k not in ('cached', 'stale')}
+        self._store(key, result)
+        if self.persistent_store is not None:
+            try:
+                self.persistent_store.save_cached_result(key, result)
+            except Exception as e:
+                logger.warning(f"Persistent cache write failed: {str(e)}")
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the persistent tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """
+        Return hit/miss counters for monitoring.
+
+        Returns:
+            Dict: Entry count, limits, hits, misses, evictions, stale hits
+                  and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persistent': self.persistent_store is not None,
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale_hits': self.stale_hits,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _store(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _mark_cached(result: Dict) -> Dict:
+        cached = copy.deepcopy(result)
+        cached['cached'] = True
+        return cached
@@ -0,0 +1,109 @@
+"""
+Vectorized analytics over the analysis history for the dashboard.
+
+The history of a date window is loaded once, in chunks, into a typed pandas
+DataFrame (history_frame): disease_type and severity are categoricals,
+timestamps are UTC datetime64 and confidence is float32. Every breakdown below is
+a group-by or value count over that frame, so the dashboard stays interactive
+with 100k+ records instead of looping over a list of dicts.
+"""
+
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+from database import HISTORY_ROW_COLUMNS
+
+FRAME_COLUMNS = ['id', 'timestamp', 'disease_detected', 'disease_name', 'disease_type',
+                 'severity', 'confidence', 'image_filename']
+CATEGORY_COLUMNS = ('disease_type', 'severity')
+
+
+def _typed(frame: pd.DataFrame) -> pd.DataFrame:
+    """Cast the numeric, boolean and time columns of a raw history chunk."""
+    frame = frame.assign(
+        id=frame['id'].astype('int64'),
+        # UTC, so that days match the date(timestamp) days of the rollup tables
+        timestamp=pd.to_datetime(pd.to_numeric(frame['epoch_ms']), unit='ms'),
+        disease_detected=frame['disease_detected'].fillna(0).astype(bool),
+        confidence=pd.to_numeric(frame['confidence'], errors='coerce').astype('float32'))
+    return frame[FRAME_COLUMNS]
+
+
+def history_frame(chunks: Iterable[List[tuple]]) -> pd.DataFrame:
+    """
+    Build the typed history frame from chunks of HISTORY_ROW_COLUMNS tuples
+    (as yielded by database.query_history_rows).
+
+    Each chunk is typed as it arrives; the categorical columns are cast once
+    at the end so every chunk shares the same categories.
+    """
+    columns = list(HISTORY_ROW_COLUMNS)
+    frames = [_typed(pd.DataFrame.from_records(chunk, columns=columns)) for chunk in chunks]
+    if not frames:
+        frames = [_typed(pd.DataFrame(columns=columns))]
+    frame = pd.concat(frames, ignore_index=True)
+    return frame.astype({column: 'category' for column in CATEGORY_COLUMNS})
+
+
+def frame_from_analyses(analyses: List[Dict]) -> pd.DataFrame:
+    """Build the typed history frame from analysis dicts (e.g. sample data)."""
+    frame = pd.DataFrame.from_records(analyses, columns=FRAME_COLUMNS)
+    timestamps = pd.to_datetime(frame['timestamp'], format='ISO8601', utc=True)
+    rows = frame.assign(epoch_ms=timestamps.dt.as_unit('ms').astype('int64'))[list(HISTORY_ROW_COLUMNS)]
+    return history_frame([list(rows.itertuples(index=False, name=None))])
+
+
+def _counts(values: pd.Series) -> pd.Series:
+    """Value counts, largest first, without categories that never occur."""
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+
+def type_distribution(frame: pd.DataFrame) -> pd.Series:
+    """Detections per disease type."""
+    return _counts(frame.loc[frame['disease_detected'], 'disease_type'])
+
+
+def severity_distribution(frame: pd.DataFrame) -> pd.Series:
+    """Detections per severity level."""
+    return _counts(frame.loc[frame['disease_detected'], 'severity'])
+
+
+def confidence_histogram(frame: pd.DataFrame, bin_width: int = 10) -> pd.Series:
+    """Number of analyses per confidence band (0-10%, 10-20%, ...)."""
+    edges = list(range(0, 100 + bin_width, bin_width))
+    labels = [f"{low}-{high}%" for low, high in zip(edges[:-1], edges[1:])]
+    bands = pd.cut(frame['confidence'], bins=edges, labels=labels, include_lowest=True)
+    return bands.value_counts(sort=False)
+
+
+def _days(frame: pd.DataFrame) -> pd.Series:
+    return frame['timestamp'].dt.floor('D').rename('day')
+
+
+def daily_counts_by_type(frame: pd.DataFrame) -> pd.DataFrame:
+    """Detections per day (rows, gap days filled with 0) and disease type (columns)."""
+    detected = frame[frame['disease_detected']]
+    if detected.empty:
+        return pd.DataFrame()
+    counts = (detected.groupby([_days(detected), 'disease_type'], observed=True)
+              .size().unstack(fill_value=0))
+    return counts.asfreq('D', fill_value=0)
+
+
+def rolling_activity(frame: pd.DataFrame, window: int = 7) -> pd.DataFrame:
+    """
+    Daily analyses and detections with `window`-day rolling sums, and the
+    rolling detection rate (detections as a percentage of analyses).
+    """
+    if frame.empty:
+        return pd.DataFrame()
+    daily = (frame.groupby(_days(frame))['disease_detected']
+             .agg(analyses='size', detections='sum')
+             .asfreq('D', fill_value=0))
+    rolling = daily.rolling(window, min_periods=1).sum()
+    analyses = rolling['analyses'].where(rolling['analyses'] > 0)
+    daily['rolling_analyses'] = rolling['analyses']
+    daily['rolling_detection_rate'] = (rolling['detections'] / analyses * 100).fillna(0)
+    return daily
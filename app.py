@@ -1,19 +1,72 @@
-from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Response, Query, Depends
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import base64
+import io
+import json
 import logging
+import math
 import os
-from utils import convert_image_to_base64_and_test, test_with_base64_data
+import zipfile
+from dotenv import load_dotenv
+from utils import (UPSTREAM_ERRORS, convert_image_to_base64_and_test_async,
+                   configure_detector, shutdown_detector_async,
+                   summarize_batch_results)
+# Importable once utils has put the Leaf Disease directory on sys.path
+from config import AppConfig
+from main import LeafDiseaseDetector
+from perceptual_hash import NearDuplicateIndex, dhash, hash_from_hex, hash_to_hex
+from prompts import get_prompt
+from groq import RateLimitError
+from rate_limiter import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, SchedulerQueueFullError,
+                          retry_after_seconds)
+from resilience import CircuitOpenError
+from response_parser import ResponseParseError
+from image_preprocessing import THUMBNAIL_SIZES
+from exporter import EXPORT_FORMATS, export_stream, parquet_schema
+from reports import ReportManager
 from database import db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared detector once at startup and release it on shutdown."""
+    load_dotenv()
+    app.state.config = AppConfig.from_env(require_api_key=False)
+    app.state.analyzer = _analyzer_tag(app.state.config)
+    app.state.phash_index = NearDuplicateIndex()
+    if app.state.config.near_duplicate_enabled and app.state.analyzer:
+        for analysis_id, phash in await run_in_threadpool(db.get_image_phashes,
+                                                          app.state.analyzer):
+            app.state.phash_index.add(hash_from_hex(phash), analysis_id)
+        logger.info(f"Indexed {len(app.state.phash_index)} perceptual hashes")
+    try:
+        app.state.detector = configure_detector(config=app.state.config)
+    except Exception as e:
+        # Keep serving history/stats; detection requests will report the error
+        logger.warning(f"Leaf disease detector not initialized at startup: {str(e)}")
+        app.state.detector = None
+    config = app.state.config
+    app.state.reports = ReportManager(db, config.report_dir, config.report_workers,
+                                      config.report_image_workers)
+    yield
+    await run_in_threadpool(app.state.reports.shutdown)
+    await shutdown_detector_async()
+    db.close()
+
 app = FastAPI(
     title="Leaf Disease Detection API", 
     version="2.0.0",
-    description="Enterprise-grade AI-powered leaf disease detection system with history tracking"
+    description="Enterprise-grade AI-powered leaf disease detection system with history tracking",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -25,6 +78,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _analyzer_tag(config: AppConfig) -> Optional[str]:
+    """Model and prompt version behind new analyses, or None for an unknown prompt variant."""
+    try:
+        return f"{LeafDiseaseDetector.MODEL_NAME}|{get_prompt(config.prompt_variant).version}"
+    except ValueError:
+        return None
+
+def _reuse_tag(result: Dict) -> Optional[str]:
+    """
+    Analyzer tag to store with a result, or None if near duplicates may not reuse it.
+
+    Pre-filter rejections and invalid images are never reused (the result cache
+    does not keep rejections either), so the next upload gets a fresh look.
+    """
+    if result.get('prefiltered') or result.get('disease_type') == 'invalid_image':
+        return None
+    return app.state.analyzer
+
+def _compute_phash(contents: bytes) -> Optional[int]:
+    """Perceptual hash of an upload, or None if it cannot be decoded as an image."""
+    try:
+        return dhash(contents)
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {str(e)}")
+        return None
+
+async def _analyze_upload(contents: bytes, priority: int = PRIORITY_INTERACTIVE
+                          ) -> Tuple[Optional[Dict], Optional[int]]:
+    """
+    Analyze one uploaded image.
+
+    Reuses the diagnosis of a previously stored, perceptually near-identical
+    image when one is within the configured Hamming distance; otherwise calls
+    the vision model at the given rate limiter priority. Only diagnoses made
+    by the current model and prompt version are indexed, and matches whose
+    history row has been deleted are dropped from the index. Returns the
+    result and the upload's perceptual hash.
+    """
+    config = app.state.config
+    phash = None
+    if config.near_duplicate_enabled:
+        phash = await run_in_threadpool(_compute_phash, contents)
+    while phash is not None:
+        match = app.state.phash_index.find(phash, config.near_duplicate_max_distance)
+        if match is None:
+            break
+        analysis_id, distance = match
+        result = await run_in_threadpool(db.get_analysis_result, analysis_id)
+        if result is None:
+            app.state.phash_index.remove(analysis_id)
+            continue
+        logger.info(f"Near duplicate of analysis #{analysis_id} (distance {distance})")
+        result.update(
+            analysis_timestamp=datetime.now().astimezone().isoformat(),
+            cached=True,
+            near_duplicate_of=analysis_id
+        )
+        return result, phash
+
+    result = await convert_image_to_base64_and_test_async(contents, priority=priority)
+    return result, phash
+
+async def _save_upload(result: Dict, filename: str, contents: bytes,
+                       phash: Optional[int]) -> int:
+    """Persist an analysis and index its perceptual hash if it may be reused."""
+    analyzer = _reuse_tag(result)
+    analysis_id = await run_in_threadpool(
+        db.save_analysis, result, filename, contents,
+        hash_to_hex(phash) if phash is not None else None, analyzer)
+    if phash is not None and analyzer:
+        app.state.phash_index.add(phash, analysis_id)
+    return analysis_id
+
 @app.post('/disease-detection-file', summary="Detect disease in leaf image", 
           description="Upload a leaf image file for comprehensive disease analysis")
 async def disease_detection_file(file: UploadFile = File(...)):
@@ -38,12 +164,12 @@ async def disease_detection_file(file: UploadFile = File(...)):
         # Read uploaded file into memory
         contents = await file.read()
         
-        # Process file directly from memory
-        result = convert_image_to_base64_and_test(contents)
+        # Process file directly from memory without blocking the event loop
+        result, phash = await _analyze_upload(contents)
         
         # Save to database if valid result, including the image data
         if result is not None:
-            db.save_analysis(result, file.filename, contents)
+            await _save_upload(result, file.filename, contents, phash)
         
         if result is None:
             raise HTTPException(status_code=500, detail="Failed to process image file")
@@ -51,10 +177,226 @@ async def disease_detection_file(file: UploadFile = File(...)):
         return JSONResponse(content=result)
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        # Fail fast while the vision model is down instead of queueing uploads
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except SchedulerQueueFullError as e:
+        # Shed load instead of queueing uploads behind a long backlog
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except RateLimitError as e:
+        # Groq kept answering 429 after the scheduler's retries
+        retry_after = retry_after_seconds(e) or 1
+        raise HTTPException(status_code=429, detail="Vision model rate limit exceeded",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+    except ResponseParseError as e:
+        # The model answered, but not with a usable analysis
+        raise HTTPException(status_code=502, detail=f"Invalid model response: {str(e)}")
     except Exception as e:
         logger.error(f"Error in disease detection (file): {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _extract_zip(contents: bytes, supported_formats: tuple, max_files: int,
+                 max_image_bytes: int, max_total_bytes: int) -> List[Tuple[str, bytes]]:
+    """
+    Return (filename, bytes) for each supported image inside a zip archive.
+    
+    Member count and uncompressed sizes are checked against the archive
+    directory before anything is unpacked, so a zip bomb is rejected without
+    being inflated; zipfile never reads a member past its declared size.
+    """
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                   and info.filename.lower().endswith(supported_formats)]
+        if len(members) > max_files:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_files} images")
+        total = 0
+        for info in members:
+            if info.file_size > max_image_bytes:
+                raise HTTPException(status_code=413,
+                                    detail=f"{info.filename} exceeds {max_image_bytes} bytes")
+            total += info.file_size
+            if total > max_total_bytes:
+                raise HTTPException(status_code=413,
+                                    detail=f"Unzipped batch exceeds {max_total_bytes} bytes")
+        return [(os.path.basename(info.filename), archive.read(info)) for info in members]
+
+async def _read_batch_files(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """
+    Read uploaded files into memory, expanding zip archives into their images.
+    
+    The file count and the upload sizes Starlette recorded while spooling the
+    request are checked before a file is read; archives count at their
+    unzipped size.
+    """
+    config = app.state.config
+    max_files, max_total = config.batch_max_files, config.batch_max_total_bytes
+    if len(files) > max_files:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {max_files} images")
+    images = []
+    total = 0
+    for file in files:
+        if total + (file.size or 0) > max_total:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_total} bytes")
+        contents = await file.read()
+        if (file.filename or '').lower().endswith('.zip') or zipfile.is_zipfile(io.BytesIO(contents)):
+            try:
+                members = await run_in_threadpool(
+                    _extract_zip, contents, config.supported_formats + ('.webp',),
+                    max_files - len(images), config.batch_max_image_bytes, max_total - total)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400,
+                                    detail=f"Invalid zip archive: {file.filename}")
+            images.extend(members)
+            total += sum(len(data) for _, data in members)
+        else:
+            if len(contents) > config.batch_max_image_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{file.filename} exceeds {config.batch_max_image_bytes} bytes")
+            images.append((file.filename, contents))
+            total += len(contents)
+        if total > max_total:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_total} bytes")
+        if len(images) > max_files:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_files} images")
+    return images
+
+async def _analyze_batch_item(semaphore: asyncio.Semaphore, filename: str,
+                              contents: bytes) -> Tuple[Dict, Optional[int]]:
+    """Analyze one batch image under the batch concurrency limit and timeout."""
+    async with semaphore:
+        try:
+            result, phash = await asyncio.wait_for(
+                _analyze_upload(contents, PRIORITY_BATCH),
+                timeout=app.state.config.batch_item_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Batch item timed out: {filename}")
+            return {"filename": filename, "status": "error",
+                    "error": "Analysis timed out"}, None
+        except UPSTREAM_ERRORS as e:
+            return {"filename": filename, "status": "error", "error": str(e)}, None
+    if result is None:
+        return {"filename": filename, "status": "error",
+                "error": "Failed to process image file"}, None
+    return {"filename": filename, "status": "ok", "result": result}, phash
+
+async def _save_batch(images: List[Tuple[str, bytes]],
+                      outcomes: List[Tuple[Dict, Optional[int]]]) -> None:
+    """
+    Persist every successful batch analysis in one transaction.
+
+    Sets `analysis_id` on each saved item and indexes the perceptual hashes
+    of results that may be reused.
+    """
+    saved = [(index, phash, _reuse_tag(item["result"]))
+             for index, (item, phash) in enumerate(outcomes) if item["status"] == "ok"]
+    if not saved:
+        return
+    analysis_ids = await run_in_threadpool(db.save_analyses, [
+        (outcomes[index][0]["result"], images[index][0], images[index][1],
+         hash_to_hex(phash) if phash is not None else None, analyzer)
+        for index, phash, analyzer in saved])
+    for (index, phash, analyzer), analysis_id in zip(saved, analysis_ids):
+        outcomes[index][0]["analysis_id"] = analysis_id
+        if phash is not None and analyzer:
+            app.state.phash_index.add(phash, analysis_id)
+
+@app.post('/disease-detection-batch', summary="Detect disease in many leaf images",
+          description="Upload several leaf images (or zip archives of images) for concurrent analysis")
+async def disease_detection_batch(files: List[UploadFile] = File(...)):
+    """
+    Endpoint to analyze a batch of leaf images concurrently.
+    Accepts multipart/form-data with one or more `files` fields; zip archives
+    are expanded into the images they contain. Results of all images are
+    saved in a single transaction.
+    """
+    try:
+        images = await _read_batch_files(files)
+        if not images:
+            raise HTTPException(status_code=400, detail="No images found in upload")
+        logger.info(f"Received batch of {len(images)} images for disease detection")
+        
+        semaphore = asyncio.Semaphore(app.state.config.batch_concurrency)
+        outcomes = await asyncio.gather(*(
+            _analyze_batch_item(semaphore, filename, contents)
+            for filename, contents in images))
+        items = [item for item, _ in outcomes]
+        await _save_batch(images, outcomes)
+        
+        summary = summarize_batch_results([item.get("result") for item in items])
+        logger.info(f"Batch disease detection completed: {summary}")
+        return JSONResponse(content={"results": items, "summary": summary})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch disease detection: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+def _format_stream_record(record: Dict, sse: bool) -> str:
+    """Encode one streamed batch record as an NDJSON line or an SSE event."""
+    payload = json.dumps(record)
+    if sse:
+        return f"event: {record['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@app.post('/disease-detection-batch/stream', summary="Stream batch analysis results",
+          description="Upload several leaf images and receive each result as soon as it is ready")
+async def disease_detection_batch_stream(request: Request,
+                                         files: List[UploadFile] = File(...)):
+    """
+    Streaming variant of /disease-detection-batch.
+    Emits one `{"type": "result", "index": ..., ...}` record per image in
+    completion order, followed by a final `{"type": "summary", ...}` record.
+    Responds with NDJSON, or Server-Sent Events when the client sends
+    `Accept: text/event-stream`. Results are saved in one transaction before
+    the summary is sent.
+    """
+    # Read uploads before streaming; they are closed once the handler returns
+    images = await _read_batch_files(files)
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    logger.info(f"Received streaming batch of {len(images)} images for disease detection")
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    
+    async def events():
+        semaphore = asyncio.Semaphore(app.state.config.batch_concurrency)
+        outcomes = [None] * len(images)
+        
+        async def run(index: int, filename: str, contents: bytes):
+            return index, await _analyze_batch_item(semaphore, filename, contents)
+        
+        tasks = [asyncio.create_task(run(index, filename, contents))
+                 for index, (filename, contents) in enumerate(images)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, outcome = await next_done
+                outcomes[index] = outcome
+                yield _format_stream_record({"type": "result", "index": index, **outcome[0]}, sse)
+            
+            await _save_batch(images, outcomes)
+            summary = summarize_batch_results([item.get("result") for item, _ in outcomes])
+            logger.info(f"Streaming batch disease detection completed: {summary}")
+            yield _format_stream_record({
+                "type": "summary",
+                "summary": summary,
+                "analysis_ids": [item.get("analysis_id") for item, _ in outcomes]
+            }, sse)
+        except Exception as e:
+            logger.error(f"Error in streaming batch disease detection: {str(e)}")
+            yield _format_stream_record({"type": "error", "error": str(e)}, sse)
+        finally:
+            # Stop outstanding model calls if the client went away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/", summary="API Root", description="Root endpoint providing API information")
 async def root():
     """Root endpoint providing API information"""
@@ -64,37 +406,270 @@ async def root():
         "description": "Enterprise-grade AI-powered leaf disease detection system",
         "endpoints": {
             "disease_detection_file": "/disease-detection-file (POST, file upload)",
-            "analysis_history": "/analysis-history (GET, retrieve analysis history)",
-            "statistics": "/stats (GET, retrieve system statistics)"
+            "disease_detection_batch": "/disease-detection-batch (POST, multiple files or zip)",
+            "disease_detection_batch_stream": "/disease-detection-batch/stream (POST, NDJSON/SSE results as they finish)",
+            "analysis_history": "/analysis-history (GET, paginated and filterable history)",
+            "analysis_search": "/analysis-search?q=... (GET, full-text search of past diagnoses)",
+            "export": "/export?format=csv|ndjson|parquet&gzip=true (GET, streamed history download)",
+            "reports": "/reports (POST, start a PDF report job; GET /reports/{id} for progress)",
+            "analysis_image": "/analysis-image/{id} (GET, original image, Range/ETag aware)",
+            "analysis_thumbnail": "/analysis-thumbnail/{id}?size=256 (GET, cached thumbnail)",
+            "statistics": "/stats (GET, retrieve system statistics)",
+            "metrics": "/metrics (GET, cache and runtime counters)"
         }
     }
 
+def _encode_cursor(key: Tuple[str, int]) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def _decode_cursor(token: str) -> Tuple[str, int]:
+    """Decode a token from _encode_cursor, raising 400 if it was tampered with."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        timestamp, analysis_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(timestamp, str) or not isinstance(analysis_id, int):
+            raise ValueError("unexpected cursor contents")
+        return timestamp, analysis_id
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+def _history_filters(disease_type: Optional[str] = None,
+                     severity: Optional[str] = None,
+                     disease_detected: Optional[bool] = None,
+                     min_confidence: Optional[float] = None,
+                     max_confidence: Optional[float] = None,
+                     date_from: Optional[date] = None,
+                     date_to: Optional[date] = None,
+                     filename_prefix: Optional[str] = None) -> Dict:
+    """Query parameters shared by the history listing and export endpoints."""
+    return {
+        "disease_type": disease_type,
+        "severity": severity,
+        "disease_detected": disease_detected,
+        "min_confidence": min_confidence,
+        "max_confidence": max_confidence,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "filename_prefix": filename_prefix
+    }
+
 @app.get("/analysis-history", summary="Get Analysis History", 
-         description="Retrieve recent disease analysis history")
-async def get_analysis_history(limit: int = 10):
-    """Get recent analysis history"""
+         description="Retrieve disease analysis history, newest first, one page at a time")
+async def get_analysis_history(limit: int = Query(10, ge=1, le=500),
+                               cursor: Optional[str] = None,
+                               filters: Dict = Depends(_history_filters)):
+    """
+    Get analysis history with optional filters.
+    
+    Pass the returned `next_cursor` as `cursor` to fetch the following page;
+    it is null on the last page.
+    """
+    after = _decode_cursor(cursor) if cursor else None
     try:
-        history = db.get_recent_analyses(limit)
-        return JSONResponse(content={"history": history})
+        history, next_key = await run_in_threadpool(db.get_analysis_page, limit, after, **filters)
+        return JSONResponse(content={
+            "history": history,
+            "next_cursor": _encode_cursor(next_key) if next_key else None
+        })
     except Exception as e:
         logger.error(f"Error retrieving analysis history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/export", summary="Export Analysis History",
+         description="Stream the analysis history as CSV, NDJSON or Parquet")
+async def export_analysis_history(export_format: str = Query("csv", alias="format",
+                                                             pattern="^(csv|ndjson|parquet)$"),
+                                  gzip: bool = False,
+                                  filters: Dict = Depends(_history_filters)):
+    """
+    Stream the (filtered) history, newest first, as a file download.
+    
+    Rows are read and encoded in batches, so the export runs in constant
+    memory however long the history is. `gzip=true` compresses CSV and NDJSON;
+    Parquet is always compressed internally.
+    """
+    if export_format == "parquet":
+        try:
+            parquet_schema()
+        except ImportError:
+            raise HTTPException(status_code=501,
+                                detail="Parquet export requires pyarrow (pip install pyarrow)")
+    
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"leaf_disease_analysis_history.{extension}"
+    if gzip and export_format != "parquet":
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        export_stream(db, export_format, compress=gzip, **filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/reports", status_code=202, summary="Start PDF Report",
+          description="Queue a PDF report of the (filtered) history with thumbnails")
+async def create_report(limit: int = Query(50, ge=1),
+                        filters: Dict = Depends(_history_filters)):
+    """
+    Start building a PDF report of the newest `limit` analyses in the background.
+    
+    Poll GET /reports/{id} for progress; once its status is "done" the file is
+    served from GET /reports/{id}/download.
+    """
+    max_records = app.state.config.report_max_records
+    if limit > max_records:
+        raise HTTPException(status_code=400,
+                            detail=f"A report can include at most {max_records} analyses")
+    job = app.state.reports.submit(limit, **filters)
+    return JSONResponse(status_code=202, content={
+        **job.to_dict(),
+        "status_url": f"/reports/{job.id}",
+        "download_url": f"/reports/{job.id}/download"
+    })
+
+@app.get("/reports/{job_id}", summary="Get PDF Report Status",
+         description="Progress of a PDF report job")
+async def get_report(job_id: str):
+    """Get the status and progress of a report job"""
+    job = app.state.reports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return JSONResponse(content=job.to_dict())
+
+@app.get("/reports/{job_id}/download", summary="Download PDF Report",
+         description="Download a finished PDF report")
+async def download_report(job_id: str):
+    """Serve the finished PDF of a report job"""
+    job = app.state.reports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report is {job.status}")
+    return FileResponse(job.path, media_type="application/pdf",
+                        filename="leaf_disease_analysis_report.pdf")
+
+@app.get("/analysis-search", summary="Search Analysis History",
+         description="Full-text search over symptoms, causes and treatments")
+async def search_analysis_history(q: str = Query(..., min_length=1, max_length=200),
+                                  limit: int = Query(20, ge=1, le=100)):
+    """
+    Search the diagnosis text of past analyses.
+    
+    Words are matched after stemming (fungicides finds fungicide) and all
+    must appear; wrap words in double quotes to search for a phrase. Each hit
+    includes a `snippet` with the matches in <b> tags.
+    """
+    try:
+        results = await run_in_threadpool(db.search_analyses, q, limit)
+        return JSONResponse(content={"query": q, "results": results})
+    except Exception as e:
+        logger.error(f"Error searching analysis history: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an `If-None-Match` header against an entity tag.
+    
+    Accepts `*` and comma-separated lists, and compares weakly as RFC 9110
+    requires for this header, so `W/"tag"` matches `"tag"`.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header into inclusive offsets.
+    
+    Returns None for headers that should be ignored (other units, multiple
+    ranges, malformed values) and raises 416 for unsatisfiable ranges.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
 @app.get("/analysis-image/{analysis_id}", summary="Get Analysis Image", 
-         description="Retrieve the image for a specific analysis")
-async def get_analysis_image(analysis_id: int):
+         description="Stream the image for a specific analysis (supports Range and ETag)")
+async def get_analysis_image(analysis_id: int, request: Request):
     """Get the image data for a specific analysis"""
     try:
-        image_data = db.get_analysis_image(analysis_id)
-        if image_data is None:
+        info = await run_in_threadpool(db.get_analysis_image_info, analysis_id)
+        if info is None:
             raise HTTPException(status_code=404, detail="Image not found")
-        return Response(content=image_data, media_type="image/jpeg")
+        
+        # Images are content-addressed, so the digest is a strong validator
+        etag = f'"{info["sha256"]}"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes",
+                   "Cache-Control": "public, max-age=86400"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        size = info["size"]
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            byte_range = _parse_range(range_header, size)
+        
+        status_code = 200
+        start, end = 0, size - 1
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        
+        return StreamingResponse(
+            db.iter_image_chunks(info["sha256"], start, end),
+            status_code=status_code, media_type=info["mime_type"], headers=headers)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error retrieving analysis image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/analysis-thumbnail/{analysis_id}", summary="Get Analysis Thumbnail",
+         description="Retrieve a downscaled JPEG of the image for a specific analysis")
+async def get_analysis_thumbnail(analysis_id: int, request: Request, size: int = 256):
+    """Get a cached thumbnail (longest side `size` pixels) for a specific analysis"""
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400,
+                            detail=f"size must be one of {list(THUMBNAIL_SIZES)}")
+    try:
+        thumbnail = await run_in_threadpool(db.get_analysis_thumbnail, analysis_id, size)
+        if thumbnail is None:
+            # No image, or one Pillow cannot decode; /analysis-image still serves the original
+            raise HTTPException(status_code=404, detail="Thumbnail not available")
+        sha256, data, mime_type = thumbnail
+        
+        # An analysis never changes its image, so thumbnails can be cached forever
+        etag = f'"{sha256}-{size}"'
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type=mime_type, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving analysis thumbnail: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.get("/stats", summary="Get System Statistics", 
          description="Retrieve statistics about disease analysis")
 async def get_statistics():
@@ -106,6 +681,23 @@ async def get_statistics():
         logger.error(f"Error retrieving statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/metrics", summary="Get Runtime Metrics",
+         description="Retrieve result cache hit/miss counters, token usage, parse outcomes, pre-filter rejections and other runtime metrics")
+async def get_metrics():
+    """Get runtime metrics for operations dashboards"""
+    detector = getattr(app.state, "detector", None)
+    cache = detector.cache if detector is not None else None
+    scheduler = detector.scheduler if detector is not None else None
+    return JSONResponse(content={
+        "cache": cache.stats() if cache is not None else {"enabled": False},
+        "near_duplicates": app.state.phash_index.stats(),
+        "rate_limiter": scheduler.stats() if scheduler is not None else {"enabled": False},
+        "resilience": detector.resilience_stats() if detector is not None else {},
+        "tokens": detector.token_stats() if detector is not None else {},
+        "parsing": detector.parse_metrics() if detector is not None else {},
+        "prefilter": detector.prefilter_stats() if detector is not None else {}
+    })
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
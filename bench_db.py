@@ -0,0 +1,144 @@
+"""
+Mixed Read/Write Benchmark for the History Database
+===================================================
+
+Runs concurrent writer threads (saving analyses with image data, like the
+upload endpoints) and reader threads (history, image and statistics queries,
+like the dashboard) against two copies of the database:
+
+    per-call   a fresh connection per call with the default rollback journal
+    pooled     DiseaseHistoryDB's thread-local connections in WAL mode
+
+and reports throughput, read latency and lock errors for each.
+
+Usage:
+    python bench_db.py [--seconds 5] [--writers 2] [--readers 4] [--rows 500]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from database import DiseaseHistoryDB
+
+SAMPLE_RESULT = {
+    "disease_detected": True,
+    "disease_name": "Brown Spot",
+    "disease_type": "fungal",
+    "severity": "moderate",
+    "confidence": 87,
+    "symptoms": ["Brown circular lesions with yellow halo"],
+    "possible_causes": ["Fungal infection favoured by humid conditions"],
+    "treatment": ["Apply a copper-based fungicide"]
+}
+
+
+class PerCallConnectionDB(DiseaseHistoryDB):
+    """Baseline reproducing the old behaviour: one rollback-journal connection per call."""
+
+    def get_connection(self) -> sqlite3.Connection:
+        # Closed when the calling method drops its reference
+        return sqlite3.connect(self.db_path)
+
+
+def seed(db: DiseaseHistoryDB, rows: int, image: bytes) -> None:
+    db.save_analyses([(SAMPLE_RESULT, f"seed_{i}.jpg", image, None) for i in range(rows)])
+
+
+def run_workload(db: DiseaseHistoryDB, seconds: float, writers: int, readers: int,
+                 image: bytes, max_id: int) -> dict:
+    """Run writer and reader threads for `seconds` and collect their counters."""
+    stop = threading.Event()
+    lock = threading.Lock()
+    totals = {"writes": 0, "reads": 0, "errors": 0, "read_latencies": []}
+
+    def writer(worker: int):
+        writes = errors = 0
+        while not stop.is_set():
+            try:
+                db.save_analysis(SAMPLE_RESULT, f"bench_{worker}.jpg", image)
+                writes += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            totals["writes"] += writes
+            totals["errors"] += errors
+
+    def reader(worker: int):
+        rng = random.Random(worker)
+        latencies = []
+        errors = 0
+        while not stop.is_set():
+            query = rng.random()
+            start = time.perf_counter()
+            try:
+                if query < 0.5:
+                    db.get_recent_analyses(20)
+                elif query < 0.8:
+                    db.get_analysis_image(rng.randint(1, max_id))
+                else:
+                    db.get_analysis_stats()
+                latencies.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            totals["reads"] += len(latencies)
+            totals["errors"] += errors
+            totals["read_latencies"].extend(latencies)
+
+    threads = ([threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+               + [threading.Thread(target=reader, args=(i,)) for i in range(readers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(totals["read_latencies"]) or [0.0]
+    return {
+        "writes_per_s": totals["writes"] / seconds,
+        "reads_per_s": totals["reads"] / seconds,
+        "read_p50_ms": statistics.median(latencies) * 1000,
+        "read_p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": totals["errors"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration per variant")
+    parser.add_argument("--writers", type=int, default=2, help="writer threads")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--rows", type=int, default=500, help="rows seeded before the run")
+    parser.add_argument("--image-kb", type=int, default=60, help="image size per row")
+    args = parser.parse_args()
+
+    image = os.urandom(args.image_kb * 1024)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, db_class in (("per-call", PerCallConnectionDB),
+                               ("pooled", DiseaseHistoryDB)):
+            db = db_class(str(Path(tmp_dir) / f"{name}.db"))
+            seed(db, args.rows, image)
+            results[name] = run_workload(db, args.seconds, args.writers,
+                                         args.readers, image, args.rows)
+            db.close()
+
+    print(f"\n{args.writers} writers, {args.readers} readers, {args.seconds:.0f}s per variant")
+    print(f"{'Variant':>10} {'Writes/s':>10} {'Reads/s':>10} {'Read p50':>10} "
+          f"{'Read p95':>10} {'Errors':>8}")
+    for name, result in results.items():
+        print(f"{name:>10} {result['writes_per_s']:>10.1f} {result['reads_per_s']:>10.1f} "
+              f"{result['read_p50_ms']:>8.2f}ms {result['read_p95_ms']:>8.2f}ms "
+              f"{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Prompt Variant Benchmark for the Vision Model Calls
+===================================================
+
+Compares the registered analysis prompts (Leaf Disease/prompts.py) on
+latency and token usage:
+
+    record   sends every image in a directory to the Groq API once per prompt
+             variant and saves the raw completions (content, usage fields and
+             latency) as JSON lines
+    replay   serves the recordings from the local stub server, runs each
+             variant through the detector end to end and reports latency,
+             prompt/completion tokens and answers that failed to parse
+
+Recording needs GROQ_API_KEY and spends real tokens; replays are free and
+repeatable.
+
+Usage:
+    python bench_prompts.py record --images Media --out prompt_recordings.jsonl
+    python bench_prompts.py replay prompt_recordings.jsonl [--latency-scale 1.0]
+"""
+
+import argparse
+import base64
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from stub_groq_server import StubGroqServer
+from utils import LeafDiseaseDetector, prepare_image
+from prompts import PROMPTS
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+TEST_IMAGE = Path(__file__).parent / "Media" / "brown-spot-4 (1).jpg"
+
+
+def record(image_dir: Path, out_path: Path, variants) -> int:
+    """Record one completion per image and variant into `out_path`; return the count."""
+    images = sorted(path for path in image_dir.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+    count = 0
+    with out_path.open("w", encoding="utf-8") as out:
+        for variant in variants:
+            detector = LeafDiseaseDetector(prompt_variant=variant)
+            try:
+                for path in images:
+                    image_bytes, mime_type = prepare_image(path.read_bytes())
+                    request = detector._build_completion_request(
+                        base64.b64encode(image_bytes).decode("utf-8"), mime_type=mime_type)
+                    started = time.monotonic()
+                    try:
+                        completion = detector._call_model(request)
+                    except Exception as e:
+                        print(f"{variant:>10} {path.name}: failed ({str(e)})")
+                        continue
+                    latency = time.monotonic() - started
+                    out.write(json.dumps({
+                        "variant": variant,
+                        "version": detector.prompt.version,
+                        "image": path.name,
+                        "latency": round(latency, 3),
+                        "content": completion.choices[0].message.content,
+                        "usage": {
+                            "prompt_tokens": completion.usage.prompt_tokens,
+                            "completion_tokens": completion.usage.completion_tokens,
+                            "total_tokens": completion.usage.total_tokens
+                        }
+                    }) + "\n")
+                    count += 1
+                    print(f"{variant:>10} {path.name}: {latency:.2f}s, "
+                          f"{completion.usage.prompt_tokens} + {completion.usage.completion_tokens} tokens")
+            finally:
+                detector.close()
+    return count
+
+
+def replay(records_by_variant: dict, latency_scale: float = 1.0) -> dict:
+    """Run each variant against its recordings and return {variant: summary}."""
+    base64_image = base64.b64encode(TEST_IMAGE.read_bytes()).decode("utf-8")
+    results = {}
+    for variant, records in records_by_variant.items():
+        with StubGroqServer() as stub:
+            stub.replay(records, latency_scale)
+            detector = LeafDiseaseDetector(api_key="stub", base_url=stub.url, prompt_variant=variant)
+            latencies, failures = [], 0
+            try:
+                for _ in records:
+                    started = time.perf_counter()
+                    try:
+                        detector.analyze_leaf_image_base64(base64_image)
+                    except ValueError:
+                        # The recorded answer could not be parsed
+                        failures += 1
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                detector.close()
+        usage = detector.token_stats()['usage'].get(variant, {})
+        latencies.sort()
+        results[variant] = {
+            "requests": len(records),
+            "latency_p50": statistics.median(latencies),
+            "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "prompt_tokens": usage.get('avg_prompt_tokens', 0),
+            "completion_tokens": usage.get('avg_completion_tokens', 0),
+            "total_tokens": usage.get('avg_total_tokens', 0),
+            "failures": failures
+        }
+    return results
+
+
+def load_recordings(path: Path) -> dict:
+    """Group the records of a recording file by prompt variant, skipping stale versions."""
+    records_by_variant = {}
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = PROMPTS.get(record["variant"])
+            if prompt is None or prompt.version != record["version"]:
+                print(f"Skipping {record['variant']} {record['version']} recording of "
+                      f"{record['image']} (prompt changed since it was recorded)")
+                continue
+            records_by_variant.setdefault(record["variant"], []).append(record)
+    return records_by_variant
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="record completions from the Groq API")
+    record_parser.add_argument("--images", type=Path, default=Path("Media"), help="directory of leaf images")
+    record_parser.add_argument("--out", type=Path, default=Path("prompt_recordings.jsonl"))
+    record_parser.add_argument("--variants", nargs="+", default=list(PROMPTS), choices=list(PROMPTS))
+    replay_parser = commands.add_parser("replay", help="replay recorded completions")
+    replay_parser.add_argument("recordings", type=Path)
+    replay_parser.add_argument("--latency-scale", type=float, default=1.0,
+                               help="factor applied to recorded latencies (0 measures overhead only)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record(args.images, args.out, args.variants)
+        print(f"\nRecorded {count} completions to {args.out}")
+        return
+
+    records_by_variant = load_recordings(args.recordings)
+    if not records_by_variant:
+        print(f"Error: No usable recordings in {args.recordings}")
+        sys.exit(1)
+    results = replay(records_by_variant, args.latency_scale)
+
+    print(f"\n{'Variant':>10} {'Prompt chars':>13} {'Requests':>9} {'p50 (s)':>8} {'p95 (s)':>8} "
+          f"{'Prompt tok':>11} {'Compl. tok':>11} {'Total tok':>10} {'Failed':>7}")
+    for variant, result in results.items():
+        print(f"{variant:>10} {len(PROMPTS[variant].text):>13} {result['requests']:>9} "
+              f"{result['latency_p50']:>8.2f} {result['latency_p95']:>8.2f} "
+              f"{result['prompt_tokens']:>11.0f} {result['completion_tokens']:>11.0f} "
+              f"{result['total_tokens']:>10.0f} {result['failures']:>7}")
+    if "full" in results:
+        baseline = results["full"]["total_tokens"]
+        for variant, result in results.items():
+            if variant != "full" and baseline:
+                print(f"{variant}: {100 * (1 - result['total_tokens'] / baseline):.0f}% fewer tokens "
+                      f"per analysis than full")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Pytest configuration.
+
+Makes the Leaf Disease modules importable, as utils.py and database.py do,
+and points database.py's global history database (opened on import) at a
+temporary file so test runs never write to the repository's
+disease_history.db.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "Leaf Disease"))
+os.environ["DISEASE_HISTORY_DB"] = os.path.join(tempfile.mkdtemp(prefix="leaf-tests-"),
+                                                "history.db")
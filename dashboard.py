@@ -1,9 +1,100 @@
 import streamlit as st
-import sqlite3
-import json
 from datetime import datetime
-import base64
-import io
+from analytics import (confidence_histogram, daily_counts_by_type, frame_from_analyses,
+                       rolling_activity, severity_distribution, type_distribution)
+from data_access import (EXPORT_URL, fetch_analyses_by_id, fetch_history_frame, fetch_statistics,
+                         lazy_thumbnail, search_analyses, show_report_status, start_report,
+                         window_start)
+
+# Records shown per page in the detailed records list
+RECORDS_PAGE_SIZE = 20
+
+
+def show_analysis(analysis, i, sample_data=False):
+    """Expandable details of one analysis record."""
+    # Determine status text and styling
+    if analysis.get('disease_type') == 'invalid_image':
+        status_text = "⚠️ Invalid"
+        status_color = "#ffebee"
+        status_text_color = "#c62828"
+        border_color = "#c62828"
+    elif analysis.get('disease_detected'):
+        status_text = f"🦠 {analysis.get('disease_name', 'Unknown Disease')}"
+        status_color = "#ffebee"
+        status_text_color = "#c62828"
+        border_color = "#c62828"
+    else:
+        status_text = "✅ Healthy"
+        status_color = "#e8f5e9"
+        status_text_color = "#2e7d32"
+        border_color = "#2e7d32"
+    
+    # Confidence styling
+    confidence = analysis.get('confidence', 0)
+    if confidence >= 90:
+        confidence_color = "#2e7d32"
+    elif confidence >= 70:
+        confidence_color = "#f57c00"
+    else:
+        confidence_color = "#c62828"
+    
+    # Create expandable section for each analysis
+    with st.expander(f"Analysis #{analysis.get('id', i+1)}: {analysis.get('image_filename', 'N/A')}"):
+        # Main analysis details in a structured format
+        st.subheader("Analysis Details")
+        
+        # Status
+        st.markdown(f"**Status:** {status_text}")
+        
+        # Search hit in context
+        if analysis.get('snippet'):
+            st.markdown(f"**Match:** {analysis['snippet']}")
+        
+        # Key metrics in columns
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f"**Type:** {analysis.get('disease_type', 'N/A').title()}")
+        with col2:
+            st.markdown(f"**Severity:** {analysis.get('severity', 'N/A').title() if analysis.get('severity') else 'N/A'}")
+        with col3:
+            st.markdown(f"**Confidence:** {confidence:.1f}%")
+        
+        st.markdown(f"**Filename:** {analysis.get('image_filename', 'N/A')}")
+        st.markdown(f"**Timestamp:** {datetime.fromisoformat(analysis['timestamp']).strftime('%Y-%m-%d %H:%M:%S') if analysis.get('timestamp') else 'N/A'}")
+        
+        # Symptoms section
+        if analysis.get('symptoms'):
+            st.subheader("Symptoms:")
+            for symptom in analysis.get('symptoms', []):
+                st.markdown(f"- {symptom}")
+        else:
+            st.info("No symptoms recorded")
+        
+        # Possible causes section
+        if analysis.get('possible_causes'):
+            st.subheader("Possible Causes:")
+            for cause in analysis.get('possible_causes', []):
+                st.markdown(f"- {cause}")
+        else:
+            st.info("No possible causes recorded")
+        
+        # Treatment section
+        if analysis.get('treatment'):
+            st.subheader("Treatment Recommendations:")
+            for treatment in analysis.get('treatment', []):
+                st.markdown(f"- {treatment}")
+        else:
+            st.info("No treatment recommendations recorded")
+        
+        # Image display (if available)
+        st.subheader("Image Preview")
+        
+        # Fetched by the browser from the API only when this expander is opened
+        if analysis.get('id') is not None and not sample_data:
+            lazy_thumbnail(analysis['id'], analysis.get('image_filename', ''))
+        else:
+            st.info("No image available for this analysis.")
+
 
 # Set Streamlit theme to light and wide mode
 st.set_page_config(
@@ -117,127 +208,6 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Database connection function
-def get_db_connection():
-    try:
-        conn = sqlite3.connect('disease_history.db')
-        # Ensure the table exists
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                disease_detected BOOLEAN NOT NULL,
-                disease_name TEXT,
-                disease_type TEXT,
-                severity TEXT,
-                confidence REAL,
-                symptoms TEXT,
-                possible_causes TEXT,
-                treatment TEXT,
-                image_filename TEXT
-            )
-        ''')
-        conn.commit()
-        return conn
-    except Exception as e:
-        st.error(f"Database connection error: {str(e)}")
-        return None
-
-# Fetch statistics from database
-def fetch_statistics():
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return {}
-            
-        cursor = conn.cursor()
-        
-        # Total analyses
-        cursor.execute('SELECT COUNT(*) FROM analysis_history')
-        total = cursor.fetchone()[0]
-        
-        # Disease detections
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 1')
-        diseases = cursor.fetchone()[0]
-        
-        # Healthy plants
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 0 AND disease_type != "invalid_image"')
-        healthy = cursor.fetchone()[0]
-        
-        # Invalid images
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_type = "invalid_image"')
-        invalid = cursor.fetchone()[0]
-        
-        # Disease types distribution
-        cursor.execute('''
-            SELECT disease_type, COUNT(*) 
-            FROM analysis_history 
-            WHERE disease_detected = 1 
-            GROUP BY disease_type 
-            ORDER BY COUNT(*) DESC
-        ''')
-        disease_types = cursor.fetchall()
-        
-        # Recent analyses for trend analysis
-        cursor.execute('''
-            SELECT date(timestamp) as date, COUNT(*) as count
-            FROM analysis_history 
-            WHERE date(timestamp) >= date('now', '-30 days')
-            GROUP BY date(timestamp)
-            ORDER BY date(timestamp)
-        ''')
-        daily_trend = cursor.fetchall()
-        
-        conn.close()
-        
-        return {
-            'total_analyses': total,
-            'disease_detections': diseases,
-            'healthy_plants': healthy,
-            'invalid_images': invalid,
-            'disease_distribution': dict(disease_types),
-            'daily_trend': daily_trend
-        }
-    except Exception as e:
-        st.error(f"Error fetching statistics: {str(e)}")
-        return {}
-
-# Fetch recent analyses from database with all required fields
-def fetch_recent_analyses(limit=50):
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-            
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, timestamp, disease_detected, disease_name, disease_type, severity, 
-                   confidence, symptoms, possible_causes, treatment, image_filename
-            FROM analysis_history 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        
-        analyses = []
-        for row in rows:
-            analysis = dict(zip(columns, row))
-            # Convert JSON strings back to lists
-            analysis['symptoms'] = json.loads(analysis['symptoms']) if analysis['symptoms'] else []
-            analysis['possible_causes'] = json.loads(analysis['possible_causes']) if analysis['possible_causes'] else []
-            analysis['treatment'] = json.loads(analysis['treatment']) if analysis['treatment'] else []
-            analyses.append(analysis)
-        
-        conn.close()
-        return analyses
-    except Exception as e:
-        st.error(f"Error fetching analysis history: {str(e)}")
-        return []
-
 # Sidebar with filters
 with st.sidebar:
     st.header("📊 Dashboard Controls")
@@ -256,7 +226,7 @@ with st.sidebar:
     elif selected_range == "Last 90 Days":
         days_back = 90
     else:
-        days_back = 365*10  # All time
+        days_back = None  # All time
     
     st.markdown("---")
     
@@ -273,227 +243,28 @@ with st.sidebar:
     
     st.subheader("📥 Export Data")
     if st.button("Download Analysis Data (CSV)"):
-        analyses = fetch_recent_analyses(1000)
-        if analyses:
-            import csv
-            from io import StringIO
-            
-            # Create CSV in memory
-            csv_buffer = StringIO()
-            writer = csv.writer(csv_buffer)
-            
-            # Write header
-            writer.writerow(["ID", "Timestamp", "Disease Detected", "Disease Name", "Disease Type", 
-                           "Severity", "Confidence", "Symptoms", "Possible Causes", "Treatment", "Image Filename"])
-            
-            # Write data rows
-            for analysis in analyses:
-                writer.writerow([
-                    analysis['id'],
-                    analysis['timestamp'],
-                    analysis['disease_detected'],
-                    analysis['disease_name'],
-                    analysis['disease_type'],
-                    analysis['severity'],
-                    analysis['confidence'],
-                    '; '.join(analysis['symptoms']) if isinstance(analysis['symptoms'], list) else analysis['symptoms'],
-                    '; '.join(analysis['possible_causes']) if isinstance(analysis['possible_causes'], list) else analysis['possible_causes'],
-                    '; '.join(analysis['treatment']) if isinstance(analysis['treatment'], list) else analysis['treatment'],
-                    analysis['image_filename']
-                ])
-            
-            csv_data = csv_buffer.getvalue()
-            
-            # Create download link
-            b64 = base64.b64encode(csv_data.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="leaf_disease_analysis_history.csv">Download CSV File</a>'
-            st.markdown(href, unsafe_allow_html=True)
-            st.success("CSV export ready! Click the link to download.")
-        else:
-            st.warning("No data available for export")
+        # Streamed by the API for the selected period; nothing is built in memory here
+        window = f"&date_from={window_start(days_back)}" if days_back is not None else ""
+        st.markdown(
+            f"[Download CSV]({EXPORT_URL}?format=csv{window}) · "
+            f"[CSV (gzip)]({EXPORT_URL}?format=csv&gzip=true{window}) · "
+            f"[NDJSON]({EXPORT_URL}?format=ndjson{window}) · "
+            f"[Parquet]({EXPORT_URL}?format=parquet{window})")
+        st.success("Export ready! Click a link to download.")
     
     if st.button("Download Analysis Report (PDF)"):
-        st.info("Generating PDF report... This may take a moment.")
-        # Try to import required libraries early to catch import errors
-        libraries_imported = True
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.lib import colors
-            import io
-            import requests
-            from PIL import Image as PILImage
-        except ImportError as ie:
-            st.error(f"PDF export failed: Missing library '{getattr(ie, 'name', str(ie))}'. Please install required libraries: pip install reportlab pillow")
-            libraries_imported = False
-        
-        if libraries_imported:
-            try:
-                analyses = fetch_recent_analyses(30)  # Limit for performance
-                if analyses:
-                    # Create PDF in memory
-                    pdf_buffer = io.BytesIO()
-                    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-                    styles = getSampleStyleSheet()
-                    story = []
-                    
-                    # Title
-                    title_style = ParagraphStyle(
-                        'DashboardTitle',
-                        parent=styles['Heading1'],
-                        fontSize=26,
-                        spaceAfter=30,
-                        textColor=colors.darkgreen,
-                        alignment=1  # Center alignment
-                    )
-                    story.append(Paragraph("Leaf Disease Detection Analytics Report", title_style))
-                    story.append(Spacer(1, 0.3*inch))
-                    
-                    # Subtitle
-                    subtitle_style = ParagraphStyle(
-                        'CustomSubtitle',
-                        parent=styles['Normal'],
-                        fontSize=14,
-                        textColor=colors.green,
-                        alignment=1
-                    )
-                    story.append(Paragraph("Comprehensive Plant Health Analysis", subtitle_style))
-                    story.append(Spacer(1, 0.4*inch))
-                    
-                    # Generate date
-                    from datetime import datetime
-                    story.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-                    story.append(Spacer(1, 0.3*inch))
-                    
-                    # Summary Section
-                    story.append(Paragraph("Executive Summary", styles['Heading2']))
-                    story.append(Spacer(1, 0.2*inch))
-                    
-                    total = len(analyses)
-                    diseased = sum(1 for a in analyses if a['disease_detected'])
-                    healthy = sum(1 for a in analyses if not a['disease_detected'] and a['disease_type'] != 'invalid_image')
-                    invalid = sum(1 for a in analyses if a['disease_type'] == 'invalid_image')
-                    
-                    # Summary table
-                    summary_data = [
-                        ["Total Analyses", "Diseased Leaves", "Healthy Leaves", "Invalid Images"],
-                        [str(total), str(diseased), str(healthy), str(invalid)]
-                    ]
-                    
-                    summary_table = Table(summary_data)
-                    summary_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 12),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                        ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ]))
-                    
-                    story.append(summary_table)
-                    story.append(Spacer(1, 0.4*inch))
-                    
-                    # Detailed records with images
-                    story.append(Paragraph("Detailed Analysis Records", styles['Heading2']))
-                    story.append(Spacer(1, 0.2*inch))
-                    
-                    # Process each analysis record
-                    for i, analysis in enumerate(analyses[:15]):  # Limit to first 15 for reasonable PDF size
-                        # Record header
-                        record_title = f"Record #{analysis['id']}: {analysis['image_filename']}"
-                        story.append(Paragraph(record_title, styles['Heading3']))
-                        
-                        # Try to fetch and include the image
-                        try:
-                            # Attempt to get the image from the API
-                            response = requests.get(f"http://localhost:8000/analysis-image/{analysis['id']}")
-                            if response.status_code == 200:
-                                # Convert to PIL Image
-                                pil_img = PILImage.open(io.BytesIO(response.content))
-                                
-                                # Resize for PDF
-                                max_width = 200
-                                max_height = 150
-                                pil_img.thumbnail((max_width, max_height))
-                                
-                                # Save to BytesIO
-                                img_buffer = io.BytesIO()
-                                pil_img.save(img_buffer, format='JPEG')
-                                img_buffer.seek(0)
-                                
-                                # Add to PDF
-                                img = Image(img_buffer, width=max_width, height=max_height)
-                                story.append(img)
-                                story.append(Spacer(1, 0.1*inch))
-                        except Exception as img_error:
-                            # If image loading fails, continue without it
-                            pass
-                        
-                        # Analysis details table
-                        status = "Diseased" if analysis['disease_detected'] else ("Healthy" if analysis['disease_type'] != 'invalid_image' else "Invalid")
-                        
-                        details_data = [
-                            ["Field", "Value"],
-                            ["Timestamp", analysis['timestamp'][:19]],
-                            ["Status", status],
-                            ["Disease Name", analysis['disease_name'] if analysis['disease_name'] else "N/A"],
-                            ["Disease Type", analysis['disease_type'].title() if analysis['disease_type'] else "N/A"],
-                            ["Severity", analysis['severity'].title() if analysis['severity'] else "N/A"],
-                            ["Confidence", f"{analysis['confidence']:.1f}%"],
-                            ["Symptoms", "; ".join(analysis['symptoms'][:3]) if isinstance(analysis['symptoms'], list) and analysis['symptoms'] else "None recorded"],
-                            ["Possible Causes", "; ".join(analysis['possible_causes'][:3]) if isinstance(analysis['possible_causes'], list) and analysis['possible_causes'] else "None recorded"],
-                            ["Treatment", "; ".join(analysis['treatment'][:3]) if isinstance(analysis['treatment'], list) and analysis['treatment'] else "None recorded"]
-                        ]
-                        
-                        details_table = Table(details_data)
-                        details_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                            ('FONTSIZE', (0, 0), (-1, 0), 10),
-                            ('FONTSIZE', (0, 1), (-1, -1), 9),
-                            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                            ('BACKGROUND', (0, 1), (0, -1), colors.lightgrey),
-                            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                        ]))
-                        
-                        story.append(details_table)
-                        story.append(Spacer(1, 0.3*inch))
-                    
-                    # Footer
-                    story.append(Spacer(1, 0.3*inch))
-                    story.append(Paragraph("Report generated by Leaf Disease Detection System", styles['Normal']))
-                    
-                    # Build PDF
-                    doc.build(story)
-                    pdf_data = pdf_buffer.getvalue()
-                    
-                    # Create download link
-                    b64 = base64.b64encode(pdf_data).decode()
-                    href = f'<a href="data:application/pdf;base64,{b64}" download="leaf_disease_dashboard_report.pdf">Download PDF Report</a>'
-                    st.markdown(href, unsafe_allow_html=True)
-                    st.success("PDF report ready! Click the link to download.")
-                else:
-                    st.warning("No data available for PDF report")
-            except Exception as e:
-                st.error(f"PDF export failed: {str(e)}")
+        start_report(30, days_back)
+    show_report_status()
 
 # Main dashboard content
-stats = fetch_statistics()
-analyses = fetch_recent_analyses(100)
+stats = fetch_statistics(days_back)
+# Every analysis in the window, loaded once per data change for the charts and tables below
+history = fetch_history_frame(days_back)
+analyses = []
 
-# If no data, create some sample data for demonstration
-if not stats.get('total_analyses', 0) and not analyses:
+# If the database is empty (not just this window), show sample data for demonstration
+sample_data = not stats.get('total_analyses', 0) and history.empty and not fetch_statistics().get('total_analyses', 0)
+if sample_data:
     # Sample statistics for demonstration
     stats = {
         'total_analyses': 10,
@@ -558,8 +329,9 @@ if not stats.get('total_analyses', 0) and not analyses:
             'image_filename': 'sample3.jpg'
         }
     ]
+    history = frame_from_analyses(analyses)
 
-if stats and analyses:
+if stats and not history.empty:
     # Key Metrics
     st.markdown("<h2 style='text-align: center; color: #1b5e20; margin: 2rem 0;'>🔑 Key Performance Metrics</h2>", unsafe_allow_html=True)
     
@@ -581,14 +353,14 @@ if stats and analyses:
                 </div>
             """, unsafe_allow_html=True)
     
-    # Create tabs for different views (removed Trends tab)
-    tab1, tab2 = st.tabs(["🥧 Distribution", "📋 Data Table"])
+    # Create tabs for different views
+    tab1, tab2, tab3 = st.tabs(["🥧 Distribution", "📈 Trends", "📋 Data Table"])
     
     with tab1:
         # Disease Distribution
         st.markdown("<h3 style='color: #1b5e20; margin: 1rem 0;'>Disease Type Distribution</h3>", unsafe_allow_html=True)
         
-        disease_dist = stats.get('disease_distribution', {})
+        disease_dist = type_distribution(history).to_dict()
         
         if disease_dist:
             # Create pie chart using Streamlit's native components instead of raw HTML
@@ -629,145 +401,92 @@ if stats and analyses:
         # Severity Distribution
         st.subheader("Severity Level Distribution")
         
-        if analyses:
-            # Filter only diseased plants
-            diseased_analyses = [a for a in analyses if a['disease_detected']]
-            if diseased_analyses:
-                severity_counts = {}
-                for analysis in diseased_analyses:
-                    severity = analysis['severity']
-                    severity_counts[severity] = severity_counts.get(severity, 0) + 1
-                
-                # Display severity distribution as simple cards
-                cols = st.columns(len(severity_counts))
-                total = sum(severity_counts.values())
-                
-                severity_colors = {'mild': '#81c784', 'moderate': '#ffb74d', 'severe': '#e57373'}
+        severity_counts = severity_distribution(history).to_dict()
+        if severity_counts:
+            # Display severity distribution as simple cards
+            cols = st.columns(len(severity_counts))
+            total = sum(severity_counts.values())
+            
+            severity_colors = {'mild': '#81c784', 'moderate': '#ffb74d', 'severe': '#e57373'}
+            
+            for col, (severity, count) in zip(cols, severity_counts.items()):
+                percentage = (count / total) * 100 if total > 0 else 0
+                color = severity_colors.get(severity, '#9e9e9e')
                 
-                for col, (severity, count) in zip(cols, severity_counts.items()):
-                    percentage = (count / total) * 100 if total > 0 else 0
-                    color = severity_colors.get(severity, '#9e9e9e')
-                    
-                    with col:
-                        st.markdown(f"""
-                            <div style='background: {color}; border-radius: 10px; padding: 1rem; text-align: center; color: white;'>
-                                <div style='font-size: 1.5rem; font-weight: bold;'>{percentage:.0f}%</div>
-                                <div style='font-size: 1rem; margin-top: 0.5rem;'>{severity.title()}</div>
-                                <div style='font-size: 0.9rem; margin-top: 0.2rem;'>{count}</div>
-                            </div>
-                        """, unsafe_allow_html=True)
-            else:
-                st.info("No severity data available yet.")
+                with col:
+                    st.markdown(f"""
+                        <div style='background: {color}; border-radius: 10px; padding: 1rem; text-align: center; color: white;'>
+                            <div style='font-size: 1.5rem; font-weight: bold;'>{percentage:.0f}%</div>
+                            <div style='font-size: 1rem; margin-top: 0.5rem;'>{severity.title()}</div>
+                            <div style='font-size: 0.9rem; margin-top: 0.2rem;'>{count}</div>
+                        </div>
+                    """, unsafe_allow_html=True)
+        else:
+            st.info("No severity data available yet.")
+        
+        # Confidence Distribution
+        st.subheader("Confidence Distribution")
+        st.bar_chart(confidence_histogram(history), x_label="Confidence", y_label="Analyses")
 
     with tab2:
+        st.markdown("<h3 style='color: #1b5e20; margin: 1rem 0;'>Disease Trends</h3>", unsafe_allow_html=True)
+        
+        # Detections per day and disease type
+        st.subheader("Daily Detections by Disease Type")
+        daily_by_type = daily_counts_by_type(history)
+        if not daily_by_type.empty:
+            st.line_chart(daily_by_type, x_label="Day", y_label="Detections")
+        else:
+            st.info("No detections in this period yet.")
+        
+        # Weekly rolling activity
+        st.subheader("7-Day Rolling Activity")
+        activity = rolling_activity(history, window=7)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Analyses (7-day total)**")
+            st.area_chart(activity['rolling_analyses'], x_label="Day", y_label="Analyses")
+        with col2:
+            st.markdown("**Detection rate (7-day, %)**")
+            st.line_chart(activity['rolling_detection_rate'], x_label="Day", y_label="% diseased")
+
+    with tab3:
         # Data Table
         st.markdown("<h3 style='color: #1b5e20; margin: 1rem 0;'>Detailed Analysis Records</h3>", unsafe_allow_html=True)
         
-        if analyses:
-            # Create a simple table using Streamlit
-            for i, analysis in enumerate(analyses[:20]):  # Limit to first 20 for performance
-                # Alternate background colors
-                bg_color = "#ffffff" if i % 2 == 0 else "#f8f9fa"
-                
-                # Determine status text and styling
-                if analysis.get('disease_type') == 'invalid_image':
-                    status_text = "⚠️ Invalid"
-                    status_color = "#ffebee"
-                    status_text_color = "#c62828"
-                    border_color = "#c62828"
-                elif analysis.get('disease_detected'):
-                    status_text = f"🦠 {analysis.get('disease_name', 'Unknown Disease')}"
-                    status_color = "#ffebee"
-                    status_text_color = "#c62828"
-                    border_color = "#c62828"
-                else:
-                    status_text = "✅ Healthy"
-                    status_color = "#e8f5e9"
-                    status_text_color = "#2e7d32"
-                    border_color = "#2e7d32"
-                
-                # Confidence styling
-                confidence = analysis.get('confidence', 0)
-                if confidence >= 90:
-                    confidence_color = "#2e7d32"
-                elif confidence >= 70:
-                    confidence_color = "#f57c00"
-                else:
-                    confidence_color = "#c62828"
-                
-                # Create expandable section for each analysis
-                with st.expander(f"Analysis #{analysis.get('id', i+1)}: {analysis.get('image_filename', 'N/A')}"):
-                    # Main analysis details in a structured format
-                    st.subheader("Analysis Details")
-                    
-                    # Status
-                    st.markdown(f"**Status:** {status_text}")
-                    
-                    # Key metrics in columns
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.markdown(f"**Type:** {analysis.get('disease_type', 'N/A').title()}")
-                    with col2:
-                        st.markdown(f"**Severity:** {analysis.get('severity', 'N/A').title() if analysis.get('severity') else 'N/A'}")
-                    with col3:
-                        st.markdown(f"**Confidence:** {confidence:.1f}%")
-                    
-                    st.markdown(f"**Filename:** {analysis.get('image_filename', 'N/A')}")
-                    st.markdown(f"**Timestamp:** {datetime.fromisoformat(analysis['timestamp']).strftime('%Y-%m-%d %H:%M:%S') if analysis.get('timestamp') else 'N/A'}")
-                    
-                    # Symptoms section
-                    if analysis.get('symptoms'):
-                        st.subheader("Symptoms:")
-                        for symptom in analysis.get('symptoms', []):
-                            st.markdown(f"- {symptom}")
-                    else:
-                        st.info("No symptoms recorded")
-                    
-                    # Possible causes section
-                    if analysis.get('possible_causes'):
-                        st.subheader("Possible Causes:")
-                        for cause in analysis.get('possible_causes', []):
-                            st.markdown(f"- {cause}")
-                    else:
-                        st.info("No possible causes recorded")
-                    
-                    # Treatment section
-                    if analysis.get('treatment'):
-                        st.subheader("Treatment Recommendations:")
-                        for treatment in analysis.get('treatment', []):
-                            st.markdown(f"- {treatment}")
-                    else:
-                        st.info("No treatment recommendations recorded")
-                    
-                    # Image display (if available)
-                    st.subheader("Image Preview")
-                    
-                    # Try to display the actual image if it exists
-                    image_filename = analysis.get('image_filename', '')
-                    if image_filename:
-                        # Assuming images are stored in an 'uploads' directory
-                        image_path = f"uploads/{image_filename}"
-                        try:
-                            # Check if the image file exists
-                            import os
-                            if os.path.exists(image_path):
-                                st.image(image_path, caption=image_filename, use_column_width=True)
-                            else:
-                                # If the image doesn't exist in the uploads folder, show placeholder
-                                st.info("Actual image not found. Displaying placeholder.")
-                                st.image("https://placehold.co/300x200?text=Leaf+Image+Preview", caption=image_filename, use_column_width=True)
-                        except Exception as e:
-                            # If there's any error, show placeholder
-                            st.warning(f"Could not load image: {str(e)}")
-                            st.image("https://placehold.co/300x200?text=Leaf+Image+Preview", caption=image_filename, use_column_width=True)
-                    else:
-                        st.info("No image available for this analysis.")
-
-            # Add pagination info
-            if len(analyses) > 20:
-                st.info(f"Showing first 20 of {len(analyses)} records. Contact administrator for full dataset.")
+        search_query = st.text_input("🔍 Search symptoms, causes and treatments",
+                                     placeholder='e.g. yellow halo, "copper fungicide"')
+        if search_query.strip():
+            analyses = search_analyses(search_query, 50, days_back, highlight=("**", "**"))
+            for i, analysis in enumerate(analyses):
+                show_analysis(analysis, i, sample_data)
+            if not analyses:
+                st.info("No analyses in this period match your search.")
         else:
-            st.info("No analysis data available yet.")
+            # The whole window as one virtualized table
+            st.dataframe(
+                history, hide_index=True,
+                column_config={
+                    "id": st.column_config.NumberColumn("ID", format="%d"),
+                    "timestamp": st.column_config.DatetimeColumn("Timestamp (UTC)", format="YYYY-MM-DD HH:mm:ss"),
+                    "disease_detected": st.column_config.CheckboxColumn("Diseased"),
+                    "confidence": st.column_config.ProgressColumn("Confidence", format="%.1f%%",
+                                                                  min_value=0, max_value=100),
+                    "image_filename": "Image",
+                })
+            
+            # Full details for one page of the window at a time
+            pages = (len(history) - 1) // RECORDS_PAGE_SIZE + 1
+            page = st.number_input(f"Record details page (of {pages})", min_value=1, max_value=pages, value=1)
+            page_ids = history['id'].iloc[(page - 1) * RECORDS_PAGE_SIZE:page * RECORDS_PAGE_SIZE].tolist()
+            if sample_data:
+                page_analyses = [analysis for analysis in analyses if analysis['id'] in page_ids]
+            else:
+                page_analyses = fetch_analyses_by_id(page_ids)
+            for i, analysis in enumerate(page_analyses):
+                show_analysis(analysis, i, sample_data)
+elif stats:
+    st.info("No analyses in the selected period")
 else:
     st.error("Unable to load dashboard data. Please check the database connection.")
 
@@ -0,0 +1,225 @@
+"""
+Shared, cached data access for the Streamlit apps.
+
+main.py and dashboard.py read the analysis history through these helpers
+instead of opening their own SQLite connections. The schema is set up once
+per process when database.py is imported, the read connection is a
+st.cache_resource, and query results are st.cache_data entries keyed on a
+change token, so reruns and widget interactions are answered from the cache
+until another connection (the API saving an analysis) commits.
+"""
+
+import html
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import requests
+import streamlit as st
+
+from analytics import history_frame
+from database import (DiseaseHistoryDB, db, query_analyses_by_id, query_analysis_page,
+                      query_analysis_search, query_analysis_stats, query_daily_trend,
+                      query_history_rows)
+
+# Seconds a change token is trusted before the database is asked again
+CHANGE_CHECK_TTL = 2
+# Upper bound on the lifetime of cached results, changed or not
+RESULT_CACHE_TTL = 600
+
+# Where this Streamlit server reaches the API, and where users' browsers reach
+# it for images and download links; they differ behind a proxy or in Docker
+API_URL = os.getenv("API_URL", "http://localhost:8000").rstrip("/")
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", API_URL).rstrip("/")
+REPORTS_URL = f"{API_URL}/reports"
+EXPORT_URL = f"{API_PUBLIC_URL}/export"
+
+
+class HistoryReader:
+    """
+    Process-wide read connection to the history database.
+
+    Streamlit runs every rerun on a new thread, so DiseaseHistoryDB's
+    per-thread connections would pile up; instead one dedicated read-only
+    connection is shared by all sessions under a lock. It never writes, so its
+    PRAGMA data_version changes whenever any other connection commits,
+    including DiseaseHistoryDB's own connections in this process, which makes
+    it a cheap change token for the result caches.
+    """
+
+    def __init__(self, history_db: DiseaseHistoryDB):
+        # Opened with check_same_thread=False, so any script thread may use it
+        self.conn = history_db.connect_readonly()
+        self.lock = threading.Lock()
+
+    def data_version(self) -> int:
+        """Counter that changes whenever another connection commits."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def read(self, query, *args, **kwargs):
+        """Run one of database.py's query_* functions on the shared connection."""
+        with self.lock:
+            return query(self.conn.cursor(), *args, **kwargs)
+
+
+@st.cache_resource(show_spinner=False)
+def get_reader() -> HistoryReader:
+    """The history reader, created once per process."""
+    return HistoryReader(db)
+
+
+@st.cache_data(ttl=CHANGE_CHECK_TTL, show_spinner=False)
+def change_token() -> int:
+    """Current data_version, re-read at most every CHANGE_CHECK_TTL seconds."""
+    return get_reader().data_version()
+
+
+def refresh():
+    """Forget the change token so the next read sees new analyses immediately."""
+    change_token.clear()
+
+
+def window_start(days_back):
+    """ISO date `days_back` days ago (UTC), or None for all time."""
+    if days_back is None:
+        return None
+    return (datetime.now(timezone.utc).date() - timedelta(days=days_back)).isoformat()
+
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, show_spinner=False)
+def _statistics(token, days_back):
+    reader = get_reader()
+    stats = reader.read(query_analysis_stats, days_back)
+    stats['daily_trend'] = reader.read(query_daily_trend, days_back)
+    return stats
+
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, show_spinner=False)
+def _analysis_page(token, limit, after, date_from):
+    return get_reader().read(query_analysis_page, limit, after, date_from=date_from)
+
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, show_spinner=False)
+def _search(token, query, limit, date_from, highlight):
+    return get_reader().read(query_analysis_search, query, limit, date_from=date_from,
+                             highlight=highlight)
+
+
+def _load_history(cursor, date_from):
+    return history_frame(query_history_rows(cursor, date_from))
+
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, max_entries=4, show_spinner="Loading analysis history...")
+def _history(token, date_from):
+    return get_reader().read(_load_history, date_from)
+
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, show_spinner=False)
+def _analyses_by_id(token, ids):
+    return get_reader().read(query_analyses_by_id, list(ids))
+
+
+def fetch_statistics(days_back=None):
+    """Totals, distributions and daily trend for the last `days_back` days (all time if None)."""
+    try:
+        return _statistics(change_token(), days_back)
+    except Exception as e:
+        st.error(f"Error fetching statistics: {str(e)}")
+        return {}
+
+
+def fetch_recent_analyses(limit=10, days_back=None):
+    """Newest analyses in the date window with all fields."""
+    return fetch_analysis_page(limit, days_back=days_back)[0]
+
+
+def fetch_analysis_page(limit=10, after=None, days_back=None):
+    """One page of history after the keyset `after`: (analyses, key of the next page or None)."""
+    try:
+        return _analysis_page(change_token(), limit, after, window_start(days_back))
+    except Exception as e:
+        st.error(f"Error fetching analysis history: {str(e)}")
+        return [], None
+
+
+def fetch_history_frame(days_back=None):
+    """Typed analytics frame (see analytics.py) of every analysis in the date window, newest first."""
+    try:
+        return _history(change_token(), window_start(days_back))
+    except Exception as e:
+        st.error(f"Error loading analysis history: {str(e)}")
+        return history_frame([])
+
+
+def fetch_analyses_by_id(ids):
+    """Analyses with all fields for the given ids, newest first."""
+    try:
+        return _analyses_by_id(change_token(), tuple(int(analysis_id) for analysis_id in ids))
+    except Exception as e:
+        st.error(f"Error fetching analysis history: {str(e)}")
+        return []
+
+
+def search_analyses(query, limit=20, days_back=None, highlight=("<b>", "</b>")):
+    """Full-text search of analyses in the date window, best matches first."""
+    try:
+        return _search(change_token(), query, limit, window_start(days_back), tuple(highlight))
+    except Exception as e:
+        st.error(f"Error searching analysis history: {str(e)}")
+        return []
+
+
+def lazy_thumbnail(analysis_id, caption="", size=512, container=st):
+    """
+    Show an analysis thumbnail that the browser loads only when it is displayed.
+
+    No request is made from the script run: the <img> is fetched from the API
+    when its expander is opened, and the API's immutable Cache-Control keeps it
+    in the browser cache for later reruns.
+    """
+    alt = html.escape(caption or "Analysis image")
+    container.markdown(
+        f'<img src="{API_PUBLIC_URL}/analysis-thumbnail/{int(analysis_id)}?size={int(size)}" loading="lazy" '
+        f'alt="{alt}" style="width: 100%; border-radius: 8px;">',
+        unsafe_allow_html=True)
+    if caption:
+        container.caption(caption)
+
+
+def start_report(limit=50, days_back=None, container=st):
+    """Start a PDF report job on the API; show_report_status tracks it."""
+    try:
+        response = requests.post(REPORTS_URL, params={"limit": limit, "date_from": window_start(days_back)},
+                                 timeout=10)
+        if response.status_code == 202:
+            st.session_state.report_job = response.json()["id"]
+        else:
+            container.error(f"PDF export failed: {response.json().get('detail', response.text)}")
+    except Exception as e:
+        container.error(f"PDF export failed: {str(e)}")
+
+
+def show_report_status(container=st):
+    """Show the progress of the session's last report job, then its download link."""
+    job_id = st.session_state.get("report_job")
+    if not job_id:
+        return
+    try:
+        response = requests.get(f"{REPORTS_URL}/{job_id}", timeout=10)
+        if response.status_code == 404:
+            # The job was pruned from the API's report history
+            del st.session_state.report_job
+            return
+        job = response.json()
+        if job["status"] == "done":
+            container.markdown(f"[Download PDF Report]({API_PUBLIC_URL}/reports/{job_id}/download)")
+            container.success("PDF report ready! Click the link to download.")
+        elif job["status"] == "failed":
+            container.error(f"PDF export failed: {job['error']}")
+        else:
+            container.progress(job["progress"],
+                               text=f"Building PDF report ({job['completed']} of {job['total']} images)")
+            container.button("Refresh report status")
+    except Exception as e:
+        container.error(f"Could not get PDF report status: {str(e)}")
@@ -3,26 +3,131 @@ Database module for Leaf Disease Detection System.
 
 This module provides database functionality for storing and retrieving
 disease analysis history using SQLite.
+
+Connections are opened once per thread and reused. The database runs in WAL
+mode so readers (dashboard, history endpoints) are not blocked by the writer
+saving new uploads, and vice versa.
+
+Uploaded images live in a content-addressed image_blobs table keyed by their
+SHA-256 digest; analysis_history only references the digest. Identical
+uploads share one blob, and reference counts maintained by triggers remove a
+blob once no analysis points to it. Databases from before the blob store are
+converted once with `python database.py --migrate-images`.
+
+History statistics are read from small rollup tables (per disease type,
+severity, day, and day by type) that triggers keep in step with analysis_history; run
+`python database.py --rebuild-stats` to recompute them. Triggers likewise keep
+the analysis_fts full-text index of symptoms, causes and treatments current.
 """
 
 import sqlite3
+import hashlib
 import json
+import logging
+import re
+import sys
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
 from typing import List, Dict, Optional
 import os
 import base64
 
+sys.path.insert(0, str(Path(__file__).parent / "Leaf Disease"))
+from image_preprocessing import make_thumbnail, sniff_mime_type
+
+logger = logging.getLogger(__name__)
+
 class DiseaseHistoryDB:
-    """Database handler for storing disease analysis history."""
+    """
+    Database handler for storing disease analysis history.
+    
+    Each thread gets its own long-lived connection (sqlite3 connections must
+    not be shared between threads) configured with PRAGMAS. Because the
+    connections persist, sqlite3's per-connection statement cache keeps the
+    compiled form of every query below and reuses it on later calls.
+    """
+    
+    BUSY_TIMEOUT = 5.0  # Seconds to wait for a lock before raising
+    CACHED_STATEMENTS = 128
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",  # Durable with WAL; fsync only at checkpoints
+        "PRAGMA cache_size=-16000",  # 16 MB page cache per connection
+        "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+        "PRAGMA temp_store=MEMORY",
+    )
+    
+    # Rollup tables kept current by triggers: (column, expression over a row)
+    STATS_ROLLUPS = {
+        'stats_by_type': (('disease_detected', '{row}.disease_detected'),
+                          ('disease_type', '{row}.disease_type')),
+        'stats_by_severity': (('severity', '{row}.severity'),),
+        'stats_by_day': (('day', 'date({row}.timestamp)'),),
+        'stats_by_day_type': (('day', 'date({row}.timestamp)'),
+                              ('disease_detected', '{row}.disease_detected'),
+                              ('disease_type', '{row}.disease_type'),
+                              ('severity', '{row}.severity')),
+    }
+    
+    # Text columns indexed for full-text search in analysis_fts
+    SEARCH_COLUMNS = ('disease_name', 'symptoms', 'possible_causes', 'treatment')
     
     def __init__(self, db_path: str = "disease_history.db"):
         """Initialize database connection and create tables if needed."""
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with the busy timeout and pragmas applied."""
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT,
+                               cached_statements=self.CACHED_STATEMENTS,
+                               check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def connect_readonly(self) -> sqlite3.Connection:
+        """
+        Open a separate read-only connection, not tied to any thread.
+        
+        Unlike get_connection(), the caller owns it: it may be shared between
+        threads under the caller's own lock and must be closed by the caller.
+        """
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.BUSY_TIMEOUT,
+                               cached_statements=self.CACHED_STATEMENTS,
+                               check_same_thread=False)
+        # journal_mode and synchronous are set by the writers
+        for pragma in self.PRAGMAS[2:]:
+            conn.execute(pragma)
+        return conn
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close the connections of all threads (call at shutdown)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+    
     def init_db(self):
         """Initialize database and create tables."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         # Create analysis history table with image data column
@@ -43,25 +148,320 @@ class DiseaseHistoryDB:
             )
         ''')
         
+        # Persistent tier of the analysis result cache
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        
+        # PDF report jobs, shared by every API worker using this database
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS report_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                path TEXT,
+                record_limit INTEGER NOT NULL,
+                filters TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        
         # Check if image_data column exists, add it if not
         cursor.execute("PRAGMA table_info(analysis_history)")
         columns = [column[1] for column in cursor.fetchall()]
         if 'image_data' not in columns:
             cursor.execute("ALTER TABLE analysis_history ADD COLUMN image_data BLOB")
         
+        # Perceptual hash of the upload, used for near-duplicate lookups
+        if 'image_phash' not in columns:
+            cursor.execute("ALTER TABLE analysis_history ADD COLUMN image_phash TEXT")
+        
+        # Model and prompt version of a diagnosis that near duplicates may reuse;
+        # NULL for pre-filter rejections and invalid images
+        if 'analyzer' not in columns:
+            cursor.execute("ALTER TABLE analysis_history ADD COLUMN analyzer TEXT")
+        
+        # Content-addressed image store; analyses reference images by digest
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_blobs (
+                sha256 TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                mime_type TEXT NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        ''')
+        # Downscaled copies of stored images, keyed by original digest and size
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_thumbnails (
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                mime_type TEXT NOT NULL,
+                PRIMARY KEY (sha256, size)
+            )
+        ''')
+        if 'image_sha256' not in columns:
+            cursor.execute(
+                "ALTER TABLE analysis_history ADD COLUMN image_sha256 TEXT "
+                "REFERENCES image_blobs(sha256)")
+        
+        # Keep ref_count in step with the analyses pointing at each blob
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS image_blob_ref_insert
+            AFTER INSERT ON analysis_history WHEN NEW.image_sha256 IS NOT NULL
+            BEGIN
+                UPDATE image_blobs SET ref_count = ref_count + 1
+                WHERE sha256 = NEW.image_sha256;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS image_blob_ref_update
+            AFTER UPDATE OF image_sha256 ON analysis_history
+            WHEN OLD.image_sha256 IS NOT NEW.image_sha256
+            BEGIN
+                UPDATE image_blobs SET ref_count = ref_count + 1
+                WHERE sha256 = NEW.image_sha256;
+                UPDATE image_blobs SET ref_count = ref_count - 1
+                WHERE sha256 = OLD.image_sha256;
+                DELETE FROM image_blobs
+                WHERE sha256 = OLD.image_sha256 AND ref_count <= 0;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS image_blob_thumbnails_delete
+            AFTER DELETE ON image_blobs
+            BEGIN
+                DELETE FROM image_thumbnails WHERE sha256 = OLD.sha256;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS image_blob_ref_delete
+            AFTER DELETE ON analysis_history WHEN OLD.image_sha256 IS NOT NULL
+            BEGIN
+                UPDATE image_blobs SET ref_count = ref_count - 1
+                WHERE sha256 = OLD.image_sha256;
+                DELETE FROM image_blobs
+                WHERE sha256 = OLD.image_sha256 AND ref_count <= 0;
+            END;
+        ''')
+        
+        # Statistics rollups, backfilled below when created on an existing table
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        missing_rollups = [table for table in self.STATS_ROLLUPS if table not in tables]
+        for table, columns in self.STATS_ROLLUPS.items():
+            names = ', '.join(column for column, _ in columns)
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {names},
+                    count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table} ON {table} ({names})")
+        # Recreated (atomically) every start so they cover newly added rollups
+        cursor.executescript(f'''
+            BEGIN;
+            DROP TRIGGER IF EXISTS stats_rollup_insert;
+            DROP TRIGGER IF EXISTS stats_rollup_delete;
+            DROP TRIGGER IF EXISTS stats_rollup_update;
+            
+            CREATE TRIGGER stats_rollup_insert
+            AFTER INSERT ON analysis_history
+            BEGIN
+                {self._rollup_sql('NEW', '+ 1')}
+            END;
+            
+            CREATE TRIGGER stats_rollup_delete
+            AFTER DELETE ON analysis_history
+            BEGIN
+                {self._rollup_sql('OLD', '- 1')}
+            END;
+            
+            CREATE TRIGGER stats_rollup_update
+            AFTER UPDATE OF timestamp, disease_detected, disease_type, severity
+            ON analysis_history
+            BEGIN
+                {self._rollup_sql('OLD', '- 1')}
+                {self._rollup_sql('NEW', '+ 1')}
+            END;
+            COMMIT;
+        ''')
+        
+        # Indexes for newest-first listings and the history filters. Each ends
+        # in timestamp (and implicitly id) so a filtered page is an index range
+        # scan in keyset order; the stats no longer need the older index.
+        cursor.execute("DROP INDEX IF EXISTS idx_analysis_detected_type")
+        for name, columns in (('idx_analysis_timestamp', 'timestamp'),
+                              ('idx_analysis_detected_time', 'disease_detected, timestamp'),
+                              ('idx_analysis_type_time', 'disease_type, timestamp'),
+                              ('idx_analysis_severity_time', 'severity, timestamp'),
+                              ('idx_analysis_filename', 'image_filename')):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON analysis_history ({columns})")
+        
+        # Full-text index over the diagnosis text, one row per analysis (rowid = id)
+        create_search_index = 'analysis_fts' not in tables
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS analysis_fts USING fts5(
+                disease_name, symptoms, possible_causes, treatment,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS analysis_fts_insert
+            AFTER INSERT ON analysis_history
+            BEGIN
+                {self._search_insert_sql('NEW')}
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS analysis_fts_delete
+            AFTER DELETE ON analysis_history
+            BEGIN
+                DELETE FROM analysis_fts WHERE rowid = OLD.id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS analysis_fts_update
+            AFTER UPDATE OF {', '.join(self.SEARCH_COLUMNS)} ON analysis_history
+            BEGIN
+                DELETE FROM analysis_fts WHERE rowid = OLD.id;
+                {self._search_insert_sql('NEW')}
+            END;
+        ''')
+        
         conn.commit()
-        conn.close()
+        if missing_rollups:
+            self.rebuild_stats()
+        if create_search_index:
+            self.rebuild_search_index()
+        if self._has_inline_images():
+            logger.warning("Some images are still stored inline and are not served; "
+                           "run `python database.py --migrate-images` once")
     
-    def save_analysis(self, result: Dict, image_filename: str, image_data: bytes = None):
-        """Save analysis result to database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _rollup_sql(self, row: str, delta: str) -> str:
+        """Statements that add `delta` to every rollup bucket of trigger row NEW or OLD."""
+        statements = []
+        for table, columns in self.STATS_ROLLUPS.items():
+            names = ', '.join(column for column, _ in columns)
+            values = ', '.join(expression.format(row=row) for _, expression in columns)
+            # IS rather than = so NULL keys (e.g. no severity) get a bucket too
+            match = ' AND '.join(f"{column} IS {expression.format(row=row)}"
+                                 for column, expression in columns)
+            statements.append(
+                f"INSERT INTO {table} ({names}, count) SELECT {values}, 0 "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match});")
+            statements.append(f"UPDATE {table} SET count = count {delta} WHERE {match};")
+        return '\n                '.join(statements)
+    
+    def rebuild_stats(self):
+        """Recompute the statistics rollup tables from analysis_history."""
+        conn = self.get_connection()
+        
+        with conn:
+            for table, columns in self.STATS_ROLLUPS.items():
+                names = ', '.join(column for column, _ in columns)
+                values = ', '.join(expression.format(row='analysis_history')
+                                   for _, expression in columns)
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f'''
+                    INSERT INTO {table} ({names}, count)
+                    SELECT {values}, COUNT(*) FROM analysis_history GROUP BY {values}
+                ''')
+    
+    def _search_insert_sql(self, row: str) -> str:
+        """Statement indexing trigger row NEW, with JSON lists flattened to plain text."""
+        values = []
+        for column in self.SEARCH_COLUMNS:
+            value = f"{row}.{column}"
+            if column != 'disease_name':
+                # Index "a; b" instead of '["a", "b"]' so snippets read naturally
+                value = (f"CASE WHEN json_valid({value}) THEN "
+                         f"(SELECT group_concat(value, '; ') FROM json_each({value})) "
+                         f"ELSE {value} END")
+            values.append(value)
+        return (f"INSERT INTO analysis_fts (rowid, {', '.join(self.SEARCH_COLUMNS)}) "
+                f"SELECT {row}.id, {', '.join(values)};")
+    
+    def rebuild_search_index(self):
+        """Re-index the diagnosis text of every analysis for full-text search."""
+        conn = self.get_connection()
         
+        with conn:
+            conn.execute("DELETE FROM analysis_fts")
+            conn.execute(self._search_insert_sql('analysis_history').rstrip(';')
+                         + " FROM analysis_history")
+    
+    def _has_inline_images(self) -> bool:
+        """Whether analysis_history still holds images that were never moved to image_blobs."""
+        return self.get_connection().execute('''
+            SELECT EXISTS (SELECT 1 FROM analysis_history
+                           WHERE image_data IS NOT NULL AND image_sha256 IS NULL)
+        ''').fetchone()[0] == 1
+    
+    def migrate_inline_images(self, batch_size: int = 100) -> int:
+        """
+        Move images stored inline in analysis_history.image_data to image_blobs.
+        
+        Runs in batches so large history files are converted without holding
+        every image in memory, then vacuums once to give the freed pages back.
+        The image_data column is kept (NULL) for older readers of the table.
+        VACUUM needs exclusive access, so this is a one-shot maintenance step
+        (`python database.py --migrate-images`), not part of opening the database.
+        
+        Returns:
+            int: Number of migrated images
+        """
+        conn = self.get_connection()
+        migrated = 0
+        while True:
+            rows = conn.execute('''
+                SELECT id, image_data FROM analysis_history
+                WHERE image_data IS NOT NULL AND image_sha256 IS NULL
+                LIMIT ?
+            ''', (batch_size,)).fetchall()
+            if not rows:
+                break
+            with conn:
+                cursor = conn.cursor()
+                for analysis_id, image_data in rows:
+                    sha256 = self._store_image(cursor, image_data)
+                    cursor.execute('''
+                        UPDATE analysis_history SET image_sha256 = ?, image_data = NULL
+                        WHERE id = ?
+                    ''', (sha256, analysis_id))
+            migrated += len(rows)
+        
+        if migrated:
+            conn.execute("VACUUM")
+            logger.info(f"Migrated {migrated} inline images to the image blob store")
+        return migrated
+    
+    def _store_image(self, cursor, image_data: bytes, mime_type: str = None) -> str:
+        """Insert an image blob if it is not stored yet and return its SHA-256 digest."""
+        sha256 = hashlib.sha256(image_data).hexdigest()
+        cursor.execute('''
+            INSERT OR IGNORE INTO image_blobs (sha256, data, size, mime_type, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (sha256, image_data, len(image_data),
+              mime_type or sniff_mime_type(image_data), time.time()))
+        return sha256
+    
+    def _insert_analysis(self, cursor, result: Dict, image_filename: str,
+                         image_data: bytes = None, image_phash: str = None,
+                         analyzer: str = None) -> int:
+        """Insert one analysis row using the given cursor and return its id."""
+        image_sha256 = self._store_image(cursor, image_data) if image_data else None
         cursor.execute('''
             INSERT INTO analysis_history 
             (timestamp, disease_detected, disease_name, disease_type, severity, 
-             confidence, symptoms, possible_causes, treatment, image_filename, image_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             confidence, symptoms, possible_causes, treatment, image_filename, image_sha256,
+             image_phash, analyzer)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             result.get('analysis_timestamp', datetime.now().isoformat()),
             result.get('disease_detected', False),
@@ -73,103 +473,611 @@ class DiseaseHistoryDB:
             json.dumps(result.get('possible_causes', [])),
             json.dumps(result.get('treatment', [])),
             image_filename,
-            image_data  # Store the actual image data
+            image_sha256,  # Reference to the stored image
+            image_phash,
+            analyzer
         ))
+        return cursor.lastrowid
+    
+    def save_analysis(self, result: Dict, image_filename: str, image_data: bytes = None,
+                      image_phash: str = None, analyzer: str = None) -> int:
+        """Save analysis result to database and return the new analysis id."""
+        conn = self.get_connection()
         
-        conn.commit()
-        conn.close()
+        # The connection context manager commits, or rolls back on error
+        with conn:
+            analysis_id = self._insert_analysis(conn.cursor(), result, image_filename,
+                                                image_data, image_phash, analyzer)
+        return analysis_id
+    
+    def save_analyses(self, records: List[tuple]) -> List[int]:
+        """
+        Save several analyses in a single transaction.
+        
+        Each record is a (result, image_filename, image_data, image_phash, analyzer)
+        tuple; trailing fields may be omitted.
+        Returns the new analysis ids in record order.
+        """
+        conn = self.get_connection()
+        
+        with conn:
+            cursor = conn.cursor()
+            analysis_ids = [self._insert_analysis(cursor, *record) for record in records]
+        return analysis_ids
     
     def get_recent_analyses(self, limit: int = 10) -> List[Dict]:
         """Retrieve recent analysis history."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return query_analysis_page(self.get_connection().cursor(), limit)[0]
+    
+    def get_analysis_page(self, limit: int = 10, after: Optional[tuple] = None,
+                          **filters) -> tuple:
+        """Retrieve a filtered page of history; see query_analysis_page."""
+        return query_analysis_page(self.get_connection().cursor(), limit, after, **filters)
+    
+    def get_analysis_result(self, analysis_id: int) -> Optional[Dict]:
+        """Retrieve the stored analysis result fields for a specific analysis."""
+        cursor = self.get_connection().cursor()
         
         cursor.execute('''
-            SELECT id, timestamp, disease_detected, disease_name, disease_type, severity, 
-                   confidence, symptoms, possible_causes, treatment, image_filename
-            FROM analysis_history 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
+            SELECT disease_detected, disease_name, disease_type, severity, confidence,
+                   symptoms, possible_causes, treatment, timestamp
+            FROM analysis_history WHERE id = ?
+        ''', (analysis_id,))
+        
+        row = cursor.fetchone()
         
-        rows = cursor.fetchall()
-        conn.close()
+        if not row:
+            return None
+        return {
+            'disease_detected': bool(row[0]),
+            'disease_name': row[1],
+            'disease_type': row[2],
+            'severity': row[3],
+            'confidence': row[4],
+            'symptoms': json.loads(row[5]) if row[5] else [],
+            'possible_causes': json.loads(row[6]) if row[6] else [],
+            'treatment': json.loads(row[7]) if row[7] else [],
+            'analysis_timestamp': row[8]
+        }
+    
+    def get_image_phashes(self, analyzer: str) -> List[tuple]:
+        """Retrieve (analysis id, perceptual hash) pairs of hashed analyses by one analyzer."""
+        cursor = self.get_connection().cursor()
         
-        # Convert to list of dictionaries
-        columns = [description[0] for description in cursor.description]
-        analyses = []
-        for row in rows:
-            analysis = dict(zip(columns, row))
-            # Convert JSON strings back to lists
-            analysis['symptoms'] = json.loads(analysis['symptoms'])
-            analysis['possible_causes'] = json.loads(analysis['possible_causes'])
-            analysis['treatment'] = json.loads(analysis['treatment'])
-            analyses.append(analysis)
+        cursor.execute('''
+            SELECT id, image_phash FROM analysis_history
+            WHERE image_phash IS NOT NULL AND analyzer = ?
+        ''', (analyzer,))
         
-        return analyses
+        return cursor.fetchall()
     
     def get_analysis_image(self, analysis_id: int) -> bytes:
         """Retrieve image data for a specific analysis."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('''
-            SELECT image_data FROM analysis_history WHERE id = ?
+            SELECT b.data FROM analysis_history a
+            JOIN image_blobs b ON b.sha256 = a.image_sha256
+            WHERE a.id = ?
         ''', (analysis_id,))
         
         row = cursor.fetchone()
-        conn.close()
         
         if row and row[0]:
             return row[0]
         return None
     
-    def get_analysis_stats(self) -> Dict:
-        """Get statistics about analysis history."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_analysis_image_info(self, analysis_id: int) -> Optional[Dict]:
+        """Retrieve the digest, size and MIME type of an analysis image."""
+        cursor = self.get_connection().cursor()
         
-        # Total analyses
-        cursor.execute('SELECT COUNT(*) FROM analysis_history')
-        total = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT b.sha256, b.size, b.mime_type FROM analysis_history a
+            JOIN image_blobs b ON b.sha256 = a.image_sha256
+            WHERE a.id = ?
+        ''', (analysis_id,))
         
-        # Disease detections
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 1')
-        diseases = cursor.fetchone()[0]
+        row = cursor.fetchone()
+        
+        if not row:
+            return None
+        return {'sha256': row[0], 'size': row[1], 'mime_type': row[2]}
+    
+    def get_thumbnail(self, sha256: str, size: int) -> Optional[tuple]:
+        """Retrieve a stored thumbnail as (data, mime_type), or None if not generated yet."""
+        cursor = self.get_connection().cursor()
+        
+        cursor.execute('''
+            SELECT data, mime_type FROM image_thumbnails WHERE sha256 = ? AND size = ?
+        ''', (sha256, size))
+        
+        return cursor.fetchone()
+    
+    def save_thumbnail(self, sha256: str, size: int, data: bytes, mime_type: str):
+        """Store a generated thumbnail for an image blob."""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO image_thumbnails (sha256, size, data, mime_type)
+                SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM image_blobs WHERE sha256 = ?)
+            ''', (sha256, size, data, mime_type, sha256))
+    
+    def get_analysis_thumbnail(self, analysis_id: int, size: int) -> Optional[tuple]:
+        """
+        Return (sha256, data, mime_type) of a thumbnail, generating and storing it on first use.
         
-        # Healthy plants
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 0 AND disease_type != "invalid_image"')
-        healthy = cursor.fetchone()[0]
+        Returns None if the analysis has no image or the image cannot be decoded.
+        """
+        info = self.get_analysis_image_info(analysis_id)
+        if info is None:
+            return None
+        stored = self.get_thumbnail(info['sha256'], size)
+        if stored is not None:
+            return info['sha256'], stored[0], stored[1]
+        thumbnail = make_thumbnail(self.get_analysis_image(analysis_id), size)
+        if thumbnail is None:
+            return None
+        data, mime_type = thumbnail
+        self.save_thumbnail(info['sha256'], size, data, mime_type)
+        return info['sha256'], data, mime_type
+    
+    def iter_image_chunks(self, sha256: str, start: int = 0, end: int = None,
+                          chunk_size: int = 65536):
+        """
+        Stream bytes [start, end] of an image blob, one chunk at a time.
         
-        # Invalid images
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_type = "invalid_image"')
-        invalid = cursor.fetchone()[0]
+        The generator opens its own connection because a streaming response
+        may resume it on a different worker thread; the connection is closed
+        when the generator finishes or is discarded. The blob's rowid is
+        looked up inside the same read transaction that streams it, so a
+        VACUUM renumbering rowids cannot redirect the read to another image.
+        Incremental BLOB I/O (Connection.blobopen) is used on Python 3.11+;
+        older interpreters read each chunk with substr().
+        """
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT,
+                               check_same_thread=False)
+        try:
+            conn.execute("BEGIN")
+            row = conn.execute('SELECT rowid, length(data) FROM image_blobs WHERE sha256 = ?',
+                               (sha256,)).fetchone()
+            if row is None:
+                return
+            blob_rowid, length = row
+            end = length - 1 if end is None else min(end, length - 1)
+            remaining = end - start + 1
+            if hasattr(conn, 'blobopen'):
+                with conn.blobopen('image_blobs', 'data', blob_rowid, readonly=True) as blob:
+                    blob.seek(start)
+                    while remaining > 0:
+                        chunk = blob.read(min(chunk_size, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        yield chunk
+            else:
+                offset = start
+                while remaining > 0:
+                    chunk = conn.execute('SELECT substr(data, ?, ?) FROM image_blobs WHERE rowid = ?',
+                                         (offset + 1, min(chunk_size, remaining),
+                                          blob_rowid)).fetchone()[0]
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    remaining -= len(chunk)
+                    yield chunk
+        finally:
+            conn.close()
+    
+    def get_analysis_stats(self, days: int = None) -> Dict:
+        """Get statistics about analysis history, optionally for the last `days` days."""
+        return query_analysis_stats(self.get_connection().cursor(), days)
+    
+    def search_analyses(self, text: str, limit: int = 20, **kwargs) -> List[Dict]:
+        """Full-text search of the history; see query_analysis_search."""
+        return query_analysis_search(self.get_connection().cursor(), text, limit, **kwargs)
+    
+    def get_daily_trend(self, days: Optional[int] = 30) -> List[tuple]:
+        """Get (date, count) pairs for the last `days` days (all days if None)."""
+        return query_daily_trend(self.get_connection().cursor(), days)
+    
+    def get_cached_result(self, cache_key: str, max_age_seconds: float = None) -> Optional[Dict]:
+        """Retrieve a cached analysis result, ignoring entries older than max_age_seconds."""
+        cursor = self.get_connection().cursor()
         
-        # Disease types distribution
         cursor.execute('''
-            SELECT disease_type, COUNT(*) 
-            FROM analysis_history 
-            WHERE disease_detected = 1 
-            GROUP BY disease_type 
-            ORDER BY COUNT(*) DESC
-        ''')
-        disease_types = cursor.fetchall()
+            SELECT result, created_at FROM result_cache WHERE cache_key = ?
+        ''', (cache_key,))
         
-        conn.close()
+        row = cursor.fetchone()
         
-        return {
-            'total_analyses': total,
-            'disease_detections': diseases,
-            'healthy_plants': healthy,
-            'invalid_images': invalid,
-            'disease_distribution': dict(disease_types)
-        }
+        if not row:
+            return None
+        if max_age_seconds is not None and time.time() - row[1] > max_age_seconds:
+            return None
+        return json.loads(row[0])
+    
+    def save_cached_result(self, cache_key: str, result: Dict):
+        """Store an analysis result in the persistent result cache."""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO result_cache (cache_key, result, created_at)
+                VALUES (?, ?, ?)
+            ''', (cache_key, json.dumps(result), time.time()))
+    
+    def save_report_jobs(self, jobs: List[Dict]):
+        """Insert or update report jobs (ReportJob.to_record() dicts), stamping updated_at."""
+        conn = self.get_connection()
+        now = time.time()
+        
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO report_jobs
+                (id, status, total, completed, error, path, record_limit, filters,
+                 created_at, finished_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(job['id'], job['status'], job['total'], job['completed'], job['error'],
+                   job['path'], job['limit'], json.dumps(job['filters']), job['created_at'],
+                   job['finished_at'], now) for job in jobs])
+    
+    def get_report_job(self, job_id: str) -> Optional[Dict]:
+        """Retrieve a report job record, or None if it is unknown or was pruned."""
+        cursor = self.get_connection().cursor()
+        
+        cursor.execute('''
+            SELECT id, status, total, completed, error, path, record_limit, filters,
+                   created_at, finished_at, updated_at
+            FROM report_jobs WHERE id = ?
+        ''', (job_id,))
+        
+        row = cursor.fetchone()
+        
+        if not row:
+            return None
+        return {'id': row[0], 'status': row[1], 'total': row[2], 'completed': row[3],
+                'error': row[4], 'path': row[5], 'limit': row[6], 'filters': json.loads(row[7]),
+                'created_at': row[8], 'finished_at': row[9], 'updated_at': row[10]}
+    
+    def get_report_job_ids(self) -> set:
+        """Return the ids of all report jobs still on record."""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT id FROM report_jobs")
+        return {row[0] for row in cursor.fetchall()}
+    
+    def prune_report_jobs(self, keep: int, stale_before: float, error: str) -> List[str]:
+        """
+        Expire abandoned report jobs and forget old finished ones.
+        
+        Unfinished jobs not updated since `stale_before` (their process
+        died) are marked failed with `error`. Finished jobs beyond the newest
+        `keep` are deleted. Returns the file paths of the deleted jobs.
+        """
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('''
+                UPDATE report_jobs SET status = 'failed', error = ?, finished_at = ?
+                WHERE status NOT IN ('done', 'failed') AND updated_at < ?
+            ''', (error, time.time(), stale_before))
+            rows = conn.execute('''
+                SELECT id, path FROM report_jobs WHERE status IN ('done', 'failed')
+                ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            ''', (keep,)).fetchall()
+            conn.executemany("DELETE FROM report_jobs WHERE id = ?", [(row[0],) for row in rows])
+        return [row[1] for row in rows if row[1]]
+
+def query_analysis_stats(cursor, days: int = None) -> Dict:
+    """
+    Read the history statistics from the rollup tables.
+    
+    stats_by_type holds one row per (disease_detected, disease_type) pair and
+    stats_by_severity one per severity, so the all-time figures are a handful
+    of rows however long the history is. With `days`, the same figures are
+    summed from the per-day stats_by_day_type rows of that window, so narrower
+    windows read fewer rows. Shared by the API, the Streamlit app and the
+    dashboard, which pass a cursor on their own connection.
+    """
+    if days is None:
+        cursor.execute('''
+            SELECT disease_detected, disease_type, count FROM stats_by_type WHERE count > 0
+        ''')
+        type_counts = cursor.fetchall()
+        cursor.execute('''
+            SELECT severity, count FROM stats_by_severity WHERE count > 0 ORDER BY count DESC
+        ''')
+        severities = cursor.fetchall()
+    else:
+        since = f'-{days} days'
+        cursor.execute('''
+            SELECT disease_detected, disease_type, SUM(count) FROM stats_by_day_type
+            WHERE day >= date('now', ?)
+            GROUP BY disease_detected, disease_type HAVING SUM(count) > 0
+        ''', (since,))
+        type_counts = cursor.fetchall()
+        cursor.execute('''
+            SELECT severity, SUM(count) FROM stats_by_day_type
+            WHERE day >= date('now', ?)
+            GROUP BY severity HAVING SUM(count) > 0 ORDER BY SUM(count) DESC
+        ''', (since,))
+        severities = cursor.fetchall()
+    
+    total = diseases = healthy = invalid = 0
+    distribution = {}
+    for detected, disease_type, count in type_counts:
+        total += count
+        if detected == 1:
+            diseases += count
+            distribution[disease_type] = distribution.get(disease_type, 0) + count
+        if disease_type == 'invalid_image':
+            invalid += count
+        elif detected == 0 and disease_type is not None:
+            healthy += count
+    
+    return {
+        'total_analyses': total,
+        'disease_detections': diseases,
+        'healthy_plants': healthy,
+        'invalid_images': invalid,
+        'disease_distribution': dict(sorted(distribution.items(),
+                                            key=lambda item: item[1], reverse=True)),
+        'severity_distribution': dict(severities)
+    }
+
+def query_daily_trend(cursor, days: Optional[int] = 30) -> List[tuple]:
+    """Count analyses per day over the last `days` days (all days if None) from stats_by_day."""
+    window = "AND day >= date('now', ?)" if days is not None else ""
+    cursor.execute(f'''
+        SELECT day as date, count
+        FROM stats_by_day
+        WHERE count > 0 {window}
+        ORDER BY day
+    ''', (f'-{days} days',) if days is not None else ())
+    
+    return cursor.fetchall()
+
+def _analysis_from_row(columns: List[str], row: tuple) -> Dict:
+    """Build an analysis dict from a history row, decoding the JSON list columns."""
+    analysis = dict(zip(columns, row))
+    # Convert JSON strings back to lists
+    analysis['symptoms'] = json.loads(analysis['symptoms']) if analysis['symptoms'] else []
+    analysis['possible_causes'] = json.loads(analysis['possible_causes']) if analysis['possible_causes'] else []
+    analysis['treatment'] = json.loads(analysis['treatment']) if analysis['treatment'] else []
+    return analysis
+
+def _day_window(column: str, date_from: str = None, date_to: str = None) -> tuple:
+    """
+    SQL conditions and parameters limiting `column` to UTC days [date_from, date_to].
+    
+    Timestamps are stored with the server's UTC offset, while the rollups
+    (and window_start) count days in UTC, so days are compared via
+    date(column). A stored local date is within a day of its UTC date, which
+    gives a one-day-wider range on the raw column that the timestamp index
+    can serve before date() is evaluated.
+    """
+    conditions = []
+    params = []
+    if date_from is not None:
+        conditions.append(f"{column} >= date(?, '-1 day') AND date({column}) >= ?")
+        params.extend((date_from, date_from))
+    if date_to is not None:
+        conditions.append(f"{column} < date(?, '+2 day') AND date({column}) <= ?")
+        params.extend((date_to, date_to))
+    return conditions, params
+
+def query_analysis_page(cursor, limit: int = 10, after: Optional[tuple] = None,
+                        disease_type: str = None, severity: str = None,
+                        disease_detected: bool = None, min_confidence: float = None,
+                        max_confidence: float = None, date_from: str = None,
+                        date_to: str = None, filename_prefix: str = None) -> tuple:
+    """
+    Fetch one page of analysis history, newest first, with optional filters.
+    
+    Pages are addressed by keyset rather than offset: `after` is the
+    (timestamp, id) of the last row of the previous page and the query resumes
+    just below it, so every page costs the same however deep it is. Returns
+    (analyses, next_key) where next_key is None on the last page.
+    
+    date_from and date_to are inclusive ISO dates of UTC days, as in the
+    rollups; filename_prefix is case-sensitive.
+    """
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend(after)
+    for column, value in (('disease_type', disease_type), ('severity', severity)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if disease_detected is not None:
+        conditions.append("disease_detected = ?")
+        params.append(int(disease_detected))
+    if min_confidence is not None:
+        conditions.append("confidence >= ?")
+        params.append(min_confidence)
+    if max_confidence is not None:
+        conditions.append("confidence <= ?")
+        params.append(max_confidence)
+    day_conditions, day_params = _day_window('timestamp', date_from, date_to)
+    conditions.extend(day_conditions)
+    params.extend(day_params)
+    if filename_prefix:
+        # A range instead of LIKE so the image_filename index applies
+        conditions.append("image_filename >= ? AND image_filename < ?")
+        params.extend((filename_prefix, filename_prefix + '\U0010ffff'))
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f'''
+        SELECT id, timestamp, disease_detected, disease_name, disease_type, severity, 
+               confidence, symptoms, possible_causes, treatment, image_filename
+        FROM analysis_history 
+        {where}
+        ORDER BY timestamp DESC, id DESC 
+        LIMIT ?
+    ''', (*params, limit + 1))
+    
+    rows = cursor.fetchall()
+    
+    # Convert to list of dictionaries
+    columns = [description[0] for description in cursor.description]
+    analyses = [_analysis_from_row(columns, row) for row in rows[:limit]]
+    
+    next_key = None
+    if len(rows) > limit:
+        next_key = (analyses[-1]['timestamp'], analyses[-1]['id'])
+    return analyses, next_key
 
-# Global database instance
-db = DiseaseHistoryDB()
+def query_analyses_by_id(cursor, ids: List[int]) -> List[Dict]:
+    """Fetch the analyses with the given ids (all fields), newest first."""
+    if not ids:
+        return []
+    cursor.execute(f'''
+        SELECT id, timestamp, disease_detected, disease_name, disease_type, severity, 
+               confidence, symptoms, possible_causes, treatment, image_filename
+        FROM analysis_history 
+        WHERE id IN ({', '.join('?' * len(ids))})
+        ORDER BY timestamp DESC, id DESC
+    ''', list(ids))
+    
+    columns = [description[0] for description in cursor.description]
+    return [_analysis_from_row(columns, row) for row in cursor.fetchall()]
+
+# Columns read by query_history_rows and the SQL producing them; the time is
+# UTC epoch milliseconds so that analytics need not parse timestamp strings
+HISTORY_ROW_COLUMNS = {
+    'id': 'id',
+    'epoch_ms': 'CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)',
+    'disease_detected': 'disease_detected',
+    'disease_name': 'disease_name',
+    'disease_type': 'disease_type',
+    'severity': 'severity',
+    'confidence': 'confidence',
+    'image_filename': 'image_filename',
+}
+
+def query_history_rows(cursor, date_from: str = None, chunk_size: int = 10000):
+    """
+    Yield the HISTORY_ROW_COLUMNS of every analysis since `date_from` (an
+    inclusive ISO date of a UTC day, or None for all), newest first, in lists
+    of up to `chunk_size` tuples.
+    
+    The JSON list columns are left out so that loading a long history for
+    analytics stays cheap; query_analyses_by_id fetches them for the rows on
+    screen.
+    """
+    conditions, params = _day_window('timestamp', date_from)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f'''
+        SELECT {', '.join(HISTORY_ROW_COLUMNS.values())}
+        FROM analysis_history 
+        {where}
+        ORDER BY timestamp DESC, id DESC
+    ''', params)
+    
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+# Largest match set query_analysis_search ranks by relevance
+SEARCH_CANDIDATES = 1000
+
+def _fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query.
+    
+    "Quoted phrases" are kept as phrases and every other word becomes its own
+    quoted term, so punctuation in user input (copper-based, 50%) can never be
+    read as FTS5 syntax. Terms are ANDed.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        term = (phrase or word).strip()
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"')
+    return ' '.join(terms)
+
+def query_analysis_search(cursor, text: str, limit: int = 20, date_from: str = None,
+                          highlight: tuple = ('<b>', '</b>')) -> List[Dict]:
+    """
+    Full-text search over disease names, symptoms, causes and treatments.
+    
+    Each result carries a `snippet` of the best matching column with the hits
+    wrapped in `highlight` markers. When the query matches at most
+    SEARCH_CANDIDATES analyses, results are ranked by BM25 (disease name hits
+    count double; lower `score` is better). Broader queries, where BM25 would
+    have to score a large share of the history, return the newest matches
+    first with `score` None; telling the two apart costs one index walk that
+    stops after SEARCH_CANDIDATES + 1 matches.
+    """
+    match = _fts_query(text)
+    if not match:
+        return []
+    
+    window_conditions, window_params = _day_window('a.timestamp', date_from)
+    window = ''.join(f"AND {condition} " for condition in window_conditions)
+    cursor.execute(f'''
+        SELECT analysis_fts.rowid
+        FROM analysis_fts
+        JOIN analysis_history a ON a.id = analysis_fts.rowid
+        WHERE analysis_fts MATCH ? {window}
+        ORDER BY analysis_fts.rowid DESC
+        LIMIT ?
+    ''', (match, *window_params, SEARCH_CANDIDATES + 1))
+    
+    if len(cursor.fetchall()) <= SEARCH_CANDIDATES:
+        # FTS5 sorts by rank itself and builds snippets only for the rows returned
+        ranking = "AND rank MATCH 'bm25(2.0, 1.0, 1.0, 1.0)'"
+        score, order = "rank", "rank"
+    else:
+        ranking, score, order = "", "NULL", "analysis_fts.rowid DESC"
+    cursor.execute(f'''
+        SELECT a.id, a.timestamp, a.disease_detected, a.disease_name, a.disease_type,
+               a.severity, a.confidence, a.symptoms, a.possible_causes, a.treatment,
+               a.image_filename,
+               snippet(analysis_fts, -1, ?, ?, '…', 12) as snippet,
+               {score} as score
+        FROM analysis_fts
+        JOIN analysis_history a ON a.id = analysis_fts.rowid
+        WHERE analysis_fts MATCH ? {ranking} {window}
+        ORDER BY {order}
+        LIMIT ?
+    ''', (*highlight, match, *window_params, limit))
+    
+    rows = cursor.fetchall()
+    columns = [description[0] for description in cursor.description]
+    results = []
+    for row in rows:
+        result = dict(zip(columns, row))
+        for column in ('symptoms', 'possible_causes', 'treatment'):
+            result[column] = json.loads(result[column]) if result[column] else []
+        results.append(result)
+    return results
+
+# Global database instance (DISEASE_HISTORY_DB overrides the file location)
+db = DiseaseHistoryDB(os.getenv("DISEASE_HISTORY_DB", "disease_history.db"))
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Leaf disease history database")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="recompute the statistics rollup tables from the history")
+    parser.add_argument("--migrate-images", action="store_true",
+                        help="move inline images into the image blob store and vacuum")
+    args = parser.parse_args()
+    
+    if args.rebuild_stats:
+        db.rebuild_stats()
+        print("Statistics rollups rebuilt")
+    
+    if args.migrate_images:
+        print(f"Migrated {db.migrate_inline_images()} inline images")
+    
     # Test the database
     print("Database initialized successfully!")
     stats = db.get_analysis_stats()
-    print(f"Current stats: {stats}")
\ No newline at end of file
+    print(f"Current stats: {stats}")
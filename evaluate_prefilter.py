@@ -0,0 +1,158 @@
+"""
+Precision and Recall of the Local Pre-Filter
+============================================
+
+Replays stored uploads through the pre-filter (Leaf Disease/prefilter.py) and
+compares its verdicts with the vision model's. A rejection is a positive:
+
+    precision   rejected images the model also called 'invalid_image'
+    recall      'invalid_image' images the pre-filter rejected, i.e. the
+                share of wasted model calls it saves
+    leaf loss   leaf images wrongly rejected (each one is a wrong answer)
+
+Labels come from the history database: disease_type 'invalid_image' marks a
+non-leaf upload, anything else a leaf. Rows answered by the pre-filter itself
+are skipped. Directories of extra labelled images can be added with
+--non-leaf and --leaf. Images are normalized as the upload endpoints do before
+they are checked, so the timings match production.
+
+The history database is opened read-only.
+
+Usage:
+    python evaluate_prefilter.py [--db disease_history.db] [--non-leaf DIR] [--leaf DIR]
+                                 [--thresholds 0.05 0.10 0.15]
+"""
+
+import argparse
+import json
+import sqlite3
+import statistics
+import sys
+from pathlib import Path
+
+from utils import prepare_image
+from prefilter import DEFAULT_MIN_VEGETATION_FRACTION, PREFILTER_CAUSE, LeafPrefilter
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.gif')
+
+
+def history_samples(db_path: Path):
+    """Yield (label, is_non_leaf, image bytes) for every stored upload with an image."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        has_blobs = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'image_blobs'").fetchone()
+        if has_blobs:
+            rows = conn.execute('''
+                SELECT a.id, a.disease_type, a.possible_causes, COALESCE(b.data, a.image_data)
+                FROM analysis_history a
+                LEFT JOIN image_blobs b ON b.sha256 = a.image_sha256
+                ORDER BY a.id
+            ''')
+        else:
+            # Databases not yet migrated to deduplicated image storage
+            rows = conn.execute('''
+                SELECT id, disease_type, possible_causes, image_data
+                FROM analysis_history ORDER BY id
+            ''')
+        for analysis_id, disease_type, possible_causes, image_data in rows:
+            if not image_data:
+                continue
+            if possible_causes and PREFILTER_CAUSE in json.loads(possible_causes):
+                continue
+            yield f"analysis #{analysis_id} ({disease_type})", disease_type == 'invalid_image', image_data
+    finally:
+        conn.close()
+
+
+def directory_samples(directory: Path, non_leaf: bool):
+    """Yield (label, is_non_leaf, image bytes) for every image in a directory."""
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() in IMAGE_SUFFIXES:
+            yield path.name, non_leaf, path.read_bytes()
+
+
+def measure(samples) -> list:
+    """Check every sample once; return (label, is_non_leaf, vegetation fraction, ms) tuples."""
+    prefilter = LeafPrefilter()
+    measurements = []
+    for label, non_leaf, image_data in samples:
+        image_bytes, _ = prepare_image(image_data)
+        verdict = prefilter.check(image_bytes)
+        measurements.append((label, non_leaf, verdict.vegetation_fraction, verdict.seconds * 1000))
+    return measurements
+
+
+def score(measurements: list, threshold: float) -> dict:
+    """Confusion counts, precision and recall of rejecting below `threshold`."""
+    rejected_non_leaf = sum(1 for _, non_leaf, fraction, _ in measurements
+                            if non_leaf and fraction < threshold)
+    rejected_leaf = [label for label, non_leaf, fraction, _ in measurements
+                     if not non_leaf and fraction < threshold]
+    non_leaf_total = sum(1 for _, non_leaf, _, _ in measurements if non_leaf)
+    leaf_total = len(measurements) - non_leaf_total
+    rejected = rejected_non_leaf + len(rejected_leaf)
+    return {
+        "rejected": rejected,
+        "precision": rejected_non_leaf / rejected if rejected else None,
+        "recall": rejected_non_leaf / non_leaf_total if non_leaf_total else None,
+        "leaf_loss": len(rejected_leaf) / leaf_total if leaf_total else None,
+        "rejected_leaves": rejected_leaf
+    }
+
+
+def _percent(value) -> str:
+    return f"{100 * value:.1f}%" if value is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", type=Path, default=Path("disease_history.db"),
+                        help="history database to read labels and images from")
+    parser.add_argument("--non-leaf", type=Path, action="append", default=[],
+                        help="directory of extra images known not to show a leaf")
+    parser.add_argument("--leaf", type=Path, action="append", default=[],
+                        help="directory of extra leaf images")
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.05, DEFAULT_MIN_VEGETATION_FRACTION, 0.15, 0.20],
+                        help="min_vegetation_fraction values to score")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database not found at {args.db}")
+        sys.exit(1)
+
+    history = measure(history_samples(args.db))
+    extra = measure(sample for directory, non_leaf in
+                    [(d, True) for d in args.non_leaf] + [(d, False) for d in args.leaf]
+                    for sample in directory_samples(directory, non_leaf))
+    measurements = history + extra
+    if not measurements:
+        print("Error: No images to evaluate")
+        sys.exit(1)
+
+    history_non_leaf = sum(1 for _, non_leaf, _, _ in history if non_leaf)
+    print(f"History: {len(history)} images, {history_non_leaf} labelled invalid_image by the model")
+    if extra:
+        print(f"Extra:   {len(extra)} images, "
+              f"{sum(1 for _, non_leaf, _, _ in extra if non_leaf)} non-leaf")
+
+    print(f"\n{'Threshold':>10} {'Rejected':>9} {'Precision':>10} {'Recall':>8} {'Leaf loss':>10}")
+    for threshold in args.thresholds:
+        result = score(measurements, threshold)
+        print(f"{threshold:>10.2f} {result['rejected']:>9} {_percent(result['precision']):>10} "
+              f"{_percent(result['recall']):>8} {_percent(result['leaf_loss']):>10}")
+        for label in result['rejected_leaves']:
+            print(f"{'':>10} rejected leaf: {label}")
+
+    timings = sorted(ms for _, _, _, ms in measurements)
+    leaf_fractions = [fraction for _, non_leaf, fraction, _ in measurements if not non_leaf]
+    print(f"\nCheck time: p50 {statistics.median(timings):.1f} ms, "
+          f"p95 {timings[min(len(timings) - 1, int(len(timings) * 0.95))]:.1f} ms, "
+          f"max {timings[-1]:.1f} ms")
+    if leaf_fractions:
+        print(f"Lowest vegetation fraction of a leaf: {min(leaf_fractions):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Streaming export of the analysis history.
+
+Rows are read from the database in keyset-paginated batches and encoded batch
+by batch as CSV, NDJSON or Parquet, optionally gzip-compressed, so exporting
+the whole history needs memory for one batch rather than the whole file.
+
+Parquet output needs pyarrow (`pip install pyarrow`); CSV and NDJSON use only
+the standard library.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, List
+
+EXPORT_BATCH_SIZE = 1000
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+CSV_HEADER = ["ID", "Timestamp", "Disease Detected", "Disease Name", "Disease Type",
+              "Severity", "Confidence", "Symptoms", "Possible Causes", "Treatment",
+              "Image Filename"]
+
+LIST_FIELDS = ("symptoms", "possible_causes", "treatment")
+
+
+def iter_analysis_batches(db, batch_size: int = EXPORT_BATCH_SIZE, **filters) -> Iterator[List[Dict]]:
+    """Yield the filtered history newest first, one keyset page at a time."""
+    after = None
+    while True:
+        analyses, after = db.get_analysis_page(batch_size, after, **filters)
+        if analyses:
+            yield analyses
+        if after is None:
+            return
+
+
+def iter_csv(batches: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Encode batches as CSV in the same layout as the Streamlit exports."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch in batches:
+        for analysis in batch:
+            writer.writerow([
+                analysis['id'],
+                analysis['timestamp'],
+                analysis['disease_detected'],
+                analysis['disease_name'],
+                analysis['disease_type'],
+                analysis['severity'],
+                analysis['confidence'],
+                *('; '.join(analysis[field]) if isinstance(analysis[field], list) else analysis[field]
+                  for field in LIST_FIELDS),
+                analysis['image_filename']
+            ])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(batches: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Encode batches as newline-delimited JSON, one analysis per line."""
+    for batch in batches:
+        yield ''.join(json.dumps(analysis) + '\n' for analysis in batch).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks.
+
+    Tracks its own position so the Parquet footer offsets stay correct after
+    each chunk is drained.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_schema():
+    """Arrow schema of the exported history (raises ImportError without pyarrow)."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.string()),
+        ("disease_detected", pa.bool_()),
+        ("disease_name", pa.string()),
+        ("disease_type", pa.string()),
+        ("severity", pa.string()),
+        ("confidence", pa.float64()),
+        ("symptoms", pa.list_(pa.string())),
+        ("possible_causes", pa.list_(pa.string())),
+        ("treatment", pa.list_(pa.string())),
+        ("image_filename", pa.string()),
+    ])
+
+
+def iter_parquet(batches: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Encode batches as a Parquet file with one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for batch in batches:
+        rows = [{**analysis,
+                 'disease_detected': (bool(analysis['disease_detected'])
+                                      if analysis['disease_detected'] is not None else None)}
+                for analysis in batch]
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream into a single gzip member as it is produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(db, export_format: str, compress: bool = False,
+                  batch_size: int = EXPORT_BATCH_SIZE, **filters) -> Iterator[bytes]:
+    """
+    Stream the filtered history in `export_format` ("csv", "ndjson" or "parquet").
+
+    `compress` gzips CSV and NDJSON output; Parquet is always compressed
+    internally (snappy) and ignores it.
+    """
+    encoders = {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}
+    if export_format not in encoders:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    chunks = encoders[export_format](iter_analysis_batches(db, batch_size, **filters))
+    if compress and export_format != "parquet":
+        chunks = gzip_stream(chunks)
+    return chunks
@@ -0,0 +1,162 @@
+"""
+Fault Injection Check for the Vision Model Resilience Layer
+===========================================================
+
+Drives LeafDiseaseDetector against a local stub of the Groq completions
+endpoint that injects errors and latency, and checks that:
+
+    - transient 5xx errors are retried with backoff,
+    - a slow request is hedged at the p95 deadline,
+    - repeated failures open the circuit breaker, which then fails fast
+      without calling the upstream and serves stale cached results,
+    - the circuit closes again after the reset timeout,
+    - the API answers 503 with Retry-After while the circuit is open.
+
+Usage:
+    python fault_injection_check.py
+"""
+
+import asyncio
+import base64
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app as api
+from database import DiseaseHistoryDB
+from stub_groq_server import StubGroqServer
+from utils import LeafDiseaseDetector, configure_detector
+from result_cache import ResultCache
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+failures = []
+
+
+def check(name: str, condition: bool, detail: str = "") -> None:
+    """Record and print the outcome of one check."""
+    print(f"{'PASS' if condition else 'FAIL'}: {name}" + (f" ({detail})" if detail else ""))
+    if not condition:
+        failures.append(name)
+
+
+def make_image(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def make_detector(stub: StubGroqServer, **kwargs) -> LeafDiseaseDetector:
+    kwargs.setdefault("retry_policy", RetryPolicy(max_attempts=3, base_delay=0.05))
+    return LeafDiseaseDetector(api_key="stub", base_url=stub.url, **kwargs)
+
+
+async def check_retries(stub: StubGroqServer) -> None:
+    detector = make_detector(stub)
+    image = base64.b64encode(make_image((0, 120, 0))).decode()
+    before = stub.request_count
+    stub.fail_next(2, 503)
+    result = await detector.analyze_leaf_image_base64_async(image)
+    check("transient errors are retried",
+          result["disease_name"] == "Brown Spot" and detector.retries == 2,
+          f"{stub.request_count - before} upstream calls")
+    await detector.aclose()
+
+
+async def check_hedging(stub: StubGroqServer) -> None:
+    detector = make_detector(stub, hedge_percentile=95)
+    image = base64.b64encode(make_image((0, 130, 0))).decode()
+    stub.latency = 0.05
+    for _ in range(detector.latency_tracker.min_samples):
+        await detector.analyze_leaf_image_base64_async(image)
+
+    stub.slow_next(1, 3.0)
+    start = time.perf_counter()
+    await detector.analyze_leaf_image_base64_async(image)
+    elapsed = time.perf_counter() - start
+    stub.latency = 0.0
+    check("slow request is hedged at the p95 deadline",
+          detector.hedges_won == 1 and elapsed < 1.0, f"answered in {elapsed:.2f}s")
+    await detector.aclose()
+
+
+async def check_circuit_breaker(stub: StubGroqServer) -> None:
+    cache = ResultCache(max_entries=16, ttl_seconds=0.2)
+    detector = make_detector(stub, cache=cache,
+                             retry_policy=RetryPolicy(max_attempts=1),
+                             circuit_breaker=CircuitBreaker(failure_threshold=3,
+                                                            reset_timeout=1.0))
+    cached_image = base64.b64encode(make_image((0, 140, 0))).decode()
+    fresh_image = base64.b64encode(make_image((0, 150, 0))).decode()
+    await detector.analyze_leaf_image_base64_async(cached_image)
+    await asyncio.sleep(0.3)  # let the cached entry expire
+
+    stub.fail_next(3, 500)
+    for _ in range(3):
+        try:
+            await detector.analyze_leaf_image_base64_async(fresh_image)
+        except Exception:
+            pass
+    check("failures open the circuit",
+          detector.circuit_breaker.state == "open")
+
+    before = stub.request_count
+    start = time.perf_counter()
+    try:
+        await detector.analyze_leaf_image_base64_async(fresh_image)
+        rejected = False
+    except CircuitOpenError:
+        rejected = True
+    elapsed = time.perf_counter() - start
+    check("open circuit fails fast without calling upstream",
+          rejected and stub.request_count == before and elapsed < 0.05,
+          f"rejected in {elapsed * 1000:.1f}ms")
+
+    stale = await detector.analyze_leaf_image_base64_async(cached_image)
+    check("open circuit serves stale cached results", stale.get("stale") is True)
+
+    await asyncio.sleep(1.1)
+    result = await detector.analyze_leaf_image_base64_async(fresh_image)
+    check("circuit closes after the reset timeout",
+          detector.circuit_breaker.state == "closed" and not result.get("cached"))
+    await detector.aclose()
+
+
+def check_api_503(stub: StubGroqServer, image_bytes: bytes) -> None:
+    detector = make_detector(stub, circuit_breaker=CircuitBreaker(failure_threshold=1,
+                                                                  reset_timeout=30))
+    detector.circuit_breaker.record_failure()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Keep check rows out of the real history database
+        api.db = DiseaseHistoryDB(str(Path(tmp_dir) / "fault_injection.db"))
+        with TestClient(api.app) as client:
+            configure_detector(detector)
+            api.app.state.detector = detector
+            response = client.post("/disease-detection-file",
+                                   files={"file": ("leaf.jpg", image_bytes, "image/jpeg")})
+            breaker = client.get("/metrics").json()["resilience"]["circuit_breaker"]
+    check("API answers 503 with Retry-After while the circuit is open",
+          response.status_code == 503 and "retry-after" in response.headers,
+          f"status {response.status_code}")
+    check("circuit breaker state is reported in /metrics", breaker["state"] == "open")
+
+
+def main():
+    with StubGroqServer() as stub:
+        asyncio.run(check_retries(stub))
+        asyncio.run(check_hedging(stub))
+        asyncio.run(check_circuit_breaker(stub))
+        check_api_503(stub, make_image((0, 160, 0)))
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll fault injection checks passed")
+
+
+if __name__ == "__main__":
+    main()
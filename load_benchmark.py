@@ -0,0 +1,105 @@
+"""
+Load Test for the Disease Detection Endpoint
+============================================
+
+Fires concurrent uploads at /disease-detection-file against a local stub of
+the Groq completions endpoint and reports how throughput scales with
+concurrency. With the async inference path the network wait of concurrent
+uploads overlaps, so throughput should grow roughly linearly until the
+connection pool is saturated.
+
+Usage:
+    python load_benchmark.py [--requests 32] [--latency 0.25]
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+import app as api
+from config import AppConfig
+from database import DiseaseHistoryDB
+from perceptual_hash import NearDuplicateIndex
+from stub_groq_server import StubGroqServer
+from utils import LeafDiseaseDetector, configure_detector, shutdown_detector_async
+
+TEST_IMAGE = Path(__file__).parent / "Media" / "brown-spot-4 (1).jpg"
+
+
+async def run_level(client: httpx.AsyncClient, image_bytes: bytes,
+                    total_requests: int, concurrency: int) -> float:
+    """Send `total_requests` uploads with at most `concurrency` in flight and return req/s."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(i: int):
+        async with semaphore:
+            files = {"file": (f"leaf_{i}.jpg", image_bytes, "image/jpeg")}
+            response = await client.post("/disease-detection-file", files=files)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(i) for i in range(total_requests)))
+    return total_requests / (time.perf_counter() - start)
+
+
+async def run_load_test(total_requests: int, latency: float,
+                        levels=(1, 2, 4, 8, 16)) -> dict:
+    """Run the load test at each concurrency level and return {level: req/s}."""
+    image_bytes = TEST_IMAGE.read_bytes()
+    results = {}
+
+    with StubGroqServer(latency=latency) as stub, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        # Keep load test rows out of the real history database
+        api.db = DiseaseHistoryDB(str(Path(tmp_dir) / "load_benchmark.db"))
+        # ASGITransport skips the lifespan; set up the state it would build.
+        # Every upload is the same image, so near-duplicate reuse must be off
+        # for each request to reach the model.
+        api.app.state.config = dataclasses.replace(
+            AppConfig.from_env(require_api_key=False), near_duplicate_enabled=False)
+        api.app.state.analyzer = api._analyzer_tag(api.app.state.config)
+        api.app.state.phash_index = NearDuplicateIndex()
+        api.app.state.detector = configure_detector(
+            LeafDiseaseDetector(api_key="stub", base_url=stub.url))
+        try:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url="http://testserver",
+                                         timeout=60) as client:
+                for level in levels:
+                    results[level] = await run_level(
+                        client, image_bytes, total_requests, level)
+        finally:
+            await shutdown_detector_async()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=32,
+                        help="uploads per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.25,
+                        help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    if not TEST_IMAGE.exists():
+        print(f"Error: Test image not found at {TEST_IMAGE}")
+        sys.exit(1)
+
+    results = asyncio.run(run_load_test(args.requests, args.latency))
+
+    print(f"\n{'Concurrency':>12} {'Req/s':>10} {'Speedup':>10}")
+    baseline = results[min(results)]
+    for level, throughput in results.items():
+        print(f"{level:>12} {throughput:>10.2f} {throughput / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import streamlit as st
 import requests
-import base64
 from datetime import datetime
 import json
-import sqlite3
+import html
+from data_access import (API_URL, EXPORT_URL, fetch_analysis_page, fetch_statistics, lazy_thumbnail, refresh,
+                         search_analyses, show_report_status, start_report)
 
 # Set Streamlit theme to light and wide mode
 st.set_page_config(
@@ -178,12 +179,11 @@ def analyze_single_image(uploaded_file):
             files = {
                 "file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
             
-            # Use local API for development
-            response = requests.post(
-                "http://localhost:8000/disease-detection-file", files=files)
+            response = requests.post(f"{API_URL}/disease-detection-file", files=files)
             
             if response.status_code == 200:
                 result = response.json()
+                refresh()  # Show the new analysis in the history below
                 display_analysis_result(result)
             else:
                 st.error(f"API Error: {response.status_code}")
@@ -192,7 +192,7 @@ def analyze_single_image(uploaded_file):
             st.error(f"Error: {str(e)}")
 
 def analyze_batch_images(uploaded_files):
-    """Analyze multiple uploaded images in batch"""
+    """Analyze multiple uploaded images, rendering each result as soon as it is ready"""
     st.markdown("<div class='result-card'>", unsafe_allow_html=True)
     st.markdown("<div class='disease-title'>📊 Batch Analysis Results</div>", unsafe_allow_html=True)
     
@@ -200,45 +200,65 @@ def analyze_batch_images(uploaded_files):
     tab_list = [f"Image {i+1}" for i in range(len(uploaded_files))]
     tabs = st.tabs(tab_list)
     
-    batch_results = []
-    
-    for i, (tab, uploaded_file) in enumerate(zip(tabs, uploaded_files)):
+    placeholders = []
+    for tab, uploaded_file in zip(tabs, uploaded_files):
         with tab:
             st.markdown(f"**File:** {uploaded_file.name}")
+            placeholder = st.empty()
+            placeholder.info("⏳ Waiting for analysis...")
+            placeholders.append(placeholder)
+    
+    progress = st.progress(0.0, text="🔬 Analyzing images with AI...")
+    summary = {}
+    completed = 0
+    
+    try:
+        files = [
+            ("files", (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type))
+            for uploaded_file in uploaded_files]
+        
+        # Results arrive as NDJSON lines
+        with requests.post(f"{API_URL}/disease-detection-batch/stream",
+                           files=files, stream=True) as response:
+            if response.status_code != 200:
+                st.error(f"API Error: {response.status_code}")
+                st.write(response.text)
+                st.markdown("</div>", unsafe_allow_html=True)
+                return
             
-            try:
-                files = {
-                    "file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
                 
-                # Use local API for development
-                response = requests.post(
-                    "http://localhost:8000/disease-detection-file", files=files)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    batch_results.append({
-                        "filename": uploaded_file.name,
-                        "result": result
-                    })
-                    display_analysis_result(result)
-                else:
-                    st.error(f"API Error: {response.status_code}")
-                    st.write(response.text)
-            except Exception as e:
-                st.error(f"Error analyzing {uploaded_file.name}: {str(e)}")
+                if record.get("type") == "result":
+                    index = record["index"]
+                    with placeholders[index].container():
+                        if record.get("status") == "ok":
+                            display_analysis_result(record["result"])
+                        else:
+                            st.error(f"Error analyzing {record.get('filename')}: {record.get('error')}")
+                    completed += 1
+                    progress.progress(completed / len(uploaded_files),
+                                      text=f"🔬 Analyzed {completed} of {len(uploaded_files)} images")
+                elif record.get("type") == "summary":
+                    summary = record.get("summary", {})
+                elif record.get("type") == "error":
+                    st.error(f"Batch analysis failed: {record.get('error')}")
+    except Exception as e:
+        st.error(f"Error analyzing batch: {str(e)}")
+    
+    progress.empty()
+    refresh()  # Show the new analyses in the history below
     
     # Summary of batch results
     st.markdown("---")
     st.markdown("<div class='section-title'>Batch Summary</div>", unsafe_allow_html=True)
     
-    healthy_count = sum(1 for r in batch_results if not r['result'].get('disease_detected') and r['result'].get('disease_type') != 'invalid_image')
-    diseased_count = sum(1 for r in batch_results if r['result'].get('disease_detected'))
-    invalid_count = sum(1 for r in batch_results if r['result'].get('disease_type') == 'invalid_image')
-    
     col1, col2, col3 = st.columns(3)
-    col1.metric("Healthy Leaves", healthy_count)
-    col2.metric("Diseased Leaves", diseased_count)
-    col3.metric("Invalid Images", invalid_count)
+    col1.metric("Healthy Leaves", summary.get("healthy_count", 0))
+    col2.metric("Diseased Leaves", summary.get("diseased_count", 0))
+    col3.metric("Invalid Images", summary.get("invalid_count", 0))
     
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -326,339 +346,32 @@ def display_analysis_result(result):
         st.markdown("</div>", unsafe_allow_html=True)
 
 def export_analysis_history_csv():
-    """Export analysis history to CSV"""
-    try:
-        analyses = fetch_recent_analyses(1000)  # Export up to 1000 records
-        if analyses:
-            import base64
-            import csv
-            from io import StringIO
-            
-            # Create CSV in memory
-            csv_buffer = StringIO()
-            writer = csv.writer(csv_buffer)
-            
-            # Write header
-            writer.writerow(["ID", "Timestamp", "Disease Detected", "Disease Name", "Disease Type", 
-                           "Severity", "Confidence", "Symptoms", "Possible Causes", "Treatment", "Image Filename"])
-            
-            # Write data rows
-            for analysis in analyses:
-                writer.writerow([
-                    analysis['id'],
-                    analysis['timestamp'],
-                    analysis['disease_detected'],
-                    analysis['disease_name'],
-                    analysis['disease_type'],
-                    analysis['severity'],
-                    analysis['confidence'],
-                    '; '.join(analysis['symptoms']) if isinstance(analysis['symptoms'], list) else analysis['symptoms'],
-                    '; '.join(analysis['possible_causes']) if isinstance(analysis['possible_causes'], list) else analysis['possible_causes'],
-                    '; '.join(analysis['treatment']) if isinstance(analysis['treatment'], list) else analysis['treatment'],
-                    analysis['image_filename']
-                ])
-            
-            csv_data = csv_buffer.getvalue()
-            
-            # Create download link
-            b64 = base64.b64encode(csv_data.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="leaf_disease_analysis_history.csv">Download CSV File</a>'
-            st.sidebar.markdown(href, unsafe_allow_html=True)
-            st.sidebar.success("CSV export ready! Click the link to download.")
-        else:
-            st.sidebar.warning("No analysis history to export.")
-    except Exception as e:
-        st.sidebar.error(f"Export failed: {str(e)}")
+    """Offer the analysis history as downloads streamed by the API's /export endpoint"""
+    # The API streams the file straight to the browser, so nothing is built in memory here
+    st.sidebar.markdown(
+        f"[Download CSV]({EXPORT_URL}?format=csv) · "
+        f"[CSV (gzip)]({EXPORT_URL}?format=csv&gzip=true) · "
+        f"[NDJSON]({EXPORT_URL}?format=ndjson) · "
+        f"[Parquet]({EXPORT_URL}?format=parquet)")
+    st.sidebar.success("Export ready! Click a link to download the full history.")
 
-def export_analysis_history_pdf():
-    """Export analysis history to PDF with images"""
-    try:
-        # Try to import required libraries early to catch import errors
-        try:
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.lib import colors
-            import base64
-            from io import BytesIO
-            import requests
-            from PIL import Image as PILImage
-            import io
-        except ImportError as ie:
-            st.sidebar.error(f"PDF export failed: Missing library '{getattr(ie, 'name', str(ie))}'. Please install required libraries: pip install reportlab pillow")
-            return
-        
-        analyses = fetch_recent_analyses(50)  # Limit to 50 for better performance
-        if analyses:
-            # Create PDF buffer
-            pdf_buffer = BytesIO()
-            
-            # Create document
-            doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=26,
-                spaceAfter=30,
-                textColor=colors.darkgreen,
-                alignment=1  # Center alignment
-            )
-            story.append(Paragraph("Leaf Disease Detection Analysis Report", title_style))
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Subtitle
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Normal'],
-                fontSize=14,
-                textColor=colors.green,
-                alignment=1
-            )
-            story.append(Paragraph("Comprehensive Plant Health Analysis", subtitle_style))
-            story.append(Spacer(1, 0.4*inch))
-            
-            # Summary Section
-            story.append(Paragraph("Analysis Summary", styles['Heading2']))
-            story.append(Spacer(1, 0.2*inch))
-            
-            total = len(analyses)
-            diseased = sum(1 for a in analyses if a['disease_detected'])
-            healthy = sum(1 for a in analyses if not a['disease_detected'] and a['disease_type'] != 'invalid_image')
-            invalid = sum(1 for a in analyses if a['disease_type'] == 'invalid_image')
-            
-            # Summary table
-            summary_data = [
-                ["Total Analyses", "Diseased Leaves", "Healthy Leaves", "Invalid Images"],
-                [str(total), str(diseased), str(healthy), str(invalid)]
-            ]
-            
-            summary_table = Table(summary_data)
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ]))
-            
-            story.append(summary_table)
-            story.append(Spacer(1, 0.4*inch))
-            
-            # Detailed records with images
-            story.append(Paragraph("Detailed Analysis Records", styles['Heading2']))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Process each analysis record
-            for i, analysis in enumerate(analyses[:20]):  # Limit to first 20 for reasonable PDF size
-                # Record header
-                record_title = f"Record #{analysis['id']}: {analysis['image_filename']}"
-                story.append(Paragraph(record_title, styles['Heading3']))
-                
-                # Try to fetch and include the image
-                try:
-                    # Attempt to get the image from the API
-                    response = requests.get(f"http://localhost:8000/analysis-image/{analysis['id']}")
-                    if response.status_code == 200:
-                        # Convert to PIL Image
-                        pil_img = PILImage.open(io.BytesIO(response.content))
-                        
-                        # Resize for PDF
-                        max_width = 200
-                        max_height = 150
-                        pil_img.thumbnail((max_width, max_height))
-                        
-                        # Save to BytesIO
-                        img_buffer = io.BytesIO()
-                        pil_img.save(img_buffer, format='JPEG')
-                        img_buffer.seek(0)
-                        
-                        # Add to PDF
-                        img = Image(img_buffer, width=max_width, height=max_height)
-                        story.append(img)
-                        story.append(Spacer(1, 0.1*inch))
-                except Exception as img_error:
-                    # If image loading fails, continue without it
-                    pass
-                
-                # Analysis details table
-                status = "Diseased" if analysis['disease_detected'] else ("Healthy" if analysis['disease_type'] != 'invalid_image' else "Invalid")
-                
-                details_data = [
-                    ["Field", "Value"],
-                    ["Timestamp", analysis['timestamp'][:19]],
-                    ["Status", status],
-                    ["Disease Name", analysis['disease_name'] if analysis['disease_name'] else "N/A"],
-                    ["Disease Type", analysis['disease_type'].title() if analysis['disease_type'] else "N/A"],
-                    ["Severity", analysis['severity'].title() if analysis['severity'] else "N/A"],
-                    ["Confidence", f"{analysis['confidence']:.1f}%"],
-                    ["Symptoms", "; ".join(analysis['symptoms'][:3]) if isinstance(analysis['symptoms'], list) and analysis['symptoms'] else "None recorded"],
-                    ["Possible Causes", "; ".join(analysis['possible_causes'][:3]) if isinstance(analysis['possible_causes'], list) and analysis['possible_causes'] else "None recorded"],
-                    ["Treatment", "; ".join(analysis['treatment'][:3]) if isinstance(analysis['treatment'], list) and analysis['treatment'] else "None recorded"]
-                ]
-                
-                details_table = Table(details_data)
-                details_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (0, -1), colors.lightgrey),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ]))
-                
-                story.append(details_table)
-                story.append(Spacer(1, 0.3*inch))
-            
-            # Footer
-            story.append(Spacer(1, 0.3*inch))
-            story.append(Paragraph("Report generated by Leaf Disease Detection System", styles['Normal']))
-            
-            # Build PDF
-            doc.build(story)
-            pdf_data = pdf_buffer.getvalue()
-            
-            # Create download link
-            b64 = base64.b64encode(pdf_data).decode()
-            href = f'<a href="data:application/pdf;base64,{b64}" download="leaf_disease_analysis_report.pdf">Download PDF Report</a>'
-            st.sidebar.markdown(href, unsafe_allow_html=True)
-            st.sidebar.success("PDF report ready! Click the link to download.")
-        else:
-            st.sidebar.warning("No analysis history to export.")
-    except Exception as e:
-        st.sidebar.error(f"PDF export failed: {str(e)}")
+# Markers for search hits, swapped for <b> tags after the snippet is HTML-escaped
+SNIPPET_MARKERS = ("\x02", "\x03")
 
-# Database connection function
-def get_db_connection():
-    try:
-        conn = sqlite3.connect('disease_history.db')
-        # Ensure the table exists
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                disease_detected BOOLEAN,
-                disease_name TEXT,
-                disease_type TEXT,
-                severity TEXT,
-                confidence REAL,
-                symptoms TEXT,
-                possible_causes TEXT,
-                treatment TEXT,
-                image_filename TEXT,
-                image_data BLOB
-            )
-        ''')
-        
-        # Check if image_data column exists, add it if not
-        cursor.execute("PRAGMA table_info(analysis_history)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'image_data' not in columns:
-            try:
-                cursor.execute("ALTER TABLE analysis_history ADD COLUMN image_data BLOB")
-            except:
-                pass  # Column might already exist
-        conn.commit()
-        return conn
-    except Exception as e:
-        st.error(f"Database connection error: {str(e)}")
-        return None
+def format_snippet(snippet):
+    """Escape a search snippet for HTML and bold its highlighted matches"""
+    return html.escape(snippet).replace(SNIPPET_MARKERS[0], "<b>").replace(SNIPPET_MARKERS[1], "</b>")
 
-# Fetch statistics from database
-def fetch_statistics():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Total analyses
-        cursor.execute('SELECT COUNT(*) FROM analysis_history')
-        total = cursor.fetchone()[0]
-        
-        # Disease detections
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 1')
-        diseases = cursor.fetchone()[0]
-        
-        # Healthy plants
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_detected = 0 AND disease_type != "invalid_image"')
-        healthy = cursor.fetchone()[0]
-        
-        # Invalid images
-        cursor.execute('SELECT COUNT(*) FROM analysis_history WHERE disease_type = "invalid_image"')
-        invalid = cursor.fetchone()[0]
-        
-        # Disease types distribution
-        cursor.execute('''
-            SELECT disease_type, COUNT(*) 
-            FROM analysis_history 
-            WHERE disease_detected = 1 
-            GROUP BY disease_type 
-            ORDER BY COUNT(*) DESC
-        ''')
-        disease_types = cursor.fetchall()
-        
-        conn.close()
-        
-        return {
-            'total_analyses': total,
-            'disease_detections': diseases,
-            'healthy_plants': healthy,
-            'invalid_images': invalid,
-            'disease_distribution': dict(disease_types)
-        }
-    except Exception as e:
-        st.error(f"Error fetching statistics: {str(e)}")
-        return {}
+# The history is shown one keyset page at a time
+HISTORY_PAGE_SIZE = 10
 
-# Fetch recent analyses from database with all required fields
-def fetch_recent_analyses(limit=10):
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-            
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, timestamp, disease_detected, disease_name, disease_type, severity, 
-                   confidence, symptoms, possible_causes, treatment, image_filename
-            FROM analysis_history 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        
-        analyses = []
-        for row in rows:
-            analysis = dict(zip(columns, row))
-            # Convert JSON strings back to lists
-            analysis['symptoms'] = json.loads(analysis['symptoms']) if analysis['symptoms'] else []
-            analysis['possible_causes'] = json.loads(analysis['possible_causes']) if analysis['possible_causes'] else []
-            analysis['treatment'] = json.loads(analysis['treatment']) if analysis['treatment'] else []
-            analyses.append(analysis)
-        
-        conn.close()
-        return analyses
-    except Exception as e:
-        st.error(f"Error fetching analysis history: {str(e)}")
-        return []
+def show_older_page(next_key):
+    """Move the history view to the page starting after `next_key`"""
+    st.session_state.history_page_keys.append(next_key)
+
+def show_newer_page():
+    """Move the history view back one page"""
+    st.session_state.history_page_keys.pop()
 
 # Sidebar with additional information
 with st.sidebar:
@@ -763,7 +476,8 @@ with st.sidebar:
         export_analysis_history_csv()
     
     if st.button("Export Analysis History (PDF)"):
-        export_analysis_history_pdf()
+        start_report(50, container=st.sidebar)
+    show_report_status(container=st.sidebar)
 
 try:
     # Display metrics
@@ -821,7 +535,15 @@ try:
     st.divider()
     st.markdown("<h3 style='color: #1b5e20; margin: 1rem 0;'>Recent Analyses</h3>", unsafe_allow_html=True)
 
-    recent_analyses = fetch_recent_analyses()
+    search_query = st.text_input("🔍 Search symptoms, causes and treatments",
+                                 placeholder='e.g. yellow halo, "copper fungicide"')
+    # Start keys of the history pages visited so far; the last one is on screen
+    page_keys = st.session_state.setdefault("history_page_keys", [None])
+    next_key = None
+    if search_query.strip():
+        recent_analyses = search_analyses(search_query, highlight=SNIPPET_MARKERS)
+    else:
+        recent_analyses, next_key = fetch_analysis_page(HISTORY_PAGE_SIZE, page_keys[-1])
 
     if recent_analyses:
         # Display each analysis as a concise card
@@ -885,6 +607,7 @@ try:
                 <div style="margin-top: 0.6rem; font-size: 0.85rem; color: #616161; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;">
                     📄 {item.get('image_filename', 'N/A')}
                 </div>
+                {f"<div style='margin-top: 0.4rem; font-size: 0.85rem; color: #424242;'>🔎 {format_snippet(item['snippet'])}</div>" if item.get('snippet') else ""}
             </div>
         """, unsafe_allow_html=True)
         
@@ -894,15 +617,8 @@ try:
                 col1, col2 = st.columns([2, 3])
                 
                 with col1:
-                    # Try to fetch and display the full image
-                    try:
-                        response = requests.get(f"http://localhost:8000/analysis-image/{item['id']}")
-                        if response.status_code == 200:
-                            st.image(response.content, caption=item.get('image_filename', 'Analysis Image'), use_column_width=True)
-                        else:
-                            st.warning("Image not available for this analysis")
-                    except Exception as e:
-                        st.warning("Unable to load image")
+                    # Fetched by the browser only when this expander is opened
+                    lazy_thumbnail(item['id'], item.get('image_filename', 'Analysis Image'))
                 
                 with col2:
                     # Display detailed analysis information
@@ -945,9 +661,17 @@ try:
                         st.markdown("**Treatment Recommendations:**")
                         for treat in item['treatment']:
                             st.markdown(f"- {treat}")
-    else:
+    elif search_query.strip():
+        st.info("No analyses match your search.")
+    elif len(page_keys) == 1:
         st.info("No analysis history available yet. Perform some analyses to see data here.")
     
+    if not search_query.strip() and (next_key is not None or len(page_keys) > 1):
+        nav_newer, nav_page, nav_older = st.columns([1, 2, 1])
+        nav_newer.button("← Newer", on_click=show_newer_page, disabled=len(page_keys) == 1)
+        nav_page.markdown(f"<div style='text-align: center;'>Page {len(page_keys)}</div>", unsafe_allow_html=True)
+        nav_older.button("Older →", on_click=show_older_page, args=(next_key,), disabled=next_key is None)
+    
 except Exception as e:
     st.error(f"Error loading analytics dashboard: {str(e)}")
     st.info("The analytics dashboard is temporarily unavailable. Please try again later.")
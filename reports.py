@@ -0,0 +1,358 @@
+"""
+Background PDF report generation.
+
+Report jobs are submitted through the API (POST /reports) and built on a
+small worker pool instead of inside a Streamlit script run. A job reads the
+selected history in keyset batches, loads the stored JPEG thumbnails straight
+from the image store on a thread pool (generating missing ones in parallel),
+and writes the document to a file in the report directory. Clients poll the
+job for progress and download the finished file by URL.
+
+Job state lives in the history database and the files in the report
+directory, so any API worker process sharing both can answer for any job.
+
+Thumbnails are embedded as the JPEG bytes the store already holds, so no
+image is decoded or re-encoded while the PDF is laid out.
+"""
+
+import html
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from exporter import iter_analysis_batches
+
+logger = logging.getLogger(__name__)
+
+REPORT_THUMBNAIL_SIZE = 256
+# Largest image box on the page, in points
+IMAGE_BOX = (200, 150)
+# Seconds between saves of the progress of running jobs
+SYNC_INTERVAL = 1.0
+# Unfinished jobs not saved for this long belong to a process that died
+STALE_JOB_SECONDS = 60
+ABANDONED_ERROR = "The API process building this report stopped"
+
+
+@dataclass
+class ReportJob:
+    """State of one report job, as returned by GET /reports/{id}."""
+
+    id: str
+    limit: int
+    filters: Dict
+    status: str = "queued"  # queued, loading_images, rendering, done or failed
+    total: int = 0
+    completed: int = 0
+    error: Optional[str] = None
+    path: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_record(self) -> Dict:
+        """Fields as stored by DiseaseHistoryDB.save_report_jobs."""
+        return asdict(self)
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "ReportJob":
+        job = cls(**{f.name: record[f.name] for f in fields(cls)})
+        if not job.finished and record['updated_at'] < time.time() - STALE_JOB_SECONDS:
+            job.status, job.error = "failed", ABANDONED_ERROR
+        return job
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "progress": round(self.completed / self.total, 3) if self.total else 0.0,
+            "error": self.error,
+            "limit": self.limit,
+            "filters": {key: value for key, value in self.filters.items() if value is not None},
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "finished_at": (datetime.fromtimestamp(self.finished_at).isoformat()
+                            if self.finished_at else None)
+        }
+
+
+class ReportManager:
+    """
+    Runs report jobs on a worker pool and keeps their state.
+
+    `workers` jobs are built at a time; each loads its thumbnails through a
+    shared pool of `image_workers` threads. Jobs are recorded in the history
+    database's report_jobs table and written to `report_dir`, so several API
+    worker processes can share both: any of them answers get() for any job.
+    Jobs running in this process are saved every SYNC_INTERVAL seconds and
+    when they finish; one whose process dies stops being saved and reads as
+    failed after STALE_JOB_SECONDS. Up to `max_jobs` finished jobs are
+    remembered; older ones are forgotten and their files deleted.
+    """
+
+    def __init__(self, history_db, report_dir: str = "reports", workers: int = 2,
+                 image_workers: int = 4, max_jobs: int = 100):
+        self.history_db = history_db
+        self.report_dir = report_dir
+        self.max_jobs = max_jobs
+        # Unfinished jobs of this process, saved by the sync thread
+        self._jobs: Dict[str, ReportJob] = {}
+        self._lock = threading.Lock()
+        # Keeps a progress save from overwriting the final state of a job
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._image_executor = ThreadPoolExecutor(max_workers=image_workers,
+                                                  thread_name_prefix="report-image")
+        os.makedirs(report_dir, exist_ok=True)
+        self._prune()
+        self._remove_orphaned_files()
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="report-sync",
+                                             daemon=True)
+        self._sync_thread.start()
+
+    def submit(self, limit: int = 50, **filters) -> ReportJob:
+        """Queue a report of the newest `limit` analyses matching the history filters."""
+        job = ReportJob(id=uuid.uuid4().hex, limit=limit, filters=filters)
+        self.history_db.save_report_jobs([job.to_record()])
+        with self._lock:
+            self._jobs[job.id] = job
+        self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        record = self.history_db.get_report_job(job_id)
+        return ReportJob.from_record(record) if record else None
+
+    def shutdown(self):
+        """Cancel queued jobs and wait for running ones (call at shutdown)."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._image_executor.shutdown(wait=True)
+        self._stop.set()
+        self._sync_thread.join()
+        with self._lock:
+            cancelled, self._jobs = list(self._jobs.values()), {}
+        for job in cancelled:
+            job.status, job.error = "failed", "The API shut down before the report was built"
+            job.finished_at = time.time()
+        if cancelled:
+            self.history_db.save_report_jobs([job.to_record() for job in cancelled])
+
+    def _sync_loop(self):
+        """Save the progress of this process's unfinished jobs until shutdown."""
+        while not self._stop.wait(SYNC_INTERVAL):
+            with self._save_lock:
+                with self._lock:
+                    records = [job.to_record() for job in self._jobs.values()]
+                if not records:
+                    continue
+                try:
+                    self.history_db.save_report_jobs(records)
+                except Exception as e:
+                    logger.warning(f"Saving report progress failed: {str(e)}")
+
+    def _finish(self, job: ReportJob):
+        """Save the final state of a job and stop tracking it here."""
+        job.finished_at = time.time()
+        with self._save_lock:
+            try:
+                self.history_db.save_report_jobs([job.to_record()])
+            except Exception as e:
+                logger.error(f"Report {job.id}: saving the final state failed: {str(e)}")
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def _prune(self):
+        """Fail abandoned jobs and delete finished jobs beyond max_jobs with their files."""
+        for path in self.history_db.prune_report_jobs(
+                self.max_jobs, time.time() - STALE_JOB_SECONDS, ABANDONED_ERROR):
+            _remove_file(path)
+
+    def _remove_orphaned_files(self):
+        """Delete report files no job refers to, e.g. left behind by a crash."""
+        names = [name for name in os.listdir(self.report_dir)
+                 if name.startswith("report-") and name.endswith((".pdf", ".pdf.part"))]
+        # Read after listing: a job is recorded before its file is created, so
+        # files of jobs other workers start meanwhile are never taken for orphans
+        known = self.history_db.get_report_job_ids()
+        for name in names:
+            if name[len("report-"):].split(".", 1)[0] not in known:
+                _remove_file(os.path.join(self.report_dir, name))
+
+    def _load_thumbnail(self, job: ReportJob, analysis: Dict) -> Optional[bytes]:
+        try:
+            thumbnail = self.history_db.get_analysis_thumbnail(analysis['id'], REPORT_THUMBNAIL_SIZE)
+            return thumbnail[1] if thumbnail else None
+        except Exception as e:
+            # A missing or corrupt image only drops that picture from the report
+            logger.warning(f"Report {job.id}: no thumbnail for analysis {analysis['id']}: {str(e)}")
+            return None
+        finally:
+            with self._lock:
+                job.completed += 1
+
+    def _run(self, job: ReportJob):
+        path = os.path.join(self.report_dir, f"report-{job.id}.pdf")
+        try:
+            analyses = []
+            for batch in iter_analysis_batches(self.history_db, min(job.limit, 1000), **job.filters):
+                analyses.extend(batch[:job.limit - len(analyses)])
+                if len(analyses) >= job.limit:
+                    break
+            job.total = len(analyses)
+            job.status = "loading_images"
+            thumbnails = list(self._image_executor.map(
+                lambda analysis: self._load_thumbnail(job, analysis), analyses))
+
+            job.status = "rendering"
+            write_report(path + ".part", analyses, thumbnails, job.filters)
+            os.replace(path + ".part", path)
+            job.path = path
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Report {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+            _remove_file(path + ".part")
+        finally:
+            self._finish(job)
+
+
+def _remove_file(path: str):
+    """Delete a report file that may already be gone (another worker pruned it)."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _fit(data: bytes) -> tuple:
+    """Size of a thumbnail scaled to fit IMAGE_BOX, keeping its aspect ratio."""
+    from PIL import Image as PILImage
+
+    # Only the header is parsed; the JPEG is never decoded here
+    width, height = PILImage.open(io.BytesIO(data)).size
+    scale = min(IMAGE_BOX[0] / width, IMAGE_BOX[1] / height)
+    return width * scale, height * scale
+
+
+def _join(values) -> str:
+    return "; ".join(values[:3]) if isinstance(values, list) and values else "None recorded"
+
+
+def write_report(path: str, analyses: List[Dict], thumbnails: List[Optional[bytes]],
+                 filters: Dict = None):
+    """Lay out the report for `analyses` (with matching JPEG thumbnails) into `path`."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    doc = SimpleDocTemplate(path, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
+    styles = getSampleStyleSheet()
+    story = []
+
+    title_style = ParagraphStyle('ReportTitle', parent=styles['Heading1'], fontSize=26,
+                                 spaceAfter=30, textColor=colors.darkgreen, alignment=1)
+    story.append(Paragraph("Leaf Disease Detection Analysis Report", title_style))
+    story.append(Spacer(1, 0.3*inch))
+    subtitle_style = ParagraphStyle('ReportSubtitle', parent=styles['Normal'], fontSize=14,
+                                    textColor=colors.green, alignment=1)
+    story.append(Paragraph("Comprehensive Plant Health Analysis", subtitle_style))
+    story.append(Spacer(1, 0.4*inch))
+    story.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    applied = {key: value for key, value in (filters or {}).items() if value is not None}
+    if applied:
+        story.append(Paragraph("Filters: " + html.escape(", ".join(f"{key}={value}" for key, value in applied.items())),
+                               styles['Normal']))
+    story.append(Spacer(1, 0.3*inch))
+
+    # Summary of the records in the report
+    story.append(Paragraph("Analysis Summary", styles['Heading2']))
+    story.append(Spacer(1, 0.2*inch))
+    diseased = sum(1 for a in analyses if a['disease_detected'])
+    healthy = sum(1 for a in analyses if not a['disease_detected'] and a['disease_type'] != 'invalid_image')
+    invalid = sum(1 for a in analyses if a['disease_type'] == 'invalid_image')
+    summary_table = Table([
+        ["Total Analyses", "Diseased Leaves", "Healthy Leaves", "Invalid Images"],
+        [str(len(analyses)), str(diseased), str(healthy), str(invalid)]
+    ])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 0.4*inch))
+
+    story.append(Paragraph("Detailed Analysis Records", styles['Heading2']))
+    story.append(Spacer(1, 0.2*inch))
+    details_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (0, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+    cell_style = ParagraphStyle('ReportCell', parent=styles['Normal'], fontSize=9, leading=11)
+
+    for analysis, thumbnail in zip(analyses, thumbnails):
+        story.append(Paragraph(html.escape(f"Record #{analysis['id']}: {analysis['image_filename']}"),
+                               styles['Heading3']))
+        if thumbnail:
+            width, height = _fit(thumbnail)
+            story.append(Image(io.BytesIO(thumbnail), width=width, height=height))
+            story.append(Spacer(1, 0.1*inch))
+
+        status = "Diseased" if analysis['disease_detected'] else ("Healthy" if analysis['disease_type'] != 'invalid_image' else "Invalid")
+        rows = [
+            ("Timestamp", analysis['timestamp'][:19]),
+            ("Status", status),
+            ("Disease Name", analysis['disease_name'] or "N/A"),
+            ("Disease Type", analysis['disease_type'].title() if analysis['disease_type'] else "N/A"),
+            ("Severity", analysis['severity'].title() if analysis['severity'] else "N/A"),
+            ("Confidence", f"{analysis['confidence'] or 0:.1f}%"),
+            ("Symptoms", _join(analysis['symptoms'])),
+            ("Possible Causes", _join(analysis['possible_causes'])),
+            ("Treatment", _join(analysis['treatment']))
+        ]
+        details_table = Table([["Field", "Value"]] +
+                              [[name, Paragraph(html.escape(str(value)), cell_style)] for name, value in rows],
+                              colWidths=[1.3*inch, 5.5*inch])
+        details_table.setStyle(details_style)
+        story.append(details_table)
+        story.append(Spacer(1, 0.3*inch))
+
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph("Report generated by Leaf Disease Detection System", styles['Normal']))
+    doc.build(story)
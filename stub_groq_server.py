@@ -0,0 +1,163 @@
+"""
+Local Stub of the Groq Chat Completions Endpoint
+================================================
+
+Serves canned OpenAI-compatible chat completion responses so the API can be
+load tested and fault-injected (errors and latency) without a Groq API key or
+network access. Recorded completions (content, usage and latency) can be
+replayed in order to benchmark against real model answers.
+
+Usage:
+    >>> with StubGroqServer(latency=0.2) as stub:
+    ...     detector = LeafDiseaseDetector(api_key="stub", base_url=stub.url)
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANALYSIS = {
+    "disease_detected": True,
+    "disease_name": "Brown Spot",
+    "disease_type": "fungal",
+    "severity": "moderate",
+    "confidence": 87,
+    "symptoms": ["Brown circular lesions with yellow halo"],
+    "possible_causes": ["Fungal infection favoured by humid conditions"],
+    "treatment": ["Apply a copper-based fungicide"]
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler answering chat completion calls for StubGroqServer."""
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        with stub.lock:
+            stub.request_count += 1
+            status = stub.failures.pop(0) if stub.failures else 200
+            recorded = stub.recorded.pop(0) if stub.recorded and status == 200 else None
+            latency = stub.delays.pop(0) if stub.delays else stub.latency
+        content = json.dumps(stub.analysis)
+        usage = {"prompt_tokens": 1200, "completion_tokens": 120, "total_tokens": 1320}
+        if recorded is not None:
+            content = recorded["content"]
+            usage = recorded["usage"]
+            latency = recorded.get("latency", latency) * stub.latency_scale
+
+        if latency:
+            time.sleep(latency)
+
+        if status != 200:
+            body = json.dumps({"error": {"message": "injected failure",
+                                         "type": "stub_error"}}).encode()
+        else:
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", str(stub.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    """Threading server with a listen backlog large enough for load tests."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StubGroqServer:
+    """
+    Threaded HTTP server imitating the Groq chat completions API.
+
+    Attributes:
+        latency (float): Seconds to wait before answering each request
+        failures (list): HTTP status codes to return for the next requests
+        delays (list): Latencies overriding `latency` for the next requests
+        retry_after (float): Retry-After header value sent with 429 responses
+        recorded (list): Recorded completions to answer the next requests with
+        latency_scale (float): Factor applied to the latency of recorded completions
+        request_count (int): Number of completion requests received
+        url (str): Base URL to pass to the Groq client
+    """
+
+    def __init__(self, latency: float = 0.0, analysis: dict = None):
+        self.latency = latency
+        self.analysis = analysis or STUB_ANALYSIS
+        self.failures = []
+        self.delays = []
+        self.retry_after = 0
+        self.recorded = []
+        self.latency_scale = 1.0
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self._server = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def fail_next(self, count: int, status: int = 500) -> None:
+        """Answer the next `count` requests with the given HTTP status."""
+        with self.lock:
+            self.failures.extend([status] * count)
+
+    def slow_next(self, count: int, latency: float) -> None:
+        """Delay the next `count` requests by `latency` seconds."""
+        with self.lock:
+            self.delays.extend([latency] * count)
+
+    def replay(self, records: list, latency_scale: float = 1.0) -> None:
+        """
+        Answer the next requests with recorded completions, in order.
+
+        Each record is a dict with the completion "content", its "usage"
+        ({"prompt_tokens", "completion_tokens", "total_tokens"}) and the
+        "latency" in seconds it took to arrive, scaled by `latency_scale`.
+        """
+        with self.lock:
+            self.recorded.extend(records)
+            self.latency_scale = latency_scale
+
+    def __enter__(self) -> "StubGroqServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    with StubGroqServer(latency=0.5) as stub:
+        print(f"Stub Groq server listening on {stub.url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,55 @@
+"""Tests for the request helpers in app.py: history cursors, Range and If-None-Match."""
+
+import pytest
+from fastapi import HTTPException
+
+from app import _decode_cursor, _encode_cursor, _etag_matches, _parse_range
+
+
+def test_cursor_round_trip():
+    key = ("2026-10-17T09:30:00.123456+05:30", 4242)
+    token = _encode_cursor(key)
+    assert "=" not in token
+    assert _decode_cursor(token) == key
+
+
+@pytest.mark.parametrize("token", ["not-base64!", "bnVsbA", "WzEsIDJd", "WyJhIl0"])
+def test_tampered_cursor_is_rejected(token):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(token)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-50", (950, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("Bytes = 0-0", (0, 0)),
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+    ("bytes=abc-def", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as error:
+        _parse_range(header, 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */1000"
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('"other", "abc"', True),
+    ('W/"abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_etag_matches(header, matches):
+    assert _etag_matches(header, '"abc"') is matches
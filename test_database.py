@@ -0,0 +1,95 @@
+"""Tests for the statistics rollups, date windows and connections of database.py."""
+
+import sqlite3
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from database import (DiseaseHistoryDB, query_analysis_page, query_analysis_stats,
+                      query_daily_trend)
+
+
+def analysis(timestamp, disease_type="fungal", severity="moderate", detected=True):
+    return {
+        'disease_detected': detected, 'disease_name': "Leaf Spot" if detected else None,
+        'disease_type': disease_type, 'severity': severity, 'confidence': 80.0,
+        'symptoms': ["spots"], 'possible_causes': ["humidity"], 'treatment': ["fungicide"],
+        'analysis_timestamp': timestamp
+    }
+
+
+@pytest.fixture
+def history(tmp_path):
+    history_db = DiseaseHistoryDB(str(tmp_path / "history.db"))
+    yield history_db
+    history_db.close()
+
+
+def rollup_rows(history_db):
+    cursor = history_db.get_connection().cursor()
+    return {table: sorted(cursor.execute(f"SELECT * FROM {table} WHERE count > 0").fetchall(),
+                          key=repr)
+            for table in DiseaseHistoryDB.STATS_ROLLUPS}
+
+
+def test_rollups_follow_inserts_updates_and_deletes(history):
+    today = datetime.now(timezone.utc)
+    yesterday = (today - timedelta(days=1)).isoformat()
+    ids = [
+        history.save_analysis(analysis(today.isoformat()), "a.jpg"),
+        history.save_analysis(analysis(today.isoformat(), "bacterial", "severe"), "b.jpg"),
+        history.save_analysis(analysis(yesterday, "healthy", "none", False), "c.jpg"),
+        history.save_analysis(analysis(yesterday, "invalid_image", "none", False), "d.jpg"),
+    ]
+    stats = history.get_analysis_stats()
+    assert stats['total_analyses'] == 4
+    assert stats['disease_detections'] == 2
+    assert stats['healthy_plants'] == 1
+    assert stats['invalid_images'] == 1
+    assert stats['disease_distribution'] == {'fungal': 1, 'bacterial': 1}
+    assert sum(count for _, count in history.get_daily_trend(None)) == 4
+
+    conn = history.get_connection()
+    with conn:
+        conn.execute("DELETE FROM analysis_history WHERE id = ?", (ids[1],))
+        conn.execute("UPDATE analysis_history SET severity = 'mild' WHERE id = ?", (ids[0],))
+    stats = history.get_analysis_stats()
+    assert stats['total_analyses'] == 3
+    assert stats['disease_distribution'] == {'fungal': 1}
+    assert stats['severity_distribution'] == {'none': 2, 'mild': 1}
+
+    # The trigger-maintained rollups match a full recount
+    maintained = rollup_rows(history)
+    history.rebuild_stats()
+    assert rollup_rows(history) == maintained
+
+
+def test_windowed_stats_and_history_use_the_same_days(history):
+    now = datetime.now(timezone.utc)
+    # 23:30 UTC yesterday, stored as 05:00 today at +05:30
+    before_midnight = datetime.combine(now.date(), time(), timezone.utc) - timedelta(minutes=30)
+    stored = before_midnight.astimezone(timezone(timedelta(hours=5, minutes=30)))
+    history.save_analysis(analysis(stored.isoformat()), "late.jpg")
+    history.save_analysis(analysis((now - timedelta(days=3)).isoformat()), "old.jpg")
+
+    cursor = history.get_connection().cursor()
+    for days in (0, 1, 2, 5):
+        date_from = (now.date() - timedelta(days=days)).isoformat()
+        page, _ = query_analysis_page(cursor, 50, date_from=date_from)
+        stats = query_analysis_stats(cursor, days)
+        trend = query_daily_trend(cursor, days)
+        assert len(page) == stats['total_analyses'] == sum(count for _, count in trend)
+
+
+def test_readonly_connection_sees_commits_of_this_thread(history):
+    reader = history.connect_readonly()
+    try:
+        version = reader.execute("PRAGMA data_version").fetchone()[0]
+        history.save_analysis(analysis(datetime.now(timezone.utc).isoformat()), "leaf.jpg")
+
+        assert reader.execute("PRAGMA data_version").fetchone()[0] != version
+        assert len(query_analysis_page(reader.cursor(), 10)[0]) == 1
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("DELETE FROM analysis_history")
+    finally:
+        reader.close()
@@ -0,0 +1,70 @@
+"""Tests for the BK-tree and near-duplicate index in perceptual_hash.py."""
+
+import random
+
+from perceptual_hash import BKTree, NearDuplicateIndex, hamming_distance
+
+
+def test_bktree_search_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    # Near copies of some hashes, a few bits flipped
+    hashes += [value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value in hashes[:50]]
+    tree = BKTree()
+    for item, value in enumerate(hashes):
+        tree.add(value, item)
+    assert len(tree) == len(hashes)
+
+    for query in hashes[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        for radius in (0, 2, 4, 10):
+            expected = sorted((hamming_distance(query, value), item)
+                              for item, value in enumerate(hashes)
+                              if hamming_distance(query, value) <= radius)
+            found = tree.search(query, radius)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(d for d, _ in found)
+
+
+def test_bktree_keeps_duplicate_hashes():
+    tree = BKTree()
+    tree.add(0b1010, "first")
+    tree.add(0b1010, "second")
+    assert sorted(tree.search(0b1010, 0)) == [(0, "first"), (0, "second")]
+    assert BKTree().search(0b1010, 64) == []
+
+
+def test_near_duplicate_index_prefers_nearest_then_newest():
+    index = NearDuplicateIndex()
+    index.add(0b0000, 1)
+    index.add(0b0011, 2)  # distance 2 from the query below
+    index.add(0b0001, 3)  # distance 1
+    index.add(0b0001, 4)  # distance 1, newer
+
+    assert index.find(0b0000 ^ 0b1000, 0) is None
+    assert index.find(0b0000, 0) == (1, 0)
+    assert index.find(0b1001, 1) == (4, 1)
+    assert index.stats() == {'indexed_images': 4, 'lookups': 3, 'near_duplicate_hits': 2}
+
+
+def test_bktree_remove_keeps_children_reachable():
+    tree = BKTree()
+    tree.add(0b0000, "root")
+    tree.add(0b0001, "child")
+    tree.add(0b0011, "grandchild")
+
+    assert tree.remove(0b0000, "root")
+    assert not tree.remove(0b0000, "root")
+    assert not tree.remove(0b0111, "grandchild")
+    assert len(tree) == 2
+    assert sorted(tree.search(0b0000, 2)) == [(1, "child"), (2, "grandchild")]
+
+
+def test_near_duplicate_index_remove_by_id():
+    index = NearDuplicateIndex()
+    index.add(0b0001, 1)
+    index.add(0b0001, 2)
+
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert index.find(0b0001, 0) == (1, 0)
+    assert len(index) == 1
@@ -0,0 +1,85 @@
+"""Tests for parse_analysis and its local repair in response_parser.py."""
+
+import pytest
+
+from response_parser import ParseStats, ResponseParseError, parse_analysis
+
+ANALYSIS = ('{"disease_detected": true, "disease_name": "Leaf Spot", "disease_type": "fungal", '
+            '"severity": "moderate", "confidence": 85, "symptoms": ["brown spots"], '
+            '"possible_causes": ["humidity"], "treatment": ["copper fungicide"]}')
+
+
+def parse(text):
+    stats = ParseStats()
+    fields = parse_analysis(text, stats)
+    return fields, {name: count for name, count in stats.stats().items()
+                    if count and name != 'json_backend'}
+
+
+def test_direct_json():
+    fields, counts = parse(ANALYSIS)
+    assert fields == {
+        'disease_detected': True, 'disease_name': 'Leaf Spot', 'disease_type': 'fungal',
+        'severity': 'moderate', 'confidence': 85.0, 'symptoms': ['brown spots'],
+        'possible_causes': ['humidity'], 'treatment': ['copper fungicide']
+    }
+    assert counts == {'direct': 1}
+
+
+def test_object_extracted_from_prose_and_fences():
+    fields, counts = parse(f"Here is the analysis:\n```json\n{ANALYSIS}\n```\nHope this helps.")
+    assert fields['disease_name'] == 'Leaf Spot'
+    assert counts == {'extracted': 1}
+
+
+def test_nested_object_without_analysis_keys_is_skipped():
+    text = f'Image metadata {{"width": 640, "height": 480}} analysis {ANALYSIS}'
+    fields, counts = parse(text)
+    assert fields['disease_type'] == 'fungal'
+    assert counts == {'extracted': 1}
+
+
+@pytest.mark.parametrize("text", [
+    ANALYSIS.replace('"brown spots"]', '"brown spots",]').replace('"]}', '"],}'),
+    ANALYSIS.replace('true', 'True'),
+    ANALYSIS[:ANALYSIS.index('"treatment"') + len('"treatment": ["copper fung')],
+    '{"details": {"a": 1}} then ' + ANALYSIS[:-5],
+], ids=["trailing commas", "python literals", "truncated", "truncated after other object"])
+def test_local_repair(text):
+    fields, counts = parse(text)
+    assert fields['disease_detected'] is True
+    assert fields['disease_type'] == 'fungal'
+    assert counts == {'repaired': 1}
+
+
+def test_truncated_list_keeps_the_partial_item():
+    fields, _ = parse(ANALYSIS[:ANALYSIS.index('"treatment"') + len('"treatment": ["copper fung')])
+    assert fields['treatment'] == ['copper fung']
+
+
+def test_fields_are_coerced():
+    fields, counts = parse('{"disease_detected": "yes", "disease_type": "Fungus", '
+                           '"severity": "High", "confidence": "140%", "symptoms": "wilting"}')
+    assert fields['disease_detected'] is True
+    assert fields['disease_type'] == 'fungal'
+    assert fields['severity'] == 'severe'
+    assert fields['confidence'] == 100.0
+    assert fields['symptoms'] == ['wilting']
+    assert counts['corrected_fields'] == 5
+
+
+def test_unknown_type_and_healthy_never_diseased():
+    fields, _ = parse('{"disease_detected": true, "disease_type": "martian blight"}')
+    assert fields['disease_type'] == 'unknown'
+    assert fields['severity'] == 'unknown'
+    fields, _ = parse('{"disease_detected": true, "disease_type": "healthy"}')
+    assert fields['disease_detected'] is False
+    assert fields['severity'] == 'none'
+
+
+@pytest.mark.parametrize("text", ["", "I cannot analyze this image.", '{"width": 640}', "[1, 2]"])
+def test_unparseable(text):
+    stats = ParseStats()
+    with pytest.raises(ResponseParseError):
+        parse_analysis(text, stats)
+    assert stats.stats()['unparseable'] == 1
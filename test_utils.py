@@ -0,0 +1,55 @@
+"""Tests for the shared detector lifecycle in utils.py."""
+
+import asyncio
+import dataclasses
+
+import pytest
+
+import utils
+from config import AppConfig
+from utils import LeafDiseaseDetector, configure_detector, shutdown_detector_async
+
+
+@pytest.fixture(autouse=True)
+def isolated_detector(monkeypatch):
+    monkeypatch.setattr(utils, "_detector", None)
+    monkeypatch.setattr(utils, "_config", None)
+
+
+def make_detector(closed):
+    detector = LeafDiseaseDetector(api_key="test")
+
+    async def aclose():
+        closed.append(detector)
+
+    detector.aclose = aclose
+    return detector
+
+
+def test_replaced_detector_closes_after_in_flight_analyses():
+    closed = []
+    first, second = make_detector(closed), make_detector(closed)
+
+    async def scenario():
+        configure_detector(first)
+        with utils._use_detector() as detector:
+            assert detector is first
+            configure_detector(second)
+            await asyncio.sleep(0)
+            assert closed == []
+        await asyncio.sleep(0)
+        assert closed == [first]
+        await shutdown_detector_async()
+        assert closed == [first, second]
+
+    asyncio.run(scenario())
+
+
+def test_config_is_kept_when_detector_build_fails(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    config = dataclasses.replace(AppConfig.from_env(require_api_key=False),
+                                 groq_api_key=None)
+
+    with pytest.raises(ValueError):
+        configure_detector(config=config)
+    assert utils.get_config() is config
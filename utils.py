@@ -7,31 +7,282 @@ This script demonstrates how to send base64 image data directly to the detector.
 
 import json
 import sys,os
+import asyncio
 import base64
+import logging
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
 
 # Add the Leaf Disease directory to Python path
 sys.path.insert(0, str(Path(__file__).parent / "Leaf Disease"))
 
 try:
     from main import LeafDiseaseDetector
+    from config import AppConfig
+    from result_cache import ResultCache
+    from image_preprocessing import normalize_image
+    from rate_limiter import PRIORITY_INTERACTIVE, SchedulerQueueFullError
+    from resilience import CircuitOpenError
+    from response_parser import ResponseParseError
+    from groq import RateLimitError
 except ImportError as e:
     print(f'{{"error": "Could not import LeafDiseaseDetector: {str(e)}"}}')
     sys.exit(1)
 
+# Errors the API maps to specific status codes instead of a generic failure
+UPSTREAM_ERRORS = (CircuitOpenError, ResponseParseError, RateLimitError,
+                   SchedulerQueueFullError)
+
+
+# Process-wide detector shared by every request (see get_detector)
+_detector: Optional[LeafDiseaseDetector] = None
+_detector_lock = threading.Lock()
+# Configuration the shared detector was built from
+_config: Optional[AppConfig] = None
+# Analyses running on each detector, and replaced detectors waiting for them
+_in_flight: Dict[LeafDiseaseDetector, int] = {}
+_retired: set = set()
+# Pending aclose() tasks, referenced until they finish
+_closing: set = set()
+
+logger = logging.getLogger(__name__)
+
+
+def get_config() -> AppConfig:
+    """
+    Return the active application configuration.
 
-def test_with_base64_data(base64_image_string: str):
+    Returns:
+        AppConfig: Configuration of the shared detector, or settings read from
+                   the environment once if no detector has been built yet.
+    """
+    global _config
+    if _config is None:
+        load_dotenv()
+        config = AppConfig.from_env(require_api_key=False)
+        with _detector_lock:
+            if _config is None:
+                _config = config
+    return _config
+
+
+def build_detector(config: AppConfig) -> LeafDiseaseDetector:
+    """
+    Build a detector and its result cache from configuration.
+
+    Args:
+        config (AppConfig): Application configuration
+
+    Returns:
+        LeafDiseaseDetector: Configured detector
+    """
+    cache = None
+    if config.cache_enabled:
+        persistent_store = None
+        if config.cache_persistent:
+            from database import db
+            persistent_store = db
+        cache = ResultCache(max_entries=config.cache_max_entries,
+                            ttl_seconds=config.cache_ttl_seconds,
+                            persistent_store=persistent_store)
+    return LeafDiseaseDetector.from_config(config, cache=cache)
+
+
+def get_detector() -> LeafDiseaseDetector:
+    """
+    Return the shared detector, building it from the environment on first use.
+
+    The detector holds a pooled keep-alive Groq client, so reusing it avoids
+    re-reading the environment and a fresh TLS handshake on every upload.
+
+    Returns:
+        LeafDiseaseDetector: The process-wide detector instance
+    """
+    global _detector, _config
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                load_dotenv()
+                config = AppConfig.from_env()
+                _detector = build_detector(config)
+                _config = config
+    return _detector
+
+
+def configure_detector(detector: Optional[LeafDiseaseDetector] = None,
+                       config: Optional[AppConfig] = None) -> LeafDiseaseDetector:
+    """
+    Explicitly (re)configure the shared detector.
+
+    The replaced detector is closed once the analyses still running on it
+    have finished.
+
+    Args:
+        detector (Optional[LeafDiseaseDetector]): Ready-made detector to install
+        config (Optional[AppConfig]): Configuration to build a detector from when
+            no detector is given. Defaults to AppConfig.from_env(). It is kept
+            as the active configuration even if building the detector fails.
+
+    Returns:
+        LeafDiseaseDetector: The newly installed detector
+    """
+    global _detector, _config
+    if detector is None:
+        load_dotenv()
+        config = config or AppConfig.from_env()
+        with _detector_lock:
+            _config = config
+        detector = build_detector(config)
+    with _detector_lock:
+        previous, _detector = _detector, detector
+        if config is not None:
+            _config = config
+    if previous is not None and previous is not detector:
+        _retire_detector(previous)
+    return detector
+
+
+def _close_detector(detector: LeafDiseaseDetector) -> None:
+    """
+    Close the sync and async client pools of a detector no analysis uses.
+
+    The async pool is closed by a task on the running event loop, or on a
+    short-lived loop when called outside of one.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    try:
+        if loop is None:
+            asyncio.run(detector.aclose())
+        else:
+            task = loop.create_task(detector.aclose())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+    except Exception as e:
+        logger.warning(f"Could not close replaced detector: {str(e)}")
+
+
+def _retire_detector(detector: LeafDiseaseDetector) -> None:
+    """Close a detector that is no longer shared once its in-flight analyses finish."""
+    with _detector_lock:
+        if _in_flight.get(detector):
+            _retired.add(detector)
+            return
+    _close_detector(detector)
+
+
+def _acquire_detector() -> LeafDiseaseDetector:
+    """Return the shared detector, counted as in use until _release_detector()."""
+    while True:
+        detector = get_detector()
+        with _detector_lock:
+            # Retry if the detector was replaced before it was counted
+            if detector is _detector:
+                _in_flight[detector] = _in_flight.get(detector, 0) + 1
+                return detector
+
+
+def _release_detector(detector: LeafDiseaseDetector) -> None:
+    """Finish one analysis on a detector, closing it if it was retired meanwhile."""
+    with _detector_lock:
+        remaining = _in_flight[detector] - 1
+        if remaining:
+            _in_flight[detector] = remaining
+            return
+        del _in_flight[detector]
+        if detector not in _retired:
+            return
+        _retired.discard(detector)
+    _close_detector(detector)
+
+
+@contextmanager
+def _use_detector(detector: Optional[LeafDiseaseDetector] = None
+                  ) -> Iterator[LeafDiseaseDetector]:
+    """Yield the given detector, or the shared one kept open until the block exits."""
+    if detector is not None:
+        yield detector
+        return
+    detector = _acquire_detector()
+    try:
+        yield detector
+    finally:
+        _release_detector(detector)
+
+
+def shutdown_detector() -> None:
+    """Close and discard the shared detector, releasing pooled connections."""
+    global _detector
+    with _detector_lock:
+        previous, _detector = _detector, None
+    if previous is not None:
+        _retire_detector(previous)
+
+
+async def shutdown_detector_async() -> None:
+    """Async variant of shutdown_detector that closes both client pools before returning."""
+    global _detector
+    with _detector_lock:
+        previous, _detector = _detector, None
+        if previous is not None and _in_flight.get(previous):
+            _retired.add(previous)
+            return
+    if previous is not None:
+        await previous.aclose()
+
+
+def prepare_image(image_bytes: bytes) -> Tuple[bytes, str]:
+    """
+    Downscale and re-encode an upload using the active preprocessing settings
+
+    Args:
+        image_bytes (bytes): Raw uploaded image data
+
+    Returns:
+        Tuple[bytes, str]: Normalized image data and its MIME type
+    """
+    config = get_config()
+    return normalize_image(image_bytes,
+                           max_side=config.image_max_side,
+                           output_format=config.image_output_format,
+                           quality=config.image_quality)
+
+
+def test_with_base64_data(base64_image_string: str,
+                          detector: Optional[LeafDiseaseDetector] = None,
+                          mime_type: str = "image/jpeg"):
     """
     Test disease detection with base64 image data
 
     Args:
         base64_image_string (str): Base64 encoded image data
+        detector (Optional[LeafDiseaseDetector]): Detector to use. Defaults to
+            the shared process-wide detector.
+        mime_type (str): MIME type of the encoded image
+
+    Raises:
+        CircuitOpenError: If the vision model is unavailable and no cached
+            result exists for the image
+        ResponseParseError: If the model's answer could not be parsed, even
+            after asking the model to repair it
+        RateLimitError: If Groq still answers 429 after the scheduler's retries
+        SchedulerQueueFullError: If too many analyses are already waiting
     """
     try:
-        detector = LeafDiseaseDetector()
-        result = detector.analyze_leaf_image_base64(base64_image_string)
+        with _use_detector(detector) as detector:
+            result = detector.analyze_leaf_image_base64(base64_image_string,
+                                                        mime_type=mime_type)
         print(json.dumps(result, indent=2))
         return result
+    except UPSTREAM_ERRORS:
+        # Let the API answer with 429/502/503 instead of a generic failure
+        raise
     except Exception as e:
         print(f'{{"error": "{str(e)}"}}')
         return None
@@ -49,14 +300,106 @@ def convert_image_to_base64_and_test(image_bytes: bytes):
             print('{"error": "No image bytes provided"}')
             return None
 
+        image_bytes, mime_type = prepare_image(image_bytes)
         base64_string = base64.b64encode(image_bytes).decode('utf-8')
         print(f"Converted image to base64 ({len(base64_string)} characters)")
-        return test_with_base64_data(base64_string)
+        return test_with_base64_data(base64_string, mime_type=mime_type)
+    except UPSTREAM_ERRORS:
+        # Let the API answer with 429/502/503 instead of a generic failure
+        raise
+    except Exception as e:
+        print(f'{{"error": "{str(e)}"}}')
+        return None
+
+
+async def test_with_base64_data_async(base64_image_string: str,
+                                     detector: Optional[LeafDiseaseDetector] = None,
+                                     mime_type: str = "image/jpeg",
+                                     priority: int = PRIORITY_INTERACTIVE):
+    """
+    Async variant of test_with_base64_data for use inside the event loop
+
+    Args:
+        base64_image_string (str): Base64 encoded image data
+        detector (Optional[LeafDiseaseDetector]): Detector to use. Defaults to
+            the shared process-wide detector.
+        mime_type (str): MIME type of the encoded image
+        priority (int): Rate limiter priority (see rate_limiter)
+
+    Raises:
+        CircuitOpenError: If the vision model is unavailable and no cached
+            result exists for the image
+        ResponseParseError: If the model's answer could not be parsed, even
+            after asking the model to repair it
+        RateLimitError: If Groq still answers 429 after the scheduler's retries
+        SchedulerQueueFullError: If too many analyses are already waiting
+    """
+    try:
+        with _use_detector(detector) as detector:
+            result = await detector.analyze_leaf_image_base64_async(
+                base64_image_string, mime_type=mime_type, priority=priority)
+        return result
+    except UPSTREAM_ERRORS:
+        # Let the API answer with 429/502/503 instead of a generic failure
+        raise
+    except Exception as e:
+        print(f'{{"error": "{str(e)}"}}')
+        return None
+
+
+async def convert_image_to_base64_and_test_async(image_bytes: bytes,
+                                                 priority: int = PRIORITY_INTERACTIVE):
+    """
+    Normalize and base64 encode image bytes off the event loop, then test them
+    asynchronously
+
+    Args:
+        image_bytes (bytes): Image data in bytes
+        priority (int): Rate limiter priority (see rate_limiter)
+    """
+    try:
+        if not image_bytes:
+            print('{"error": "No image bytes provided"}')
+            return None
+
+        def encode():
+            data, mime_type = prepare_image(image_bytes)
+            return base64.b64encode(data).decode('utf-8'), mime_type
+
+        base64_string, mime_type = await asyncio.to_thread(encode)
+        print(f"Converted image to base64 ({len(base64_string)} characters)")
+        return await test_with_base64_data_async(base64_string, mime_type=mime_type,
+                                                 priority=priority)
+    except UPSTREAM_ERRORS:
+        # Let the API answer with 429/502/503 instead of a generic failure
+        raise
     except Exception as e:
         print(f'{{"error": "{str(e)}"}}')
         return None
 
 
+def summarize_batch_results(results: List[Dict]) -> Dict:
+    """
+    Summarize per-image batch results into healthy/diseased/invalid counts
+
+    Args:
+        results (List[Dict]): Analysis results; None entries count as failed
+
+    Returns:
+        Dict: Total, healthy, diseased, invalid and failed image counts
+    """
+    analyzed = [r for r in results if r is not None]
+    return {
+        'total_images': len(results),
+        'healthy_count': sum(1 for r in analyzed if not r.get('disease_detected')
+                             and r.get('disease_type') != 'invalid_image'),
+        'diseased_count': sum(1 for r in analyzed if r.get('disease_detected')),
+        'invalid_count': sum(1 for r in analyzed
+                             if r.get('disease_type') == 'invalid_image'),
+        'failed_count': len(results) - len(analyzed)
+    }
+
+
 def main():
     """Test with base64 conversion"""
     image_path = "Media/brown-spot-4 (1).jpg"